@@ -0,0 +1,92 @@
+# benchmarks/bench_chat_async.py
+# Benchmark do caminho de chat: compara a invocação síncrona da cadeia RAG dentro de um
+# handler async (que bloqueia o event loop) com a invocação assíncrona via ainvoke.
+# Usa um LLM e um retriever falsos com latência configurável, sem chamar a API do Gemini.
+#
+# Uso: python benchmarks/bench_chat_async.py --requests 200 --latency 0.05 --max-concurrency 256
+
+import argparse
+import asyncio
+import time
+from typing import List
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.retrievers import BaseRetriever
+from langchain.chains import create_history_aware_retriever, create_retrieval_chain
+from langchain.chains.combine_documents import create_stuff_documents_chain
+
+from fakes import FakeChatModel
+
+
+class FakeRetriever(BaseRetriever):
+    """Retriever falso que devolve sempre os mesmos documentos."""
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return [Document(page_content=f"Trecho {i} sobre {query}", metadata={"file_id": i}) for i in range(4)]
+
+    async def _aget_relevant_documents(self, query: str, *,
+                                       run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        return self._get_relevant_documents(query, run_manager=run_manager)
+
+
+def build_chain(latency: float):
+    """Monta a mesma cadeia usada em langchain_utils, mas com componentes falsos."""
+    llm = FakeChatModel(latency=latency)
+    contextualize_q_prompt = ChatPromptTemplate.from_messages([
+        ("system", "Reescreva a pergunta."),
+        MessagesPlaceholder("chat_history"),
+        ("human", "{input}"),
+    ])
+    qa_prompt = ChatPromptTemplate.from_messages([
+        ("system", "Contexto: {context}"),
+        MessagesPlaceholder(variable_name="chat_history"),
+        ("human", "{input}"),
+    ])
+    history_aware_retriever = create_history_aware_retriever(llm, FakeRetriever(), contextualize_q_prompt)
+    return create_retrieval_chain(history_aware_retriever, create_stuff_documents_chain(llm, qa_prompt))
+
+
+async def run_sync_handler(chain, n_requests: int) -> float:
+    """Simula o handler antigo: chamada síncrona dentro de uma corrotina."""
+    async def handler(i: int):
+        return chain.invoke({"input": f"pergunta {i}", "chat_history": []})
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handler(i) for i in range(n_requests)))
+    return time.perf_counter() - start
+
+
+async def run_async_handler(chain, n_requests: int, max_concurrency: int) -> float:
+    """Simula o handler novo: ainvoke limitado pelo semáforo do modelo."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def handler(i: int):
+        async with semaphore:
+            return await chain.ainvoke({"input": f"pergunta {i}", "chat_history": []})
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handler(i) for i in range(n_requests)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do caminho síncrono vs assíncrono do /chat.")
+    parser.add_argument("--requests", type=int, default=200, help="Número de requisições simultâneas.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Latência simulada de cada chamada ao LLM (s).")
+    parser.add_argument("--max-concurrency", type=int, default=256, help="Limite do semáforo por modelo.")
+    args = parser.parse_args()
+
+    chain = build_chain(args.latency)
+    sync_elapsed = asyncio.run(run_sync_handler(chain, args.requests))
+    async_elapsed = asyncio.run(run_async_handler(chain, args.requests, args.max_concurrency))
+
+    print(f"Requisições: {args.requests} | latência simulada do LLM: {args.latency * 1000:.0f} ms")
+    print(f"invoke (bloqueante): {sync_elapsed:.2f} s -> {args.requests / sync_elapsed:.1f} req/s")
+    print(f"ainvoke (assíncrono): {async_elapsed:.2f} s -> {args.requests / async_elapsed:.1f} req/s")
+    print(f"Ganho de throughput: {sync_elapsed / async_elapsed:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,416 @@
+# benchmarks/bench_load.py
+# Benchmark de carga reprodutível da aplicação, sem chamar as APIs do Gemini. Sobe o servidor
+# completo (fake_server.py) com modelos de chat e de embeddings falsos e determinísticos, indexa
+# um corpus sintético (corpus.py) e mede:
+#   - a ingestão em massa do corpus (/ingest/path) e a vazão de /uploadfile/ (documentos e
+#     pedaços por segundo, do envio até o job terminar);
+#   - as latências p50/p95/p99 e as requisições por segundo de /chat em cada nível de concorrência;
+#   - a memória (RSS) do servidor ao longo de toda a execução e a sua tendência durante um
+#     período de carga contínua (--soak-seconds).
+# Os resultados vão para um arquivo JSON. Com --baseline, são comparados com os de uma execução
+# anterior e o processo termina com código 1 se alguma métrica piorou além da tolerância.
+#
+# Uso: python benchmarks/bench_load.py --concurrency 1,8,32 --requests 200 --json load.json
+#      python benchmarks/bench_load.py --json atual.json --baseline load.json --tolerance 0.2
+
+import os
+import sys
+import json
+import time
+import socket
+import random
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from typing import Dict, List, Optional
+
+import httpx
+
+import corpus
+from fake_server import add_arguments
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+
+# Métricas comparadas com --baseline: caminho no JSON e se um valor maior é melhor.
+_COMPARED_METRICS = [
+    ("upload.docs_per_second", True),
+    ("upload.chunks_per_second", True),
+    ("seed.docs_per_second", True),
+    ("memory.soak_growth_mb_per_minute", False),
+]
+
+
+def percentile(samples: List[float], fraction: float) -> Optional[float]:
+    """Percentil pelo método nearest-rank."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[max(0, min(len(ordered) - 1, int(round(fraction * len(ordered))) - 1))]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _rss_mb(pid: int) -> Optional[float]:
+    """Memória residente do processo em MB (Linux via /proc; outros sistemas via psutil, se instalado)."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+    except Exception:
+        return None
+
+
+class MemorySampler:
+    """Amostra o RSS do servidor em segundo plano, marcando cada amostra com a fase em execução."""
+
+    def __init__(self, pid: int, interval: float):
+        self.pid = pid
+        self.interval = interval
+        self.phase = "startup"
+        self.samples: List[dict] = []
+        self._started = time.perf_counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.interval)
+
+    def sample(self):
+        rss = _rss_mb(self.pid)
+        if rss is not None:
+            self.samples.append({"t": round(time.perf_counter() - self._started, 3), "phase": self.phase,
+                                 "rss_mb": round(rss, 2)})
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+    def summary(self) -> dict:
+        if not self.samples:
+            return {"available": False}
+        values = [sample["rss_mb"] for sample in self.samples]
+        by_phase: Dict[str, float] = {}
+        for sample in self.samples:
+            by_phase[sample["phase"]] = sample["rss_mb"]
+        soak = [sample for sample in self.samples if sample["phase"] == "soak"]
+        slope = None
+        if len(soak) >= 3 and soak[-1]["t"] > soak[0]["t"]:
+            # Tendência do RSS (mínimos quadrados) durante a carga contínua, em MB por minuto.
+            times = [sample["t"] for sample in soak]
+            mean_t = sum(times) / len(times)
+            mean_rss = sum(sample["rss_mb"] for sample in soak) / len(soak)
+            numerator = sum((t - mean_t) * (s["rss_mb"] - mean_rss) for t, s in zip(times, soak))
+            denominator = sum((t - mean_t) ** 2 for t in times)
+            slope = round(numerator / denominator * 60, 3) if denominator else None
+        return {"available": True, "start_mb": values[0], "end_mb": values[-1], "peak_mb": max(values),
+                "growth_mb": round(values[-1] - values[0], 2), "end_of_phase_mb": by_phase,
+                "soak_growth_mb_per_minute": slope, "samples": self.samples}
+
+
+def start_server(args, workdir: str, port: int) -> subprocess.Popen:
+    """Inicia fake_server.py em um processo separado, com a saída gravada em server.log."""
+    command = [sys.executable, os.path.join(BENCHMARKS, "fake_server.py"), "--workdir", workdir, "--port", str(port),
+               "--chat-latency", str(args.chat_latency), "--token-latency", str(args.token_latency),
+               "--response-tokens", str(args.response_tokens), "--embedding-latency", str(args.embedding_latency),
+               "--embedding-latency-per-text", str(args.embedding_latency_per_text),
+               "--dimensions", str(args.dimensions)]
+    log = open(os.path.join(workdir, "server.log"), "w")
+    return subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_ready(client: httpx.AsyncClient, server: subprocess.Popen, timeout: float) -> float:
+    """Espera /health/ready responder 200 e retorna o tempo de inicialização."""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if server.poll() is not None:
+            raise RuntimeError("O servidor terminou durante a inicialização (veja server.log).")
+        try:
+            if (await client.get("/health/ready")).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"O servidor não ficou pronto em {timeout:.0f} s.")
+
+
+async def bench_seed(client: httpx.AsyncClient) -> dict:
+    """Indexa o corpus sintético pela ingestão em massa (/ingest/path)."""
+    started = time.perf_counter()
+    response = await client.post("/api/v1/ingest/path", json={"path": "seed"}, timeout=None)
+    response.raise_for_status()
+    result = response.json()
+    return {"documents": result["documents_indexed"], "chunks": result["chunks_indexed"],
+            "seconds": round(time.perf_counter() - started, 3), "docs_per_second": result["docs_per_second"],
+            "chunks_per_second": result["chunks_per_second"]}
+
+
+async def bench_upload(client: httpx.AsyncClient, paths: List[str], concurrency: int) -> dict:
+    """Envia os arquivos por /uploadfile/ e acompanha cada job até terminar."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    chunks, failed = 0, 0
+
+    async def upload(path: str):
+        nonlocal chunks, failed
+        async with semaphore:
+            started = time.perf_counter()
+            with open(path, "rb") as document:
+                response = await client.post("/api/v1/uploadfile/", timeout=None,
+                                             files={"file": (os.path.basename(path), document, "application/pdf")})
+            if response.status_code != 202:
+                failed += 1
+                return
+            job_id = response.json()["job_id"]
+            while True:
+                job = (await client.get(f"/api/v1/jobs/{job_id}")).json()
+                if job["status"] in ("completed", "failed"):
+                    break
+                await asyncio.sleep(0.1)
+            if job["status"] == "completed":
+                chunks += job["chunks_done"]
+                latencies.append(time.perf_counter() - started)
+            else:
+                failed += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(upload(path) for path in paths))
+    elapsed = time.perf_counter() - started
+    return {"documents": len(latencies), "failed": failed, "chunks": chunks, "concurrency": concurrency,
+            "seconds": round(elapsed, 3), "docs_per_second": round(len(latencies) / elapsed, 3),
+            "chunks_per_second": round(chunks / elapsed, 3),
+            "job_latency_p50_s": percentile(latencies, 0.50), "job_latency_p95_s": percentile(latencies, 0.95)}
+
+
+async def run_chat(client: httpx.AsyncClient, questions: List[str], concurrency: int, turns_per_session: int,
+                   requests: Optional[int] = None, duration: Optional[float] = None, seed: int = 0) -> dict:
+    """
+    Envia perguntas a /chat com `concurrency` usuários simultâneos, até `requests` requisições
+    ou por `duration` segundos. Cada usuário abre uma nova sessão a cada `turns_per_session` perguntas.
+    """
+    rng = random.Random(seed)
+    order = [rng.randrange(len(questions)) for _ in range(requests or 100_000)]
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    next_index = 0
+    started = time.perf_counter()
+
+    def take() -> Optional[int]:
+        nonlocal next_index
+        if requests is not None and next_index >= requests:
+            return None
+        if duration is not None and time.perf_counter() - started >= duration:
+            return None
+        next_index += 1
+        return next_index - 1
+
+    async def user(user_id: int):
+        session_id, turns = None, 0
+        while (index := take()) is not None:
+            if turns % turns_per_session == 0:
+                session_id = f"bench-{seed}-{concurrency}-{user_id}-{turns}"
+            turns += 1
+            request_started = time.perf_counter()
+            try:
+                response = await client.post("/api/v1/chat", timeout=120, json={
+                    "question": questions[order[index % len(order)]], "session_id": session_id})
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - request_started)
+                else:
+                    errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+            except httpx.HTTPError as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+
+    await asyncio.gather(*(user(user_id) for user_id in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {"concurrency": concurrency, "requests": len(latencies) + sum(errors.values()), "ok": len(latencies),
+            "errors": errors, "seconds": round(elapsed, 3), "rps": round(len(latencies) / elapsed, 3),
+            "p50_ms": _ms(percentile(latencies, 0.50)), "p95_ms": _ms(percentile(latencies, 0.95)),
+            "p99_ms": _ms(percentile(latencies, 0.99)), "max_ms": _ms(max(latencies) if latencies else None)}
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+async def run_benchmark(args, workdir: str) -> dict:
+    seed_folder = os.path.join(workdir, "import_docs", "seed")
+    corpus.write_corpus(seed_folder, args.documents, args.words, args.seed)
+    upload_paths = corpus.write_corpus(os.path.join(workdir, "uploads"), args.upload_documents, args.words,
+                                       args.seed, first_index=args.documents, prefix="upload")
+    questions = corpus.questions(args.question_pool, args.documents, args.seed)
+
+    port = args.port or _free_port()
+    server = start_server(args, workdir, port)
+    sampler = MemorySampler(server.pid, args.memory_interval)
+    sampler.start()
+    results: dict = {}
+    try:
+        limits = httpx.Limits(max_connections=max(args.concurrency + [args.soak_concurrency, args.upload_concurrency]))
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+            results["startup_seconds"] = round(await wait_ready(client, server, args.startup_timeout), 3)
+
+            sampler.phase = "seed"
+            results["seed"] = await bench_seed(client)
+            print(f"Corpus: {results['seed']['documents']} documentos, {results['seed']['chunks']} pedaços em "
+                  f"{results['seed']['seconds']:.1f} s")
+
+            sampler.phase = "upload"
+            results["upload"] = await bench_upload(client, upload_paths, args.upload_concurrency)
+            upload = results["upload"]
+            print(f"/uploadfile/: {upload['docs_per_second']:.2f} docs/s, {upload['chunks_per_second']:.1f} "
+                  f"pedaços/s ({upload['failed']} falhas)")
+
+            results["chat"] = []
+            for concurrency in args.concurrency:
+                sampler.phase = f"chat_c{concurrency}"
+                level = await run_chat(client, questions, concurrency, args.turns_per_session,
+                                       requests=args.requests, seed=args.seed)
+                results["chat"].append(level)
+                print(f"/chat c={concurrency:<4d} {level['rps']:8.1f} req/s  p50 {level['p50_ms']} ms  "
+                      f"p95 {level['p95_ms']} ms  p99 {level['p99_ms']} ms  erros {sum(level['errors'].values())}")
+
+            if args.soak_seconds > 0:
+                sampler.phase = "soak"
+                results["soak"] = await run_chat(client, questions, args.soak_concurrency, args.turns_per_session,
+                                                 duration=args.soak_seconds, seed=args.seed + 1)
+
+            sampler.phase = "end"
+            results["stages"] = (await client.get("/api/v1/metrics/stages")).json()
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        sampler.stop()
+    results["memory"] = sampler.summary()
+    memory = results["memory"]
+    if memory["available"]:
+        print(f"Memória: início {memory['start_mb']:.0f} MB, pico {memory['peak_mb']:.0f} MB, "
+              f"fim {memory['end_mb']:.0f} MB, tendência na carga contínua {memory['soak_growth_mb_per_minute']} MB/min")
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _lookup(results: dict, path: str):
+    value = results
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Lista as métricas que pioraram mais do que `tolerance` (fração) em relação ao baseline."""
+    metrics = list(_COMPARED_METRICS)
+    # Latências e vazão de /chat por nível de concorrência presente nas duas execuções.
+    baseline_levels = {level["concurrency"]: level for level in baseline.get("chat", [])}
+    for level in current.get("chat", []):
+        if level["concurrency"] in baseline_levels:
+            for key, higher_is_better in (("rps", True), ("p50_ms", False), ("p95_ms", False), ("p99_ms", False)):
+                metrics.append((f"chat.c{level['concurrency']}.{key}", higher_is_better))
+    flat_current = dict(current, chat={f"c{level['concurrency']}": level for level in current.get("chat", [])})
+    flat_baseline = dict(baseline, chat={f"c{concurrency}": level for concurrency, level in baseline_levels.items()})
+
+    regressions = []
+    for path, higher_is_better in metrics:
+        new, old = _lookup(flat_current, path), _lookup(flat_baseline, path)
+        if not isinstance(new, (int, float)) or not isinstance(old, (int, float)):
+            continue
+        if path.startswith("memory."):
+            # A tendência da memória é comparada em valor absoluto (MB/min), pois o baseline pode ser ~0.
+            worse = new - old > max(abs(old) * tolerance, 1.0)
+        elif higher_is_better:
+            worse = new < old * (1 - tolerance)
+        else:
+            worse = new > old * (1 + tolerance)
+        if worse:
+            regressions.append(f"{path}: {old} -> {new}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de carga com modelos falsos (chat, upload e memória).")
+    parser.add_argument("--documents", type=int, default=50, help="Documentos do corpus indexados no início.")
+    parser.add_argument("--words", type=int, default=3000, help="Palavras por documento.")
+    parser.add_argument("--upload-documents", type=int, default=20, help="Documentos enviados por /uploadfile/.")
+    parser.add_argument("--upload-concurrency", type=int, default=4, help="Uploads simultâneos.")
+    parser.add_argument("--concurrency", type=lambda value: [int(v) for v in value.split(",")], default=[1, 8, 32],
+                        help="Níveis de concorrência do /chat, separados por vírgula.")
+    parser.add_argument("--requests", type=int, default=200, help="Requisições de /chat por nível de concorrência.")
+    parser.add_argument("--question-pool", type=int, default=100,
+                        help="Perguntas distintas (perguntas repetidas exercitam o cache semântico).")
+    parser.add_argument("--turns-per-session", type=int, default=5, help="Perguntas por sessão de chat.")
+    parser.add_argument("--soak-seconds", type=float, default=60, help="Duração da carga contínua (0 desativa).")
+    parser.add_argument("--soak-concurrency", type=int, default=16, help="Concorrência da carga contínua.")
+    parser.add_argument("--memory-interval", type=float, default=1.0, help="Intervalo entre amostras de memória (s).")
+    parser.add_argument("--seed", type=int, default=42, help="Semente do corpus e da ordem das perguntas.")
+    parser.add_argument("--port", type=int, default=0, help="Porta do servidor (0 escolhe uma porta livre).")
+    parser.add_argument("--startup-timeout", type=float, default=180, help="Espera máxima pelo /health/ready (s).")
+    parser.add_argument("--workdir", help="Pasta de trabalho do servidor (padrão: temporária, removida no fim).")
+    parser.add_argument("--json", default="load_results.json", help="Arquivo onde gravar os resultados.")
+    parser.add_argument("--baseline", help="Resultados de uma execução anterior para comparação.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Piora relativa aceita na comparação.")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench_load_")
+    try:
+        results = asyncio.run(run_benchmark(args, workdir))
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "git_commit": _git_commit(),
+                 "python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+                 "parameters": {key: value for key, value in vars(args).items()
+                                if key not in ("json", "baseline", "workdir")}},
+        **results,
+    }
+    with open(args.json, "w") as output:
+        json.dump(report, output, indent=2)
+    print(f"Resultados gravados em {args.json}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(report, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print("Regressões em relação ao baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("Nenhuma regressão em relação ao baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# benchmarks/bench_startup.py
+# Benchmark do tempo de importação dos módulos da aplicação, o custo pago por cada worker do
+# uvicorn antes de aceitar conexões. Cada medição roda em um processo Python novo (sem cache de
+# módulos) e informa também se bibliotecas pesadas, que devem ser carregadas apenas no
+# aquecimento ou no primeiro uso (veja mcp/utils/startup.py), foram importadas cedo demais.
+# Não precisa de credentials.json: nenhum cliente é criado na importação.
+#
+# Uso: python benchmarks/bench_startup.py --runs 5 --json startup.json
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Módulos medidos, na ordem em que a aplicação os carrega.
+MODULES = [
+    "mcp.rag.db_utils",
+    "mcp.rag.chroma_utils",
+    "mcp.rag.langchain_utils",
+    "mcp.rag.semantic_cache",
+    "mcp.rag.session_memory",
+    "router_api",
+]
+
+# Bibliotecas que não devem ser importadas junto com os módulos da aplicação.
+LAZY_LIBRARIES = ["langchain_google_genai", "langchain_chroma", "chromadb", "sentence_transformers"]
+
+_PROBE = """
+import sys, time, json
+sys.path[:0] = {paths!r}
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [lib for lib in {lazy!r} if lib in sys.modules]}}))
+"""
+
+
+def measure(module: str, runs: int) -> dict:
+    """Importa o módulo em `runs` processos novos e retorna a mediana e o máximo do tempo de importação."""
+    samples, loaded = [], set()
+    # Executa fora do repositório: a importação cria os bancos SQLite e o app.log no diretório atual.
+    work_dir = tempfile.mkdtemp(prefix="bench_startup_")
+    for _ in range(runs):
+        code = _PROBE.format(paths=[os.path.join(ROOT, "src"), ROOT], module=module, lazy=LAZY_LIBRARIES)
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                cwd=work_dir).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        samples.append(result["seconds"])
+        loaded.update(result["loaded"])
+    return {"module": module, "median_s": statistics.median(samples), "max_s": max(samples),
+            "eager_libraries": sorted(loaded)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de importação dos módulos da aplicação.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", help="Arquivo onde gravar os resultados.")
+    args = parser.parse_args()
+
+    results = [measure(module, args.runs) for module in MODULES]
+    for result in results:
+        eager = ", ".join(result["eager_libraries"]) or "-"
+        print(f"{result['module']:28s} mediana {result['median_s']:.3f} s  máx {result['max_s']:.3f} s  "
+              f"carregadas cedo: {eager}")
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"runs": args.runs, "results": results}, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# benchmarks/bench_vector_store.py
+# Benchmark dos backends de armazenamento vetorial (mcp/rag/vector_store.py): Chroma e o índice
+# mmap com vetores float32, float16 e int8. Usa vetores sintéticos agrupados (reprodutíveis pela
+# semente) e compara, com a busca exata em float32 como referência:
+#   - recall@k com e sem filtro por file_id;
+#   - latência p50/p95 de uma consulta e vazão de consultas em lote;
+#   - tempo de gravação e tamanho em disco.
+# Não usa a API de embeddings. Os índices são criados em uma pasta temporária.
+#
+# Uso: python benchmarks/bench_vector_store.py --chunks 100000 --dimensions 768 --json vector_store.json
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+from typing import Dict, List
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from mcp.rag.mmap_store import MmapVectorStore, QUANTIZATIONS  # noqa: E402
+from mcp.rag.vector_store import VectorStore, ChromaVectorStore  # noqa: E402
+
+
+def synthetic_vectors(centers: np.ndarray, count: int, rng: np.random.Generator) -> np.ndarray:
+    """Vetores normalizados em torno dos centros, como embeddings de documentos sobre temas distintos."""
+    vectors = centers[rng.integers(len(centers), size=count)] + 0.6 * rng.normal(size=(count, centers.shape[1]))
+    vectors = vectors.astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int, mask: np.ndarray = None) -> List[List[int]]:
+    """Resultados exatos (produto interno em float32), usados como referência do recall."""
+    scores = queries @ vectors.T
+    if mask is not None:
+        scores[:, ~mask] = -np.inf
+    top = np.argsort(-scores, axis=1)[:, :k]
+    return [[int(row) for row in result if np.isfinite(scores[i, row])] for i, result in enumerate(top)]
+
+
+def recall(found: List[List[str]], expected: List[List[int]]) -> float:
+    return float(np.mean([len({int(chunk_id[1:]) for chunk_id in hits} & set(truth)) / max(len(truth), 1)
+                          for hits, truth in zip(found, expected)]))
+
+
+def open_chroma(path: str) -> ChromaVectorStore:
+    from langchain_chroma import Chroma
+
+    # Espaço de cosseno, o mesmo usado pela aplicação nas comparações de similaridade.
+    return ChromaVectorStore(Chroma(persist_directory=path, collection_metadata={"hnsw:space": "cosine"}))
+
+
+def _folder_size_mb(path: str) -> float:
+    return sum(os.path.getsize(os.path.join(folder, name)) for folder, _, names in os.walk(path)
+               for name in names) / (1024 * 1024)
+
+
+def bench_backend(store: VectorStore, path: str, vectors: np.ndarray, file_ids: np.ndarray, queries: np.ndarray,
+                  args) -> Dict[str, object]:
+    ids = [f"c{i}" for i in range(len(vectors))]
+    started = time.perf_counter()
+    for start in range(0, len(vectors), args.batch_size):
+        end = start + args.batch_size
+        store.upsert(ids[start:end], vectors[start:end], [""] * (end - start),
+                     [{"file_id": int(file_id)} for file_id in file_ids[start:end]])
+    if isinstance(store, MmapVectorStore):
+        store.compact()
+    insert_seconds = time.perf_counter() - started
+
+    store.search(queries[:1], args.k)  # Aquece caches e mapeamentos.
+    latencies, found = [], []
+    for query in queries:
+        started = time.perf_counter()
+        found.extend(store.search(query[None, :], args.k))
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    batched = []
+    for start in range(0, len(queries), args.query_batch):
+        batched.extend(store.search(queries[start:start + args.query_batch], args.k))
+    batch_seconds = time.perf_counter() - started
+
+    wanted = list(range(args.filter_files))
+    mask = np.isin(file_ids, wanted)
+    filtered = [store.search(query[None, :], args.k, wanted)[0] for query in queries]
+
+    return {
+        "insert_seconds": round(insert_seconds, 3),
+        "insert_chunks_per_second": round(len(vectors) / insert_seconds, 1),
+        "disk_mb": round(_folder_size_mb(path), 2),
+        "recall_at_k": recall(found, exact_top_k(vectors, queries, args.k)),
+        "batched_recall_at_k": recall(batched, exact_top_k(vectors, queries, args.k)),
+        "filtered_recall_at_k": recall(filtered, exact_top_k(vectors, queries, args.k, mask)),
+        "latency_p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "latency_p95_ms": round(sorted(latencies)[int(0.95 * (len(latencies) - 1))] * 1000, 3),
+        "batched_queries_per_second": round(len(queries) / batch_seconds, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall e latência dos backends de armazenamento vetorial.")
+    parser.add_argument("--chunks", type=int, default=50000, help="Pedaços indexados.")
+    parser.add_argument("--dimensions", type=int, default=768, help="Dimensões dos vetores.")
+    parser.add_argument("--clusters", type=int, default=200, help="Centros dos vetores sintéticos.")
+    parser.add_argument("--files", type=int, default=500, help="Arquivos (file_ids) distintos.")
+    parser.add_argument("--filter-files", type=int, default=5, help="Arquivos nas buscas filtradas.")
+    parser.add_argument("--queries", type=int, default=200, help="Consultas medidas.")
+    parser.add_argument("--query-batch", type=int, default=32, help="Consultas por chamada na busca em lote.")
+    parser.add_argument("--k", type=int, default=20, help="Resultados por consulta (o fetch_k da recuperação).")
+    parser.add_argument("--batch-size", type=int, default=2000, help="Pedaços por gravação.")
+    parser.add_argument("--backends", default="chroma," + ",".join(f"mmap-{q}" for q in QUANTIZATIONS),
+                        help="Backends medidos, separados por vírgula.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Arquivo onde gravar os resultados.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    centers = rng.normal(size=(args.clusters, args.dimensions)).astype(np.float32)
+    vectors = synthetic_vectors(centers, args.chunks, rng)
+    file_ids = rng.integers(args.files, size=args.chunks)
+    # Consultas próximas dos dados, mas que não coincidem com nenhum pedaço.
+    queries = synthetic_vectors(centers, args.queries, rng)
+
+    results = {}
+    work_dir = tempfile.mkdtemp(prefix="bench_vector_store_")
+    try:
+        for backend in args.backends.split(","):
+            path = os.path.join(work_dir, backend)
+            if backend == "chroma":
+                store = open_chroma(path)
+            else:
+                quantization = backend.split("-", 1)[1]
+                store = MmapVectorStore(path, quantization=quantization, compact_min_rows=2 ** 62)
+            results[backend] = bench_backend(store, path, vectors, file_ids, queries, args)
+            result = results[backend]
+            print(f"{backend:14s} recall@{args.k} {result['recall_at_k']:.3f} (filtrado "
+                  f"{result['filtered_recall_at_k']:.3f})  p50 {result['latency_p50_ms']:.2f} ms  "
+                  f"p95 {result['latency_p95_ms']:.2f} ms  lote {result['batched_queries_per_second']:.0f} q/s  "
+                  f"gravação {result['insert_chunks_per_second']:.0f}/s  disco {result['disk_mb']:.1f} MB")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"parameters": vars(args), "results": results}, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# benchmarks/corpus.py
+# Corpus sintético e reprodutível para os benchmarks: documentos PDF gerados a partir de uma
+# semente (mesma semente, mesmos arquivos e mesmos pedaços) e perguntas sobre os seus tópicos.
+# Os PDFs são escritos diretamente (texto simples em Helvetica), sem dependências extras, e são
+# lidos pelo mesmo pipeline de ingestão (pypdf) dos uploads reais.
+
+import os
+import random
+from typing import List
+
+# Sílabas usadas para formar o vocabulário. Apenas ASCII, para que o texto extraído do PDF seja
+# idêntico ao gerado.
+_SYLLABLES = ["ba", "ce", "di", "fo", "gu", "la", "me", "ni", "po", "ru", "sa", "te", "vi", "xo", "za",
+              "tra", "pre", "cla", "dro", "ser", "mon", "tal", "ven", "qui", "lor"]
+
+# Palavras comuns que ligam as palavras de tópico em frases.
+_CONNECTORS = ["de", "para", "com", "sobre", "entre", "quando", "porque", "como", "o", "a", "os", "um",
+               "uma", "no", "na", "processo", "sistema", "valor", "resultado", "dados", "modelo"]
+
+# Caracteres por linha e linhas por página do PDF gerado.
+_LINE_WIDTH = 90
+_LINES_PER_PAGE = 60
+
+
+def build_vocabulary(size: int, seed: int) -> List[str]:
+    """Gera `size` palavras distintas combinando sílabas."""
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def _topic_words(vocabulary: List[str], doc_index: int, per_topic: int) -> List[str]:
+    # Cada documento tem um tópico próprio (um bloco do vocabulário), usado nas perguntas.
+    start = (doc_index * per_topic) % max(len(vocabulary) - per_topic, 1)
+    return vocabulary[start:start + per_topic]
+
+
+def document_text(vocabulary: List[str], doc_index: int, words: int, seed: int) -> str:
+    """Texto do documento `doc_index`: frases que misturam o tópico do documento e conectores."""
+    rng = random.Random(seed * 1_000_003 + doc_index)
+    topic = _topic_words(vocabulary, doc_index, 12)
+    sentences, count = [], 0
+    while count < words:
+        length = rng.randint(8, 20)
+        tokens = [rng.choice(topic) if rng.random() < 0.4 else
+                  rng.choice(_CONNECTORS) if rng.random() < 0.6 else rng.choice(vocabulary)
+                  for _ in range(length)]
+        sentences.append(" ".join(tokens).capitalize() + ".")
+        count += length
+    return f"Documento {doc_index}. " + " ".join(sentences)
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, text: str) -> None:
+    """Grava `text` como um PDF simples de uma coluna, quebrando linhas e páginas."""
+    words, lines, line = text.split(), [], ""
+    for word in words:
+        if line and len(line) + 1 + len(word) > _LINE_WIDTH:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    pages = [lines[i:i + _LINES_PER_PAGE] for i in range(0, len(lines), _LINES_PER_PAGE)] or [[]]
+
+    # Objetos: 1 catálogo, 2 árvore de páginas, 3 fonte e, para cada página, a página e o seu conteúdo.
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>",
+               "<< /Type /Pages /Kids [" + " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages)))
+               + f"] /Count {len(pages)} >>",
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    for i, page_lines in enumerate(pages):
+        stream = "BT /F1 10 Tf 40 800 Td 12 TL " + " ".join(f"({_pdf_escape(l)}) '" for l in page_lines) + " ET"
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+
+    output, offsets = "%PDF-1.4\n", []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{body}\nendobj\n"
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    output += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    with open(path, "w", encoding="ascii") as pdf:
+        pdf.write(output)
+
+
+def write_corpus(folder: str, documents: int, words_per_document: int, seed: int, first_index: int = 0,
+                 prefix: str = "doc") -> List[str]:
+    """
+    Gera os PDFs do corpus em `folder`.
+
+    Args:
+        folder (str): Pasta de destino (criada se não existir).
+        documents (int): Número de documentos.
+        words_per_document (int): Palavras aproximadas de cada documento.
+        seed (int): Semente do gerador.
+        first_index (int): Índice do primeiro documento (separa corpora gerados com a mesma semente).
+        prefix (str): Prefixo do nome dos arquivos.
+
+    Returns:
+        List[str]: Os caminhos dos arquivos gerados.
+    """
+    os.makedirs(folder, exist_ok=True)
+    vocabulary = build_vocabulary(2000, seed)
+    paths = []
+    for doc_index in range(first_index, first_index + documents):
+        path = os.path.join(folder, f"{prefix}_{doc_index:05d}.pdf")
+        write_pdf(path, document_text(vocabulary, doc_index, words_per_document, seed))
+        paths.append(path)
+    return paths
+
+
+def questions(count: int, documents: int, seed: int) -> List[str]:
+    """Perguntas sobre os tópicos dos `documents` primeiros documentos do corpus."""
+    rng = random.Random(seed + 7)
+    vocabulary = build_vocabulary(2000, seed)
+    result = []
+    for _ in range(count):
+        topic = _topic_words(vocabulary, rng.randrange(max(documents, 1)), 12)
+        first, second = rng.sample(topic, 2)
+        result.append(f"O que os documentos dizem sobre {first} e {second}?")
+    return result
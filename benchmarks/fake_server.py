@@ -0,0 +1,61 @@
+# benchmarks/fake_server.py
+# Sobe a aplicação completa (src/main.py) com o uvicorn usando os modelos falsos de fakes.py no
+# lugar do Gemini: nenhuma chamada de rede e nenhum credentials.json. Todos os arquivos da
+# aplicação (bancos SQLite, chroma_data, app.log, uploads) são criados em --workdir, fora do
+# repositório. Usado por bench_load.py; também serve para testes manuais ou ferramentas de carga
+# externas.
+#
+# Uso: python benchmarks/fake_server.py --workdir /tmp/mcp-bench --port 8765 --chat-latency 0.2
+
+import os
+import sys
+import types
+import argparse
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Opções dos modelos falsos, compartilhadas com bench_load.py."""
+    parser.add_argument("--chat-latency", type=float, default=0.2, help="Latência até o primeiro token (s).")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="Latência entre tokens (s).")
+    parser.add_argument("--response-tokens", type=int, default=40, help="Palavras de cada resposta.")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="Latência por chamada de embeddings (s).")
+    parser.add_argument("--embedding-latency-per-text", type=float, default=0.0005,
+                        help="Latência adicional por texto embutido (s).")
+    parser.add_argument("--dimensions", type=int, default=256, help="Tamanho dos vetores de embeddings.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aplicação com modelos falsos, para benchmarks.")
+    parser.add_argument("--workdir", required=True, help="Pasta de trabalho da aplicação.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    # Os caminhos de config.py são relativos ao diretório atual.
+    os.makedirs(args.workdir, exist_ok=True)
+    os.chdir(args.workdir)
+    sys.path[:0] = [os.path.join(ROOT, "src"), ROOT, BENCHMARKS]
+    # main.py importa o roteador como mcp_server.router_api (a raiz do repositório implantada
+    # como o pacote mcp_server).
+    package = types.ModuleType("mcp_server")
+    package.__path__ = [ROOT]
+    sys.modules["mcp_server"] = package
+
+    from fakes import install_fakes
+
+    install_fakes(chat_latency=args.chat_latency, token_latency=args.token_latency,
+                  response_tokens=args.response_tokens, embedding_latency=args.embedding_latency,
+                  embedding_latency_per_text=args.embedding_latency_per_text, dimensions=args.dimensions)
+
+    import uvicorn
+    from main import app
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
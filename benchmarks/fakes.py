@@ -0,0 +1,132 @@
+# benchmarks/fakes.py
+# Modelos falsos usados nos benchmarks no lugar das APIs do Gemini: um modelo de chat e um modelo
+# de embeddings determinísticos, com latência configurável, que não fazem chamadas de rede nem
+# precisam de credentials.json. install_fakes os registra na aplicação pelos pontos de extensão
+# register_llm_engine (langchain_utils) e configure_embeddings (chroma_utils).
+
+import re
+import time
+import asyncio
+import hashlib
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Engine registrado para os modelos falsos em MODEL_CONFIGS.
+FAKE_ENGINE = "fake"
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    LLM falso que simula a latência de uma chamada de rede. A resposta é derivada do prompt,
+    então a mesma pergunta com o mesmo contexto produz sempre o mesmo texto.
+    """
+
+    latency: float = 0.05  # Espera antes do primeiro token (s).
+    token_latency: float = 0.0  # Espera entre os tokens no streaming (s).
+    response_tokens: int = 20  # Palavras da resposta.
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _tokens(self, messages: List[BaseMessage]) -> List[str]:
+        seed = _digest("".join(str(message.content) for message in messages))
+        return [f"palavra{seed[i % len(seed)]} " for i in range(self.response_tokens)]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None,
+                  **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency + self.token_latency * self.response_tokens)
+        text = "".join(self._tokens(messages)).strip()
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None,
+                         **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency + self.token_latency * self.response_tokens)
+        text = "".join(self._tokens(messages)).strip()
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for token in self._tokens(messages):
+            time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        for token in self._tokens(messages):
+            await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Embeddings falsos e determinísticos: cada palavra é espalhada (feature hashing) em um vetor
+    normalizado, de modo que textos com palavras em comum continuam próximos e a recuperação
+    devolve resultados plausíveis.
+
+    Args:
+        dimensions (int): Tamanho dos vetores.
+        latency (float): Espera por chamada (s), como a ida e volta de uma requisição à API.
+        latency_per_text (float): Espera adicional por texto embutido (s).
+    """
+
+    def __init__(self, dimensions: int = 256, latency: float = 0.0, latency_per_text: float = 0.0):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.latency_per_text = latency_per_text
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in _WORD.findall(text.lower()):
+            digest = _digest(word)
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            vector[0] = 1.0
+            norm = 1.0
+        return (vector / norm).tolist()
+
+    def embed_documents(self, texts: List[str], task_type: Optional[str] = None) -> List[List[float]]:
+        # task_type segue a assinatura do GoogleGenerativeAIEmbeddings, que embute consultas em lote.
+        time.sleep(self.latency + self.latency_per_text * len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency + self.latency_per_text)
+        return self._vector(text)
+
+
+def install_fakes(chat_latency: float = 0.05, token_latency: float = 0.0, response_tokens: int = 20,
+                  embedding_latency: float = 0.0, embedding_latency_per_text: float = 0.0,
+                  dimensions: int = 256) -> None:
+    """
+    Faz a aplicação usar os modelos falsos: todos os modelos de MODEL_CONFIGS passam ao engine
+    "fake" e os embeddings do Gemini são substituídos. Deve ser chamada antes da primeira
+    requisição (e do aquecimento da inicialização).
+    """
+    from mcp.config import MODEL_CONFIGS
+    from mcp.rag.chroma_utils import configure_embeddings
+    from mcp.rag.langchain_utils import register_llm_engine
+
+    def build_fake_llm(model: str, model_config: dict) -> BaseChatModel:
+        return FakeChatModel(latency=chat_latency, token_latency=token_latency, response_tokens=response_tokens)
+
+    register_llm_engine(FAKE_ENGINE, build_fake_llm)
+    for model_config in MODEL_CONFIGS.values():
+        model_config["engine"] = FAKE_ENGINE
+    configure_embeddings(FakeEmbeddings(dimensions, embedding_latency, embedding_latency_per_text),
+                         model_name=f"fake-embedding-{dimensions}")
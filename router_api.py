@@ -1,12 +1,31 @@
 # mcp_server/router_api.py
-from fastapi import APIRouter, File, UploadFile, HTTPException
-from mcp.pydantic_models import QueryInput, QueryResponse, DocumentInfo, DeleteFileRequest # Importação corrigida
-from mcp.rag.langchain_utils import get_rag_chain # Importação corrigida
-from mcp.rag.db_utils import insert_application_logs, get_chat_history, get_all_documents, insert_document_record, \
-    delete_document_record # Importação corrigida
-from mcp.rag.chroma_utils import index_document_to_chroma, delete_doc_from_chroma # Importação corrigida
+from fastapi import APIRouter, File, Form, UploadFile, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from mcp.pydantic_models import QueryInput, QueryResponse, BatchQueryInput, DocumentInfo, DeleteFileRequest, \
+    IngestionJobStatus, BulkIngestPathRequest # Importação corrigida
+from mcp.rag.langchain_utils import get_chain, get_model_semaphore, retrieval_config # Importação corrigida
+from mcp.rag.db_utils import get_documents_page, delete_document_record, chat_log_writer # Importação corrigida
+from mcp.rag.session_memory import session_memory
+from mcp.rag.chroma_utils import delete_doc_from_chroma, get_embeddings # Importação corrigida
+from mcp.rag.ingestion_jobs import submit_ingestion_job, submit_bulk_ingestion_job, get_job_status
+from mcp.rag.bulk_ingestion import expand_archives, collect_files, resolve_import_path, check_zip
+from mcp.config import INGESTION_CONFIG, ROUTING_CONFIG, DATABASE_CONFIG, CHAT_BATCH_CONFIG
+from mcp.engines.model_router import RoutingDecision, plan_route, ainvoke_with_failover, record_failure
+from mcp.engines.request_coalescing import chat_coalescer
+from mcp.rag.semantic_cache import semantic_cache, is_cacheable, normalize_question
+from mcp.rag.context_packing import packing_stats
+from mcp.rag.chain_metrics import ModelCallTracker
+from mcp.utils.helpers import estimate_tokens
+from mcp.utils.metrics import record_stream_metrics, get_stream_metrics, record_model_call, get_model_metrics, \
+    record_stage, stage_timer, request_trace, get_stage_metrics, get_usage_metrics, render_prometheus, \
+    register_gauge_source
+from typing import List, Optional
 import os
 import uuid
+import json
+import hashlib
+import time
+import asyncio
 import logging
 import shutil
 import sys # Necessário para sys.modules
@@ -31,12 +50,123 @@ router = APIRouter()
 #     print(f"Attribute error during pydantic_models debug: {e}")
 # **************** FIM DA MUDANÇA PARA DEBUG ****************
 
+# Contadores dos componentes compartilhados, exportados como gauges em /metrics.
+register_gauge_source("semantic_cache", semantic_cache.stats)
+register_gauge_source("session_memory", session_memory.stats)
+register_gauge_source("chat_log_writer", chat_log_writer.stats)
+register_gauge_source("context_packing", packing_stats.stats)
+register_gauge_source("request_coalescing", chat_coalescer.stats)
+
+
+def _has_retrieval_overrides(query_input: QueryInput) -> bool:
+    """Indica se a requisição define parâmetros de recuperação próprios."""
+    return query_input.k is not None or bool(query_input.file_ids) or query_input.score_threshold is not None
+
+
+def _retrieval_config(query_input: QueryInput) -> dict:
+    """Monta a configuração da cadeia RAG com os parâmetros de recuperação da requisição."""
+    return retrieval_config(query_input.k, query_input.file_ids, query_input.score_threshold)
+
+
+def _requested_model(query_input: QueryInput) -> Optional[str]:
+    """O modelo pedido pelo cliente, ou None para o roteamento automático."""
+    return query_input.model.value if query_input.model else None
+
+
+def _plan_route(query_input: QueryInput, chat_history: List[dict]) -> RoutingDecision:
+    """Aplica o roteamento de modelos a uma requisição de chat."""
+    return plan_route(query_input.question, chat_history, query_input.context_type, _requested_model(query_input),
+                      query_input.k)
+
+
+def _coalescing_key(query_input: QueryInput, decision: RoutingDecision, chat_history: List[dict]) -> tuple:
+    """Identifica as requisições que podem compartilhar a mesma recuperação e chamada ao modelo."""
+    history = hashlib.sha256(json.dumps(chat_history, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+    candidates = tuple(decision.candidates[:ROUTING_CONFIG["max_attempts"]])
+    return (query_input.question.strip(), decision.use_retrieval, candidates, history, query_input.k,
+            tuple(query_input.file_ids or ()), query_input.score_threshold)
+
+
+async def _answer_query(query_input: QueryInput, session_id: str) -> QueryResponse:
+    """
+    Responde a uma pergunta de chat: histórico, roteamento, cache semântico, cadeia (com failover
+    e coalescência de requisições idênticas em andamento) e registro na sessão. Usado por /chat e
+    por cada pergunta de /chat/batch.
+
+    Args:
+        query_input (QueryInput): A pergunta e seus parâmetros.
+        session_id (str): O ID da sessão.
+
+    Returns:
+        QueryResponse: A resposta do modelo, o ID da sessão e o modelo usado.
+    """
+    # A duração total e a de cada etapa vão para o pipeline "chat" das métricas; as etapas internas
+    # da cadeia (reescrita, recuperação, geração) são registradas pelo callback de chain_metrics.
+    with request_trace("chat", session_id):
+        # Recupera o histórico da sessão (resumo + interações recentes dentro do orçamento de tokens).
+        with stage_timer("chat", "history"):
+            chat_history = await session_memory.aget_history(session_id, _requested_model(query_input))
+
+        # Decide se há recuperação de documentos e a ordem em que os modelos serão tentados.
+        with stage_timer("chat", "routing"):
+            decision = _plan_route(query_input, chat_history)
+        model = decision.model
+
+        # Perguntas RAG sem histórico podem ser respondidas pelo cache semântico.
+        cacheable = decision.use_retrieval and is_cacheable(chat_history, _has_retrieval_overrides(query_input))
+        answer = None
+        if cacheable:
+            with stage_timer("chat", "cache_lookup"):
+                answer, question_embedding, corpus_version = await semantic_cache.alookup(query_input.question, model)
+
+        if answer is None:
+            async def invoke(candidate: str, tracker: ModelCallTracker) -> dict:
+                # Obtém a cadeia (RAG ou conversa) do modelo e a invoca de forma assíncrona. O
+                # semáforo do modelo já foi obtido por ainvoke_with_failover; o tracker mede só
+                # as chamadas ao modelo para o roteamento.
+                chain = get_chain(candidate, decision.use_retrieval)
+                return await chain.ainvoke({"input": query_input.question, "chat_history": chat_history},
+                                           config={**_retrieval_config(query_input), "callbacks": [tracker]})
+
+            async def run_chain():
+                return await ainvoke_with_failover(decision, invoke)
+
+            with stage_timer("chat", "chain"):
+                if CHAT_BATCH_CONFIG["coalesce_requests"]:
+                    # Perguntas idênticas em andamento (de outras sessões ou do mesmo lote)
+                    # compartilham uma única recuperação e chamada ao modelo.
+                    (model, response), shared = await chat_coalescer.run(
+                        _coalescing_key(query_input, decision, chat_history), run_chain)
+                else:
+                    (model, response), shared = await run_chain(), False
+            answer = response["answer"]
+            if shared:
+                logging.info(f"Resposta compartilhada com uma requisição idêntica em andamento "
+                             f"para sessão {session_id}.")
+
+            # A requisição que executou a cadeia já guardou a resposta no cache.
+            if cacheable and not shared:
+                with stage_timer("chat", "cache_store"):
+                    semantic_cache.store(query_input.question, model, answer, question_embedding, corpus_version)
+        else:
+            logging.info(f"Resposta servida pelo cache semântico para sessão {session_id}.")
+
+        # Registra a interação na sessão (a gravação no log é feita em segundo plano).
+        with stage_timer("chat", "log_write"):
+            session_memory.append_turn(session_id, query_input.question, answer, model)
+        logging.info(f"Resposta gerada para sessão {session_id}, modelo {model}.")
+
+        return QueryResponse(answer=answer, session_id=session_id, model=model)
+
 
 @router.post("/chat", response_model=QueryResponse) # Use router.post
 async def chat(query_input: QueryInput):
     """
     Endpoint para interações de chat com o sistema RAG.
 
+    O roteamento decide se a pergunta passa pela recuperação de documentos (context_type)
+    e qual modelo a responde; se o modelo falhar, o próximo modelo configurado é tentado.
+
     Args:
         query_input (QueryInput): Objeto contendo a pergunta do usuário,
                                    ID da sessão (opcional) e o modelo a ser usado.
@@ -53,33 +183,297 @@ async def chat(query_input: QueryInput):
         logging.info(f"Sessão existente ID: {session_id}")
 
     try:
-        # Recupera o histórico de chat da sessão para o modelo
-        chat_history = get_chat_history(session_id)
+        return await _answer_query(query_input, session_id)
+    except Exception as e:
+        logging.error(f"Erro no endpoint /chat para sessão {session_id}: {e}", exc_info=True)
+        # Retorna um erro HTTP 500 em caso de exceção.
+        raise HTTPException(status_code=500, detail=f"Ocorreu um erro interno ao processar a requisição: {e}")
 
-        # Obtém a cadeia RAG com o modelo especificado.
-        # Agora o modelo vem do QueryInput
-        rag_chain = get_rag_chain(query_input.model.value)
 
-        # Invoca a cadeia RAG com a pergunta do usuário e o histórico de chat.
-        response = rag_chain.invoke({"input": query_input.question, "chat_history": chat_history})
+async def _prefetch_query_embeddings(queries: List[QueryInput]) -> None:
+    """
+    Embute as perguntas RAG de um lote em uma única chamada, nas duas formas usadas depois: a
+    normalizada (cache semântico) e a original (recuperação). As chamadas seguintes são
+    atendidas pela memória de consultas do modelo de embeddings.
+    """
+    texts = []
+    for query_input in queries:
+        if query_input.context_type == "rag":
+            texts.extend((query_input.question, normalize_question(query_input.question)))
+    if texts:
+        await get_embeddings().aembed_queries(texts)
 
-        # Insere a interação no log.
-        insert_application_logs(session_id, query_input.question, response["answer"], query_input.model.value)
-        logging.info(f"Resposta gerada para sessão {session_id}, modelo {query_input.model.value}.")
 
-        # Retorna a resposta.
-        return QueryResponse(answer=response["answer"], session_id=session_id, model=query_input.model)
+def _sse_event(event: str, data: dict) -> str:
+    """Formata um evento no padrão Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-    except Exception as e:
-        logging.error(f"Erro no endpoint /chat para sessão {session_id}: {e}", exc_info=True)
-        # Retorna um erro HTTP 500 em caso de exceção.
-        raise HTTPException(status_code=500, detail=f"Ocorreu um erro interno ao processar a requisição: {e}")
 
+@router.post("/chat/stream")
+async def chat_stream(query_input: QueryInput):
+    """
+    Endpoint de chat com o sistema RAG que envia a resposta token a token via Server-Sent Events.
+
+    Eventos enviados:
+        sources: IDs dos documentos recuperados, enviados assim que a recuperação termina
+            (reenviado se houver failover para outro modelo antes do primeiro token).
+        token: Um trecho da resposta gerada.
+        done: Fim da resposta, com o ID da sessão e o modelo usado.
+        error: Ocorreu um erro durante a geração.
+
+    Args:
+        query_input (QueryInput): Objeto contendo a pergunta do usuário,
+                                   ID da sessão (opcional) e o modelo a ser usado.
+
+    Returns:
+        StreamingResponse: Fluxo de eventos SSE.
+    """
+    session_id = query_input.session_id or str(uuid.uuid4())
+    logging.info(f"Streaming de chat iniciado para sessão {session_id}.")
+
+    async def event_stream():
+        # Acompanha o streaming inteiro (até o último evento) no pipeline "chat_stream" das métricas.
+        with request_trace("chat_stream", session_id):
+            start_time = time.perf_counter()
+            first_token_time = None
+            answer_parts = []
+            model = None
+            try:
+                with stage_timer("chat_stream", "history"):
+                    chat_history = await session_memory.aget_history(session_id, _requested_model(query_input))
+                with stage_timer("chat_stream", "routing"):
+                    decision = _plan_route(query_input, chat_history)
+                model = decision.model
+
+                cacheable = decision.use_retrieval and is_cacheable(chat_history,
+                                                                    _has_retrieval_overrides(query_input))
+                cached_answer = None
+                if cacheable:
+                    with stage_timer("chat_stream", "cache_lookup"):
+                        cached_answer, question_embedding, corpus_version = await semantic_cache.alookup(
+                            query_input.question, model)
+
+                if cached_answer is not None:
+                    # Resposta servida pelo cache semântico: enviada em um único evento.
+                    first_token_time = time.perf_counter()
+                    answer_parts.append(cached_answer)
+                    yield _sse_event("token", {"text": cached_answer})
+                else:
+                    # Failover só é possível antes do primeiro token: depois disso a resposta
+                    # parcial já foi enviada ao cliente.
+                    attempts = decision.candidates[:ROUTING_CONFIG["max_attempts"]]
+                    for attempt, model in enumerate(attempts, start=1):
+                        # Só as chamadas ao modelo (medidas pelo tracker) contam na saúde dele; a
+                        # espera no semáforo e a recuperação ficam de fora.
+                        tracker = ModelCallTracker()
+                        try:
+                            chain = get_chain(model, decision.use_retrieval)
+                            async with get_model_semaphore(model):
+                                async for chunk in chain.astream({"input": query_input.question,
+                                                                  "chat_history": chat_history},
+                                                                 config={**_retrieval_config(query_input),
+                                                                         "callbacks": [tracker]}):
+                                    if "context" in chunk:
+                                        sources = [
+                                            {"id": doc.id, "file_id": doc.metadata.get("file_id"),
+                                             "score": doc.metadata.get("relevance_score")}
+                                            for doc in chunk["context"]
+                                        ]
+                                        yield _sse_event("sources", {"documents": sources})
+                                    if chunk.get("answer"):
+                                        if first_token_time is None:
+                                            first_token_time = time.perf_counter()
+                                            record_stage("chat_stream", "first_token", first_token_time - start_time)
+                                        answer_parts.append(chunk["answer"])
+                                        yield _sse_event("token", {"text": chunk["answer"]})
+                        except Exception as e:
+                            if not tracker.failed:
+                                # Erro fora do modelo (ex.: na recuperação): repetiria com qualquer modelo.
+                                raise
+                            record_failure(model, tracker.llm_seconds, e)
+                            if answer_parts or attempt == len(attempts):
+                                raise
+                            logging.warning(f"Roteamento: modelo {model} falhou no streaming ({e}). "
+                                            f"Failover para {attempts[attempt]}.")
+                            continue
+                        if tracker.calls:
+                            record_model_call(model, tracker.llm_seconds, ok=True)
+                        break
+                    if cacheable:
+                        semantic_cache.store(query_input.question, model, "".join(answer_parts), question_embedding,
+                                             corpus_version)
+            except Exception as e:
+                logging.error(f"Erro no endpoint /chat/stream para sessão {session_id}: {e}", exc_info=True)
+                yield _sse_event("error", {"detail": f"Ocorreu um erro interno ao processar a requisição: {e}"})
+                return
+
+            end_time = time.perf_counter()
+            answer = "".join(answer_parts)
+            yield _sse_event("done", {"session_id": session_id, "model": model})
+
+            if first_token_time is not None:
+                record_stream_metrics(model, ttft=first_token_time - start_time, tokens=estimate_tokens(answer),
+                                      generation_time=end_time - first_token_time)
+
+            # Com o streaming concluído, registra a resposta completa na sessão.
+            try:
+                with stage_timer("chat_stream", "log_write"):
+                    session_memory.append_turn(session_id, query_input.question, answer, model)
+                logging.info(f"Resposta em streaming gerada para sessão {session_id}, modelo {model}.")
+            except Exception as e:
+                logging.error(f"Erro ao registrar a resposta em streaming da sessão {session_id}: {e}", exc_info=True)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.post("/chat/batch")
+async def chat_batch(batch: BatchQueryInput):
+    """
+    Endpoint que responde a um lote de perguntas (ex.: avaliações e integrações), enviando cada
+    resultado via Server-Sent Events assim que fica pronto, fora da ordem do lote.
+
+    As perguntas são processadas com concorrência limitada e os embeddings das perguntas RAG são
+    calculados em uma única chamada em lote. Cada pergunta segue o mesmo caminho de /chat
+    (sessão, roteamento, cache semântico e coalescência de perguntas idênticas).
+
+    Eventos enviados:
+        result: A resposta de uma pergunta, com seu índice no lote, o ID da sessão e o modelo usado.
+        error: Uma pergunta falhou (índice, ID da sessão e mensagem); as demais continuam.
+        done: Fim do lote, com o total de respostas, de erros e a duração.
+
+    Args:
+        batch (BatchQueryInput): As perguntas e, opcionalmente, a concorrência desejada.
+
+    Returns:
+        StreamingResponse: Fluxo de eventos SSE.
+
+    Raises:
+        HTTPException: Se o lote passar de CHAT_BATCH_CONFIG["max_batch_size"] perguntas.
+    """
+    if len(batch.queries) > CHAT_BATCH_CONFIG["max_batch_size"]:
+        raise HTTPException(status_code=400, detail=f"O lote aceita no máximo {CHAT_BATCH_CONFIG['max_batch_size']} "
+                                                    f"perguntas.")
+    concurrency = min(batch.max_concurrency or CHAT_BATCH_CONFIG["max_concurrency"],
+                      CHAT_BATCH_CONFIG["max_concurrency"])
+    logging.info(f"Lote de chat iniciado: {len(batch.queries)} perguntas, concorrência {concurrency}.")
+
+    async def event_stream():
+        with request_trace("chat_batch", f"{len(batch.queries)} perguntas"):
+            start_time = time.perf_counter()
+            try:
+                with stage_timer("chat_batch", "embed_queries"):
+                    await _prefetch_query_embeddings(batch.queries)
+            except Exception as e:
+                # Sem o lote de embeddings, cada pergunta embute a sua.
+                logging.warning(f"Falha ao embutir as perguntas do lote em uma única chamada: {e}")
+
+            semaphore = asyncio.Semaphore(concurrency)
 
-@router.post("/uploadfile/") # Use router.post
-async def create_upload_file(file: UploadFile):
+            async def answer(index: int, query_input: QueryInput):
+                async with semaphore:
+                    session_id = query_input.session_id or str(uuid.uuid4())
+                    try:
+                        response = await _answer_query(query_input, session_id)
+                        return "result", {"index": index, **response.model_dump(mode="json")}
+                    except Exception as e:
+                        logging.error(f"Erro na pergunta {index} do lote de chat (sessão {session_id}): {e}",
+                                      exc_info=True)
+                        return "error", {"index": index, "session_id": session_id,
+                                         "detail": f"Ocorreu um erro interno ao processar a pergunta: {e}"}
+
+            tasks = [asyncio.create_task(answer(index, query_input))
+                     for index, query_input in enumerate(batch.queries)]
+            errors = 0
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    event, data = await finished
+                    errors += event == "error"
+                    yield _sse_event(event, data)
+            finally:
+                # Se o cliente desconectou, as perguntas ainda pendentes são canceladas.
+                for task in tasks:
+                    task.cancel()
+
+            elapsed = time.perf_counter() - start_time
+            yield _sse_event("done", {"results": len(tasks) - errors, "errors": errors,
+                                      "elapsed_seconds": round(elapsed, 3)})
+            logging.info(f"Lote de chat concluído: {len(tasks)} perguntas, {errors} erros, {elapsed:.2f} s.")
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get("/cache/stats", response_model=dict)
+async def cache_stats():
+    """
+    Endpoint que retorna os contadores do cache semântico de respostas (acertos, falhas, taxa de acerto).
+    """
+    return semantic_cache.stats()
+
+
+@router.get("/metrics/streaming", response_model=dict)
+async def streaming_metrics():
     """
-    Endpoint para upload de arquivos (PDF, DOCX, HTML) e indexação no Chroma.
+    Endpoint que retorna, por modelo, o tempo até o primeiro token e a vazão de tokens por segundo.
+    """
+    return get_stream_metrics()
+
+
+@router.get("/metrics/sessions", response_model=dict)
+async def session_metrics():
+    """
+    Endpoint que retorna os contadores da memória de sessões (sessões em memória, acertos,
+    recargas, resumos gerados e interações aguardando gravação).
+    """
+    return session_memory.stats()
+
+
+@router.get("/metrics/stages", response_model=dict)
+async def stage_metrics():
+    """
+    Endpoint que retorna, por pipeline (chat, chat_stream, retrieval, ingestion, ...) e etapa,
+    a contagem e a duração p50/p95/p99 das etapas.
+    """
+    return get_stage_metrics()
+
+
+@router.get("/metrics/usage", response_model=dict)
+async def usage_metrics():
+    """
+    Endpoint que retorna, por pipeline e modelo, os tokens de entrada e de saída e o custo
+    calculado pelos preços de MODEL_CONFIGS.
+    """
+    return get_usage_metrics()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    Endpoint de métricas no formato de texto do Prometheus: duração das etapas, tokens e custo
+    por modelo, saúde dos modelos, streaming, cache semântico, sessões e gravação dos logs.
+    """
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@router.get("/metrics/models", response_model=dict)
+async def model_metrics():
+    """
+    Endpoint que retorna, por modelo, a saúde usada pelo roteamento: latência p50/p95,
+    taxa de erro recente e o tempo restante de espera após um limite de taxa.
+    """
+    return get_model_metrics()
+
+
+@router.post("/uploadfile/", status_code=202) # Use router.post
+async def create_upload_file(file: UploadFile, external_id: Optional[str] = Form(default=None)):
+    """
+    Endpoint para upload de arquivos (PDF, DOCX, HTML). O arquivo é salvo e a indexação
+    no armazenamento vetorial é feita em segundo plano; o progresso pode ser acompanhado em /jobs/{job_id}.
+
+    O documento é identificado pelo external_id (opcional) ou pelo nome do arquivo. Reenviar
+    um documento já indexado reindexa apenas os pedaços alterados, mantendo o mesmo file_id.
+    Enquanto um job do mesmo documento está na fila ou em execução, o reenvio é recusado (409).
     """
     if not file.filename:
         raise HTTPException(status_code=400, detail="Nenhum arquivo enviado.")
@@ -88,56 +482,153 @@ async def create_upload_file(file: UploadFile):
     if file_extension not in [".pdf", ".docx", ".html"]:
         raise HTTPException(status_code=400, detail="Formato de arquivo não suportado. Por favor, envie .pdf, .docx ou .html.")
 
-    # Caminho temporário para salvar o arquivo.
-    # Certifique-se de que a pasta 'temp_docs' exista ou seja criada.
-    upload_folder = "temp_docs"
+    # Caminho temporário para salvar o arquivo até o job de ingestão processá-lo.
+    # O prefixo único evita colisões entre uploads simultâneos com o mesmo nome.
+    upload_folder = INGESTION_CONFIG["upload_folder"]
     os.makedirs(upload_folder, exist_ok=True)
-    temp_file_path = os.path.join(upload_folder, file.filename)
+    temp_file_path = os.path.join(upload_folder, f"{uuid.uuid4().hex}_{os.path.basename(file.filename)}")
 
     try:
         # Salva o arquivo temporariamente.
-        with open(temp_file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        logging.info(f"Arquivo {file.filename} salvo temporariamente em {temp_file_path}.")
+        def save_upload():
+            with open(temp_file_path, "wb") as buffer:
+                shutil.copyfileobj(file.file, buffer)
 
-        # Insere o registro do documento no banco de dados.
-        file_id = insert_document_record(file.filename)
-        logging.info(f"Registro do documento {file.filename} inserido no DB com ID {file_id}.")
-
-        # Indexa o documento no Chroma.
-        # Passa o file_id para que os chunks sejam associados a ele.
-        index_success = index_document_to_chroma(temp_file_path, file_id)
+        await asyncio.to_thread(save_upload)
+        logging.info(f"Arquivo {file.filename} salvo temporariamente em {temp_file_path}.")
 
-        if index_success:
-            logging.info(f"Arquivo {file.filename} (ID: {file_id}) processado e indexado com sucesso.")
-            return {"message": f"Arquivo '{file.filename}' processado e indexado com sucesso!", "file_id": file_id}
-        else:
-            logging.error(f"Falha ao indexar o arquivo {file.filename} (ID: {file_id}).")
-            # Se a indexação falhar, tentamos remover o registro do DB
-            delete_document_record(file_id)
-            raise HTTPException(status_code=500, detail=f"Falha ao indexar o arquivo '{file.filename}'.")
+        # Registra o documento e envia o job para a fila de ingestão.
+        job = await asyncio.to_thread(submit_ingestion_job, temp_file_path, file.filename, external_id)
     except Exception as e:
         logging.error(f"Erro no endpoint /uploadfile para {file.filename}: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Ocorreu um erro ao processar o arquivo: {e}")
-    finally:
-        # Garante que o arquivo temporário seja removido.
         if os.path.exists(temp_file_path):
             os.remove(temp_file_path)
-            logging.info(f"Arquivo temporário {temp_file_path} removido.")
+        raise HTTPException(status_code=500, detail=f"Ocorreu um erro ao processar o arquivo: {e}")
+
+    if job["status"] == "busy":
+        # Um segundo job sobre o mesmo file_id apagaria os pedaços gravados pelo primeiro.
+        raise HTTPException(status_code=409, detail=f"O documento '{file.filename}' (ID: {job['file_id']}) já está "
+                                                    f"sendo indexado pelo job {job['job_id']}. Aguarde a conclusão "
+                                                    f"em /jobs/{job['job_id']} e envie novamente.")
+    if job["status"] == "unchanged":
+        message = f"Arquivo '{file.filename}' já está indexado e não foi alterado."
+    else:
+        message = f"Arquivo '{file.filename}' recebido. A indexação foi enfileirada."
+    return {"message": message, "job_id": job["job_id"], "file_id": job["file_id"], "status": job["status"]}
+
+
+@router.post("/uploadfiles/", status_code=202)
+async def create_upload_files(files: List[UploadFile]):
+    """
+    Endpoint para upload e indexação de muitos arquivos (PDF, DOCX, HTML ou .zip com esses
+    formatos) em uma única requisição. Arquivos com conteúdo já indexado são ignorados.
+
+    Os arquivos são salvos e a ingestão em massa é feita em segundo plano: o progresso e, ao
+    final, o resultado por arquivo podem ser acompanhados em /jobs/{job_id}.
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="Nenhum arquivo enviado.")
+
+    work_folder = os.path.join(INGESTION_CONFIG["upload_folder"], f"bulk_{uuid.uuid4().hex}")
+
+    def save_uploads():
+        os.makedirs(work_folder, exist_ok=True)
+        saved = []
+        for index, upload in enumerate(files):
+            filename = os.path.basename(upload.filename or f"arquivo_{index}")
+            file_path = os.path.join(work_folder, f"{index}_{filename}")
+            with open(file_path, "wb") as buffer:
+                shutil.copyfileobj(upload.file, buffer)
+            if os.path.splitext(filename)[1].lower() == ".zip":
+                # Recusa de imediato um .zip inválido ou acima dos limites; a extração é feita no job.
+                check_zip(file_path)
+            saved.append((file_path, filename))
+        return saved
+
+    try:
+        saved_files = await asyncio.to_thread(save_uploads)
+        job = await asyncio.to_thread(submit_bulk_ingestion_job, lambda: expand_archives(saved_files, work_folder),
+                                      f"{len(saved_files)} arquivos enviados", work_folder)
+    except ValueError as e:
+        shutil.rmtree(work_folder, ignore_errors=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.error(f"Erro no endpoint /uploadfiles: {e}", exc_info=True)
+        shutil.rmtree(work_folder, ignore_errors=True)
+        raise HTTPException(status_code=500, detail=f"Ocorreu um erro ao processar os arquivos: {e}")
+    return {"message": f"{len(saved_files)} arquivos recebidos. A ingestão em massa foi enfileirada.",
+            "job_id": job["job_id"], "status": job["status"]}
+
+
+@router.post("/ingest/path", status_code=202)
+async def ingest_path(request: BulkIngestPathRequest):
+    """
+    Endpoint para indexar uma pasta (recursivamente) ou um arquivo .zip já presentes no servidor,
+    dentro da pasta de importação configurada. Os arquivos de origem não são alterados.
+
+    A listagem dos arquivos e a ingestão são feitas em segundo plano, como em /uploadfiles/;
+    o progresso e o resultado podem ser acompanhados em /jobs/{job_id}.
+    """
+    try:
+        resolved = resolve_import_path(request.path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    work_folder = os.path.join(INGESTION_CONFIG["upload_folder"], f"bulk_{uuid.uuid4().hex}")
+
+    def collect():
+        if os.path.isdir(resolved):
+            paths = collect_files(resolved)
+            files = [(path, os.path.relpath(path, resolved)) for path in paths]
+        else:
+            files = [(resolved, os.path.basename(resolved))]
+        return expand_archives(files, work_folder)
+
+    try:
+        if not os.path.isdir(resolved) and os.path.splitext(resolved)[1].lower() == ".zip":
+            await asyncio.to_thread(check_zip, resolved)
+        job = await asyncio.to_thread(submit_bulk_ingestion_job, collect, request.path, work_folder)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.error(f"Erro no endpoint /ingest/path para {request.path}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Ocorreu um erro ao processar os arquivos: {e}")
+    return {"message": f"Ingestão em massa de '{request.path}' enfileirada.", "job_id": job["job_id"],
+            "status": job["status"]}
+
+
+@router.get("/jobs/{job_id}", response_model=IngestionJobStatus)
+async def ingestion_job_status(job_id: str):
+    """
+    Endpoint que informa a etapa, a contagem de pedaços e a vazão de um job de ingestão.
+    """
+    job = await asyncio.to_thread(get_job_status, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} não encontrado.")
+    return job
 
 
 @router.get("/documents", response_model=List[DocumentInfo]) # Use router.get
-async def list_documents():
+async def list_documents(response: Response,
+                         limit: int = Query(DATABASE_CONFIG["documents_page_size"], ge=1,
+                                            le=DATABASE_CONFIG["documents_max_page_size"]),
+                         cursor: Optional[str] = None):
     """
-    Endpoint para listar todos os documentos atualmente indexados no sistema.
+    Endpoint para listar os documentos indexados no sistema, do mais recente para o mais antigo,
+    em páginas. Quando há mais documentos, o cabeçalho X-Next-Cursor traz o cursor a ser enviado
+    no parâmetro `cursor` para obter a próxima página.
     """
     try:
-        documents = get_all_documents()
-        logging.info(f"Listados {len(documents)} documentos.")
-        return documents
+        documents, next_cursor = await asyncio.to_thread(get_documents_page, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logging.error(f"Erro ao listar documentos: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Ocorreu um erro ao listar documentos: {e}")
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    logging.info(f"Listados {len(documents)} documentos.")
+    return documents
 
 
 @router.delete("/documents", response_model=dict) # Use router.delete
@@ -149,25 +640,27 @@ async def delete_document(request: DeleteFileRequest):
     logging.info(f"Tentativa de exclusão do documento com file_id: {file_id}")
 
     try:
-        # Primeiro, tenta excluir do Chroma.
-        chroma_delete_success = delete_doc_from_chroma(file_id)
+        # Primeiro, tenta excluir do armazenamento vetorial. As exclusões são bloqueantes
+        # (disco e SQLite), então rodam em uma thread para não travar o event loop.
+        chroma_delete_success = await asyncio.to_thread(delete_doc_from_chroma, file_id)
         if chroma_delete_success:
-            logging.info(f"Documento com file_id {file_id} excluído do Chroma.")
-            # Se a exclusão do Chroma for bem-sucedida, tenta excluir do banco de dados.
-            db_delete_success = delete_document_record(file_id)
+            logging.info(f"Documento com file_id {file_id} excluído do armazenamento vetorial.")
+            semantic_cache.invalidate()
+            # Se a exclusão do armazenamento vetorial for bem-sucedida, tenta excluir do banco de dados.
+            db_delete_success = await asyncio.to_thread(delete_document_record, file_id)
             if db_delete_success:
                 logging.info(f"Documento com file_id {file_id} excluído do banco de dados.")
                 return {"message": f"Documento com file_id {file_id} excluído com sucesso do sistema."}
             else:
                 logging.error(
-                    f"Excluído do Chroma, mas falha ao excluir documento com file_id {file_id} do banco de dados.")
+                    f"Excluído do armazenamento vetorial, mas falha ao excluir documento com file_id {file_id} do banco de dados.")
                 # Retorna um erro 500 se a exclusão do DB falhar.
                 raise HTTPException(status_code=500,
-                                    detail=f"Excluído do Chroma, mas falha ao excluir documento com file_id {file_id} do banco de dados.")
+                                    detail=f"Excluído do armazenamento vetorial, mas falha ao excluir documento com file_id {file_id} do banco de dados.")
         else:
-            logging.error(f"Falha ao excluir documento com file_id {file_id} do Chroma.")
-            # Retorna um erro 500 se a exclusão do Chroma falhar.
-            raise HTTPException(status_code=500, detail=f"Falha ao excluir documento com file_id {file_id} do Chroma.")
+            logging.error(f"Falha ao excluir documento com file_id {file_id} do armazenamento vetorial.")
+            # Retorna um erro 500 se a exclusão do armazenamento vetorial falhar.
+            raise HTTPException(status_code=500, detail=f"Falha ao excluir documento com file_id {file_id} do armazenamento vetorial.")
     except Exception as e:
         logging.error(f"Erro geral ao excluir documento com file_id {file_id}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Ocorreu um erro ao excluir documento: {e}")
\ No newline at end of file
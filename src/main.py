@@ -1,15 +1,66 @@
 # mcp_server/main.py
+import time
+
+# Marca o início da importação dos módulos da aplicação (tempo registrado em startup_state).
+_import_started = time.perf_counter()
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from mcp_server.router_api import router as mcp_api_router
-import logging
+from mcp.config import STARTUP_CONFIG
+from mcp.rag.chroma_utils import get_vector_backend
+from mcp.rag.db_utils import init_database
+from mcp.rag.ingestion_pipeline import shutdown_process_pool
+from mcp.rag.langchain_utils import warm_rag_chains
+from mcp.rag.retrieval import warm_retrieval
+from mcp.rag.session_memory import session_memory
+from mcp.utils.startup import startup_state
 
 # Configura o logging para a aplicação.
 logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+startup_state.record_import_time(time.perf_counter() - _import_started)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # O processo passa a aceitar conexões imediatamente (liveness); o aquecimento roda em
+    # segundo plano e /health/ready só responde 200 quando ele termina.
+    warm_up_task = None
+    if STARTUP_CONFIG["warm_up"]:
+        warm_up_task = asyncio.create_task(startup_state.warm_up(
+            {
+                # Cria e migra as tabelas do SQLite (não é feito na importação de db_utils).
+                "database": init_database,
+                # Abre o armazenamento vetorial (no Chroma, cria também o modelo de embeddings e seu cache).
+                "vector_store": get_vector_backend,
+                # Pré-constrói as cadeias RAG e de conversa, criando os clientes dos modelos.
+                "models": warm_rag_chains,
+                # Constrói o índice BM25 da recuperação híbrida a partir dos pedaços já indexados.
+                "retrieval": warm_retrieval,
+            },
+            parallel=STARTUP_CONFIG["parallel_warm_up"],
+            timeout=STARTUP_CONFIG["warm_up_timeout_seconds"],
+        ))
+    else:
+        startup_state.mark_ready()
+    yield
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+    # Grava os logs de chat que ainda aguardam a gravação em lote (chat_log_writer).
+    session_memory.flush()
+    # Encerra os processos de parsing da ingestão (aguardar o fim deles bloquearia o event loop).
+    await asyncio.to_thread(shutdown_process_pool)
+
+
 app = FastAPI(
     title="MCP AI Server",
     description="Multi-Channel Processor AI Server with Smart Routing and RAG support.",
     version="0.0.1",
+    lifespan=lifespan,
 )
 
 # Inclui o APIRouter do router_api.py
@@ -17,4 +68,19 @@ app.include_router(mcp_api_router, prefix="/api/v1")
 
 @app.get("/")
 async def root():
-    return {"message": "Welcome to the MCP AI Server! Access /api/v1/docs for API documentation."}
\ No newline at end of file
+    return {"message": "Welcome to the MCP AI Server! Access /api/v1/docs for API documentation."}
+
+@app.get("/health/live")
+async def liveness():
+    # O processo está de pé e o event loop responde; não depende de serviços externos.
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    # 200 quando o aquecimento terminou e as etapas obrigatórias estão prontas; 503 caso contrário.
+    # Enquanto não está pronto, as etapas obrigatórias que falharam são tentadas de novo em
+    # segundo plano, e a próxima verificação reflete o resultado.
+    report = startup_state.report()
+    if not report["ready"] and startup_state.retry_failed(STARTUP_CONFIG["ready_retry_interval_seconds"]):
+        report["retrying"] = True
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
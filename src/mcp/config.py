@@ -39,9 +39,26 @@ MODEL_CONFIGS = {
         "engine": "gemini",
         "description": "Google Gemini 2.0 Flash model.",
         "max_tokens": 8192,
+        "temperature": 0.7,
+        "context_window": 1048576, # Tokens aceitos na entrada (prompt + histórico + contexto)
+        "history_token_budget": 4000, # Tokens do histórico da sessão enviados ao modelo
+        "context_token_budget": 6000, # Tokens dos pedaços recuperados enviados ao modelo
+        "max_concurrency": 256, # Máximo de chamadas simultâneas ao modelo por worker
         "cost_per_token_input": 0.0000001, # Exemplo de custo por token
         "cost_per_token_output": 0.0000002,
     },
+    "gemini-2.5-flash-lite": {
+        "engine": "gemini",
+        "description": "Google Gemini 2.5 Flash-Lite model.",
+        "max_tokens": 8192,
+        "temperature": 0.7,
+        "context_window": 1048576,
+        "history_token_budget": 4000,
+        "context_token_budget": 4000,
+        "max_concurrency": 256,
+        "cost_per_token_input": 0.0000001,
+        "cost_per_token_output": 0.0000004,
+    },
     # Adicione outros modelos aqui
     # "gpt-4o": {
     #     "engine": "openai",
@@ -50,4 +67,159 @@ MODEL_CONFIGS = {
     #     "cost_per_token_input": 0.000005,
     #     "cost_per_token_output": 0.000015,
     # },
-}
\ No newline at end of file
+}
+
+# Configuração do roteamento de modelos (mcp/engines/model_router.py).
+ROUTING_CONFIG = {
+    "latency_slo_seconds": 10.0, # Latência p95 acima da qual um modelo é considerado lento
+    "max_error_rate": 0.25, # Taxa de erro recente acima da qual um modelo é considerado instável
+    "min_samples": 10, # Chamadas recentes necessárias para avaliar latência e erros de um modelo
+    "rate_limit_cooldown_seconds": 30, # Tempo fora do roteamento após um erro de limite de taxa
+    "max_attempts": 2, # Modelos tentados por requisição (o primeiro mais os de failover)
+    "timeout_seconds": 60, # Tempo máximo de uma chamada antes de tentar outro modelo
+    "expected_output_tokens": 512, # Tamanho estimado da resposta, usado no custo e no orçamento
+    "prompt_overhead_tokens": 200, # Tokens das instruções fixas dos prompts
+}
+
+# Configuração do chat em lote (/chat/batch) e da coalescência de requisições idênticas
+# (mcp/engines/request_coalescing.py).
+CHAT_BATCH_CONFIG = {
+    "max_batch_size": 1000, # Perguntas aceitas por requisição em /chat/batch
+    "max_concurrency": 16, # Perguntas de um lote processadas ao mesmo tempo (máximo aceito por requisição)
+    # /chat e /chat/batch compartilham uma única recuperação e chamada ao modelo entre perguntas
+    # idênticas (mesma pergunta, histórico, roteamento e parâmetros de recuperação) em andamento.
+    "coalesce_requests": True,
+}
+
+# Configuração da inicialização da aplicação (main.py e mcp/utils/startup.py).
+STARTUP_CONFIG = {
+    # Aquece os componentes (banco de dados, armazenamento vetorial, clientes dos modelos, índice
+    # BM25) logo após o processo subir, em segundo plano. Sem aquecimento, cada componente é
+    # criado no primeiro uso.
+    "warm_up": True,
+    "parallel_warm_up": True, # Aquece os componentes em paralelo (threads) em vez de um por vez
+    "warm_up_timeout_seconds": 120, # Tempo máximo de cada etapa do aquecimento
+    # Etapas que precisam concluir com sucesso para o worker ser considerado pronto (/health/ready).
+    "required_components": ["database", "vector_store", "models"],
+    # Intervalo mínimo entre as novas tentativas das etapas obrigatórias que falharam, feitas a
+    # cada verificação de /health/ready enquanto o worker não está pronto.
+    "ready_retry_interval_seconds": 10,
+}
+
+# Configuração do perfilamento das requisições lentas (mcp/utils/metrics.py e mcp/utils/profiling.py).
+PROFILING_CONFIG = {
+    # Requisições acima deste tempo têm o detalhamento por etapa registrado no log.
+    "slow_request_seconds": 5.0,
+    "enabled": False, # Perfila uma amostra das requisições com cProfile
+    "sample_rate": 0.01, # Fração das requisições perfiladas (o perfil só é gravado se ela for lenta)
+    "output_dir": "profiles", # Pasta onde os perfis (.prof) são gravados
+    "top_functions": 25, # Funções mais custosas listadas no log
+}
+
+# Configuração do banco de dados SQLite da aplicação (mcp/rag/db_utils.py).
+DATABASE_CONFIG = {
+    "path": "rag_app.db",
+    "busy_timeout_ms": 30000, # Espera máxima por outro worker que esteja gravando
+    "log_flush_interval_seconds": 1.0, # Intervalo máximo até gravar os logs de chat
+    "log_batch_size": 200, # Logs de chat gravados por transação
+    "documents_page_size": 100, # Documentos por página em /documents (padrão)
+    "documents_max_page_size": 1000, # Maior página aceita em /documents
+}
+
+# Configuração da memória das sessões de chat (mcp/rag/session_memory.py).
+SESSION_MEMORY_CONFIG = {
+    "max_sessions": 1000, # Sessões mantidas em memória por worker (LRU)
+    "history_token_budget": 2000, # Orçamento do histórico para modelos sem "history_token_budget"
+    "summarize_min_turns": 2, # Interações fora da janela acumuladas antes de atualizar o resumo
+    "summary_model": "gemini-2.5-flash-lite", # Modelo usado para gerar os resumos (um de MODEL_CONFIGS)
+    "summary_max_words": 250, # Tamanho máximo do resumo acumulado
+    # Confere, a cada requisição, se outro worker registrou interações da sessão (uma contagem
+    # indexada no SQLite). Pode ser desativado com sessões fixas por worker (sticky sessions).
+    "validate_across_workers": True,
+}
+
+# Configuração do cache semântico de respostas (mcp/rag/semantic_cache.py).
+SEMANTIC_CACHE_CONFIG = {
+    "enabled": True,
+    "similarity_threshold": 0.95, # Similaridade de cosseno mínima para reutilizar uma resposta
+    "ttl_seconds": 3600, # Tempo de vida de cada resposta em cache
+    "max_entries": 10000, # Número máximo de respostas em cache
+    "max_memory_mb": 64, # Memória máxima aproximada ocupada pelo cache
+}
+
+# Arquivo cuja alteração sinaliza, para todos os workers, que o conjunto de documentos mudou
+# (mcp/rag/corpus_version.py).
+CORPUS_VERSION_FILE = os.path.join("chroma_data", "corpus_version")
+
+
+# Configuração do cache persistente de embeddings (mcp/rag/embedding_cache.py).
+EMBEDDING_CACHE_CONFIG = {
+    "path": "embedding_cache.db", # Banco SQLite local com os vetores já calculados
+    "batch_size": 100, # Pedaços por chamada à API de embeddings
+    "max_concurrency": 4, # Chamadas simultâneas à API de embeddings
+    "query_memo_size": 2048, # Embeddings de perguntas recentes mantidos em memória por worker
+}
+
+
+# Configuração da fila de jobs de ingestão de documentos (mcp/rag/ingestion_jobs.py).
+INGESTION_CONFIG = {
+    "upload_folder": "temp_docs", # Pasta onde os uploads aguardam o processamento
+    "max_workers": 2, # Jobs de ingestão executados em paralelo por worker do uvicorn
+    "max_retries": 3, # Novas tentativas de um job após uma falha
+    "retry_backoff_seconds": 2, # Espera antes da primeira nova tentativa (dobra a cada tentativa)
+    "job_lease_seconds": 60, # Prazo de um job sem renovação até ser considerado abandonado
+    "upsert_batch_size": 256, # Pedaços embutidos e gravados no Chroma por lote
+    "parse_workers": os.cpu_count() or 1, # Processos usados para ler e dividir documentos
+    "pages_per_task": 8, # Páginas de PDF lidas por tarefa do pool de processos
+    "max_inflight_tasks": 8, # Tarefas em processamento por arquivo (limita a memória usada)
+    "chunk_size": 1000, # Tamanho dos pedaços gerados pelo RecursiveCharacterTextSplitter
+    "chunk_overlap": 200, # Sobreposição entre pedaços consecutivos
+    "bulk_upsert_batch_size": 1000, # Pedaços por escrita no Chroma na ingestão em massa
+    "bulk_import_root": "import_docs", # Única pasta do servidor aceita por /ingest/path
+    "zip_max_entries": 10000, # Máximo de arquivos em um .zip enviado para ingestão
+    "zip_max_uncompressed_bytes": 2 * 1024 ** 3, # Tamanho máximo, descompactado, do conteúdo de um .zip
+}
+
+
+# Configuração da recuperação híbrida BM25 + vetorial (mcp/rag/retrieval.py).
+RETRIEVAL_CONFIG = {
+    "k": 4, # Pedaços enviados ao modelo por pergunta (padrão, ajustável por requisição)
+    "max_k": 20, # Maior "k" aceito em uma requisição
+    "fetch_k": 20, # Candidatos buscados em cada índice (vetorial e BM25) antes da fusão
+    "use_bm25": True, # Combina a busca vetorial com a busca por palavras-chave (BM25)
+    "rrf_k": 60, # Constante da fusão por posição recíproca (reciprocal rank fusion)
+    "bm25_k1": 1.5, # Saturação da frequência dos termos no BM25
+    "bm25_b": 0.75, # Normalização pelo tamanho do pedaço no BM25
+    "score_threshold": None, # Similaridade de cosseno mínima com a pergunta (None desativa)
+    "use_mmr": True, # Diversifica os pedaços escolhidos (maximal marginal relevance)
+    "mmr_lambda": 0.7, # Peso da relevância frente à diversidade no MMR (1.0 = só relevância)
+    # Cross-encoder local para reordenar os candidatos (requer sentence-transformers;
+    # ex.: "cross-encoder/ms-marco-MiniLM-L-6-v2"). None desativa a etapa.
+    "reranker_model": None,
+    "rerank_top_n": 20, # Candidatos reordenados pelo cross-encoder
+}
+
+
+# Configuração do empacotamento do contexto enviado ao modelo (mcp/rag/context_packing.py).
+CONTEXT_PACKING_CONFIG = {
+    "enabled": True,
+    "context_token_budget": 3000, # Orçamento do contexto para modelos sem "context_token_budget"
+    "min_overlap_chars": 30, # Menor sobreposição de texto entre dois pedaços que os une
+    "duplicate_threshold": 0.85, # Fração de trechos em comum a partir da qual um pedaço é descartado
+    "shingle_words": 5, # Palavras por trecho na comparação de quase-duplicatas
+    "min_trimmed_tokens": 64, # Menor sobra do orçamento aproveitada com um pedaço cortado
+}
+
+
+# Configuração do armazenamento vetorial (mcp/rag/vector_store.py e mcp/rag/mmap_store.py).
+VECTOR_STORE_CONFIG = {
+    # "chroma" usa o Chroma em CHROMA_PATH; "mmap" usa o índice NumPy mapeado em memória,
+    # compartilhado entre os workers (para migrar: python -m mcp.rag.vector_migration).
+    "backend": "chroma",
+    "mmap_path": "vector_index", # Pasta do índice mmap
+    "quantization": "int8", # Tipo dos vetores do índice mmap: "float32", "float16" ou "int8" (float16 ocupa
+                            # metade do disco, mas a conversão para float32 torna a busca mais lenta na CPU)
+    "compact_min_rows": 20000, # Pedaços novos ou removidos que disparam a compactação do índice mmap
+    "compact_ratio": 0.2, # ... ou esta fração do índice, o que for maior
+    "search_block_rows": 8192, # Linhas avaliadas por vez na busca mmap (limita a memória temporária)
+}
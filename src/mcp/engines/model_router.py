@@ -0,0 +1,205 @@
+# mcp/engines/model_router.py
+# Este arquivo implementa o roteamento de modelos ("Smart Routing"). Para cada requisição ele
+# decide se a recuperação de documentos é necessária (context_type 'rag' ou 'chat') e em que
+# ordem os modelos de MODEL_CONFIGS devem ser tentados, considerando o tamanho do prompt, a
+# janela de contexto, o custo por token e a saúde recente de cada modelo (latência p95, taxa de
+# erro e limites de taxa). Se uma chamada ao modelo falha ou excede o tempo limite, o próximo
+# modelo da lista é tentado. A saúde de cada modelo considera apenas as chamadas a ele (medidas
+# pelo callback ModelCallTracker): a espera no semáforo do modelo, a recuperação de documentos e
+# os erros do armazenamento vetorial não contam como latência ou falha do modelo.
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+from mcp.config import MODEL_CONFIGS, ROUTING_CONFIG, RETRIEVAL_CONFIG, INGESTION_CONFIG
+from mcp.rag.chain_metrics import ModelCallTracker
+from mcp.rag.langchain_utils import supported_engines, get_model_semaphore
+from mcp.utils.helpers import estimate_tokens
+from mcp.utils.metrics import get_model_health, record_model_call
+
+logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Tipos de contexto aceitos em QueryInput.context_type.
+CONTEXT_TYPE_CHAT = "chat"
+CONTEXT_TYPE_RAG = "rag"
+
+T = TypeVar("T")
+
+
+@dataclass
+class RoutingDecision:
+    """O resultado do roteamento de uma requisição."""
+    use_retrieval: bool  # Se a pergunta passa pela recuperação de documentos.
+    candidates: List[str]  # Modelos na ordem em que devem ser tentados.
+    prompt_tokens: int  # Tamanho estimado do prompt enviado ao modelo.
+    reasons: List[str] = field(default_factory=list)  # Motivo da posição de cada modelo.
+
+    @property
+    def model(self) -> str:
+        """O modelo escolhido (o primeiro candidato)."""
+        return self.candidates[0]
+
+
+def estimate_prompt_tokens(question: str, chat_history: List[dict], use_retrieval: bool,
+                           k: Optional[int] = None) -> int:
+    """
+    Estima o tamanho do prompt de uma requisição: instruções, histórico, pergunta e, na
+    recuperação, os k pedaços de documento.
+
+    Args:
+        question (str): A pergunta do usuário.
+        chat_history (List[dict]): O histórico de chat da sessão.
+        use_retrieval (bool): Se os pedaços recuperados entram no prompt.
+        k (Optional[int]): Pedaços recuperados (padrão: RETRIEVAL_CONFIG["k"]).
+
+    Returns:
+        int: O número estimado de tokens.
+    """
+    tokens = ROUTING_CONFIG["prompt_overhead_tokens"] + estimate_tokens(question)
+    tokens += sum(estimate_tokens(message["content"]) for message in chat_history)
+    if use_retrieval:
+        tokens += (k or RETRIEVAL_CONFIG["k"]) * INGESTION_CONFIG["chunk_size"] // 4
+    return tokens
+
+
+def _estimated_cost(model_config: dict, prompt_tokens: int) -> float:
+    """Custo estimado de uma chamada: tokens de entrada e a resposta esperada."""
+    return (prompt_tokens * model_config.get("cost_per_token_input", 0.0)
+            + ROUTING_CONFIG["expected_output_tokens"] * model_config.get("cost_per_token_output", 0.0))
+
+
+def plan_route(question: str, chat_history: List[dict], context_type: str,
+               requested_model: Optional[str] = None, k: Optional[int] = None) -> RoutingDecision:
+    """
+    Decide se a recuperação é necessária e a ordem em que os modelos devem ser tentados.
+
+    Os modelos são divididos em níveis: saudáveis; lentos (latência p95 acima do SLO) ou
+    instáveis (taxa de erro acima do limite); e em espera após um limite de taxa. Modelos cuja
+    janela de contexto não comporta o prompt são descartados. Dentro de cada nível, o modelo
+    pedido pelo cliente vem primeiro; os demais são ordenados pelo custo estimado e, em
+    seguida, pela latência p95.
+
+    Args:
+        question (str): A pergunta do usuário.
+        chat_history (List[dict]): O histórico de chat da sessão.
+        context_type (str): 'chat' (sem recuperação) ou 'rag'.
+        requested_model (Optional[str]): O modelo pedido pelo cliente (None para escolha automática).
+        k (Optional[int]): Pedaços recuperados por pergunta.
+
+    Returns:
+        RoutingDecision: A decisão de roteamento.
+
+    Raises:
+        ValueError: Se nenhum modelo configurado comporta o prompt.
+    """
+    use_retrieval = context_type != CONTEXT_TYPE_CHAT
+    prompt_tokens = estimate_prompt_tokens(question, chat_history, use_retrieval, k)
+    ranked = []
+    reasons = {}
+    for model, model_config in MODEL_CONFIGS.items():
+        if model_config.get("engine") not in supported_engines():
+            continue
+        budget = model_config.get("context_window", model_config.get("max_tokens", 0))
+        if prompt_tokens + ROUTING_CONFIG["expected_output_tokens"] > budget:
+            logging.info(f"Roteamento: modelo {model} descartado, prompt de ~{prompt_tokens} tokens "
+                         f"excede a janela de {budget}.")
+            continue
+
+        health = get_model_health(model)
+        evaluated = health["samples"] >= ROUTING_CONFIG["min_samples"]
+        p95 = health["latency_p95_ms"] / 1000
+        if health["cooldown_remaining_s"] > 0:
+            tier, reason = 2, f"em espera após limite de taxa ({health['cooldown_remaining_s']:.0f} s)"
+        elif evaluated and health["error_rate"] > ROUTING_CONFIG["max_error_rate"]:
+            tier, reason = 1, f"instável (taxa de erro {health['error_rate']:.0%})"
+        elif evaluated and p95 > ROUTING_CONFIG["latency_slo_seconds"]:
+            tier, reason = 1, f"lento (p95 {p95:.2f} s)"
+        else:
+            tier, reason = 0, "saudável"
+        cost = _estimated_cost(model_config, prompt_tokens)
+        reasons[model] = f"{model}: {reason}, custo estimado {cost:.6f}"
+        ranked.append((tier, model != requested_model, cost, p95, model))
+
+    if not ranked:
+        raise ValueError(f"Nenhum modelo configurado comporta um prompt de ~{prompt_tokens} tokens.")
+
+    candidates = [entry[-1] for entry in sorted(ranked)]
+    decision = RoutingDecision(use_retrieval=use_retrieval, candidates=candidates, prompt_tokens=prompt_tokens,
+                               reasons=[reasons[model] for model in candidates])
+    logging.info(f"Roteamento: context_type={context_type}, recuperação={use_retrieval}, "
+                 f"modelo pedido={requested_model or 'automático'}, prompt ~{prompt_tokens} tokens, "
+                 f"ordem={candidates}. " + "; ".join(decision.reasons))
+    return decision
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """
+    Indica se um erro é um limite de taxa ou de cota do provedor (HTTP 429).
+
+    Args:
+        error (Exception): O erro da chamada.
+
+    Returns:
+        bool: True para erros de limite de taxa.
+    """
+    if type(error).__name__ in ("ResourceExhausted", "RateLimitError", "TooManyRequests"):
+        return True
+    message = str(error).lower()
+    return "429" in message or "rate limit" in message or "quota" in message or "resource exhausted" in message
+
+
+def record_failure(model: str, latency: float, error: Exception) -> None:
+    """
+    Registra uma chamada com falha, colocando o modelo em espera se for um limite de taxa.
+
+    Args:
+        model (str): O modelo chamado.
+        latency (float): A duração da chamada, em segundos.
+        error (Exception): O erro da chamada.
+    """
+    cooldown = ROUTING_CONFIG["rate_limit_cooldown_seconds"] if is_rate_limit_error(error) else None
+    record_model_call(model, latency, ok=False, cooldown_seconds=cooldown)
+
+
+async def ainvoke_with_failover(decision: RoutingDecision,
+                                call: Callable[[str, ModelCallTracker], Awaitable[T]]) -> Tuple[str, T]:
+    """
+    Executa uma chamada no primeiro modelo da decisão, tentando os seguintes em caso de falha
+    ou de tempo limite de uma chamada ao modelo, até ROUTING_CONFIG["max_attempts"] modelos.
+
+    O semáforo do modelo é obtido antes de iniciar o tempo limite, e a chamada deve passar o
+    ModelCallTracker recebido em config["callbacks"] da cadeia. Só o tempo e os erros das
+    chamadas ao modelo entram na saúde dele. Um erro fora delas (ex.: na recuperação) é
+    repassado sem failover, pois ele se repetiria com qualquer modelo.
+
+    Args:
+        decision (RoutingDecision): A decisão de roteamento.
+        call (Callable[[str, ModelCallTracker], Awaitable[T]]): Recebe o nome do modelo e o
+            callback de medição e executa a chamada.
+
+    Returns:
+        Tuple[str, T]: O modelo que respondeu e o resultado da chamada.
+
+    Raises:
+        Exception: O erro do último modelo tentado, ou um erro que não veio do modelo.
+    """
+    attempts = decision.candidates[:ROUTING_CONFIG["max_attempts"]]
+    for attempt, model in enumerate(attempts, start=1):
+        tracker = ModelCallTracker()
+        async with get_model_semaphore(model):
+            try:
+                result = await asyncio.wait_for(call(model, tracker), timeout=ROUTING_CONFIG["timeout_seconds"])
+            except Exception as e:
+                if not tracker.failed:
+                    raise
+                record_failure(model, tracker.llm_seconds, e)
+                if attempt == len(attempts):
+                    raise
+                logging.warning(f"Roteamento: modelo {model} falhou após {tracker.llm_seconds:.2f} s "
+                                f"({type(e).__name__}: {e}). Failover para {attempts[attempt]}.")
+                continue
+        if tracker.calls:
+            record_model_call(model, tracker.llm_seconds, ok=True)
+        return model, result
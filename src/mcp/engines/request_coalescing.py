@@ -0,0 +1,71 @@
+# mcp/engines/request_coalescing.py
+# Este arquivo implementa a coalescência de requisições idênticas em andamento. Quando a mesma
+# pergunta (com o mesmo histórico, roteamento e parâmetros de recuperação) chega de várias
+# sessões ao mesmo tempo, apenas a primeira executa a recuperação e a chamada ao modelo; as
+# demais aguardam e recebem o mesmo resultado. Complementa o cache semântico, que só atende
+# as perguntas depois que a primeira resposta foi gerada.
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+T = TypeVar("T")
+
+
+class RequestCoalescer:
+    """
+    Compartilha uma chamada assíncrona entre as requisições com a mesma chave enquanto ela
+    está em andamento. A chamada roda em uma tarefa própria: se a requisição que a iniciou for
+    cancelada (ex.: o cliente desconectou), as demais continuam aguardando o resultado.
+    Erros são repassados a todas as requisições que aguardavam; a próxima tenta de novo.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def _finished(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Marca o erro como lido quando nenhuma requisição ficou esperando por ele.
+            task.exception()
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Executa a chamada, ou aguarda a chamada idêntica já em andamento.
+
+        Args:
+            key (Hashable): Identifica requisições equivalentes.
+            call (Callable[[], Awaitable[T]]): Cria a chamada (só é usada se não houver outra em andamento).
+
+        Returns:
+            Tuple[T, bool]: O resultado e se ele foi compartilhado com outra requisição.
+        """
+        task = self._inflight.get(key)
+        shared = task is not None
+        if shared:
+            self.followers += 1
+        else:
+            task = asyncio.ensure_future(call())
+            self._inflight[key] = task
+            task.add_done_callback(lambda finished: self._finished(key, finished))
+            self.leaders += 1
+        return await asyncio.shield(task), shared
+
+    def stats(self) -> dict:
+        """
+        Retorna os contadores da coalescência.
+
+        Returns:
+            dict: Chamadas executadas, requisições atendidas por uma chamada já em andamento
+            e chamadas em andamento.
+        """
+        return {"leaders": self.leaders, "followers": self.followers, "inflight": len(self._inflight)}
+
+
+# Instância compartilhada, usada por /chat e /chat/batch.
+chat_coalescer = RequestCoalescer()
@@ -2,12 +2,14 @@
 from pydantic import BaseModel, Field
 from enum import Enum
 from datetime import datetime
+from typing import List, Literal, Optional
 
 # Enum para definir os nomes dos modelos de linguagem permitidos.
 class ModelName(str, Enum):
     # Definimos os modelos que você quer usar.
     # Por enquanto, apenas o Gemini Flash, mas você pode adicionar outros aqui.
     GEMINI_2_0_FLASH = "gemini-2.0-flash"
+    GEMINI_2_5_FLASH_LITE = "gemini-2.5-flash-lite"
     # Adicione outros modelos conforme necessário, por exemplo:
     # GPT_4O = "gpt-4o"
     # CLAUDE_3_SONNET = "claude-3-sonnet-20240229"
@@ -17,14 +19,27 @@ class ModelName(str, Enum):
 class QueryInput(BaseModel):
     question: str  # A pergunta do usuário (obrigatória).
     session_id: str = Field(default=None)  # ID da sessão (opcional, será gerado se não for fornecido).
-    model: ModelName = Field(default=ModelName.GEMINI_2_0_FLASH)  # Modelo de linguagem a ser usado, com padrão.
-    context_type: str = Field(default="chat", description="Tipo de contexto da requisição: 'chat' ou 'rag'.") # NOVO: Para roteamento
+    # Modelo preferido. Sem modelo, o roteamento escolhe pelo custo e pela saúde de cada modelo;
+    # com modelo, ele é usado enquanto estiver saudável, com failover para os demais.
+    model: Optional[ModelName] = Field(default=None)
+    # 'rag' consulta os documentos indexados; 'chat' responde apenas com o histórico, sem recuperação.
+    context_type: Literal["chat", "rag"] = Field(default="rag", description="Tipo de contexto da requisição: 'chat' ou 'rag'.")
+    k: Optional[int] = Field(default=None, ge=1, le=20, description="Pedaços de documento enviados ao modelo.")
+    file_ids: Optional[List[int]] = Field(default=None, description="Restringe a recuperação a estes documentos.")
+    score_threshold: Optional[float] = Field(default=None, ge=-1.0, le=1.0,
+                                             description="Similaridade de cosseno mínima dos pedaços recuperados.")
 
 # Modelo para a resposta de uma consulta de chat.
 class QueryResponse(BaseModel):
     answer: str  # A resposta gerada pelo modelo.
     session_id: str  # O ID da sessão.
-    model: ModelName  # O modelo usado para gerar a resposta.
+    model: ModelName  # O modelo que efetivamente gerou a resposta (após roteamento e failover).
+
+# Modelo para a entrada de um lote de consultas de chat (/chat/batch).
+class BatchQueryInput(BaseModel):
+    queries: List[QueryInput] = Field(min_length=1, description="As perguntas, respondidas de forma independente.")
+    max_concurrency: Optional[int] = Field(default=None, ge=1,
+                                           description="Perguntas processadas ao mesmo tempo (limitado pelo servidor).")
 
 # Modelo para informações sobre um documento indexado.
 class DocumentInfo(BaseModel):
@@ -34,4 +49,47 @@ class DocumentInfo(BaseModel):
 
 # Modelo para a requisição de exclusão de arquivo.
 class DeleteFileRequest(BaseModel):
-    file_id: int  # ID do arquivo a ser excluído.
\ No newline at end of file
+    file_id: int  # ID do arquivo a ser excluído.
+
+# Modelo para a requisição de ingestão em massa a partir de uma pasta ou .zip do servidor.
+class BulkIngestPathRequest(BaseModel):
+    path: str  # Caminho relativo à pasta de importação do servidor (pasta ou arquivo .zip).
+
+# Modelo para o resultado da ingestão de um arquivo na ingestão em massa.
+class BulkIngestFileResult(BaseModel):
+    filename: str  # Nome do arquivo.
+    status: str  # 'indexed', 'updated', 'unchanged', 'duplicate', 'duplicate_name', 'busy', 'unsupported' ou 'failed'.
+    file_id: Optional[int] = None  # ID do documento (o existente, em caso de duplicata).
+    chunks: int = 0  # Pedaços do documento.
+    chunks_unchanged: int = 0  # Pedaços inalterados em relação à versão anterior.
+    chunks_deleted: int = 0  # Pedaços obsoletos removidos.
+    error: Optional[str] = None  # Mensagem de erro, se a ingestão falhou.
+
+# Modelo para a resposta da ingestão em massa.
+class BulkIngestResponse(BaseModel):
+    files: List[BulkIngestFileResult]  # Resultado por arquivo.
+    documents_indexed: int  # Documentos indexados (novos ou atualizados).
+    documents_updated: int  # Documentos reindexados de forma incremental.
+    chunks_indexed: int  # Pedaços indexados.
+    chunks_embedded: int  # Pedaços que precisaram ser embutidos (novos ou alterados).
+    elapsed_seconds: float  # Duração total.
+    docs_per_second: float  # Vazão em documentos por segundo.
+    chunks_per_second: float  # Vazão em pedaços por segundo.
+
+# Modelo para o status de um job de ingestão (de um documento ou em massa).
+class IngestionJobStatus(BaseModel):
+    job_id: str  # ID do job.
+    kind: str = "file"  # 'file' (um documento) ou 'bulk' (ingestão em massa).
+    file_id: Optional[int] = None  # ID do documento sendo ingerido (None na ingestão em massa).
+    filename: str  # Nome do arquivo (ou a descrição dos arquivos, na ingestão em massa).
+    status: str  # 'queued', 'running', 'completed' ou 'failed'.
+    stage: str  # Etapa atual: 'queued', 'collecting' (em massa), 'parsing', 'embedding', 'upserting' ou 'done'.
+    chunks_total: int  # Pedaços produzidos até agora (total final quando o job termina).
+    chunks_done: int  # Pedaços já gravados no Chroma.
+    chunks_unchanged: int = 0  # Pedaços inalterados em um reenvio (não foram embutidos novamente).
+    chunks_deleted: int = 0  # Pedaços obsoletos removidos em um reenvio.
+    progress: float  # Fração das páginas (ou, na ingestão em massa, dos documentos) já processadas (0 a 1).
+    attempts: int  # Tentativas realizadas.
+    chunks_per_second: float  # Vazão da indexação.
+    error: Optional[str] = None  # Mensagem de erro, se o job falhou.
+    result: Optional[BulkIngestResponse] = None  # Resultado de um job de ingestão em massa concluído.
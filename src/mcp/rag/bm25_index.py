@@ -0,0 +1,245 @@
+# mcp/rag/bm25_index.py
+# Este arquivo implementa um índice invertido BM25 em memória sobre os pedaços indexados no
+# Chroma. Ele complementa a busca vetorial em consultas com termos exatos (códigos, números de
+# peça, siglas), que os embeddings costumam representar mal. O índice é mantido de forma
+# incremental a cada gravação ou exclusão de pedaços (veja chroma_utils).
+
+import re
+import math
+import heapq
+import logging
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Palavras e identificadores compostos, como "AB-123.4" ou "v2/api".
+_TOKEN_PATTERN = re.compile(r"\w+(?:[-./:]\w+)*")
+_PART_SEPARATORS = re.compile(r"[-./:]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Divide um texto em termos para o BM25: minúsculas, sem acentos. Identificadores compostos
+    geram o termo inteiro e também cada uma das suas partes, para que "AB-123" seja encontrado
+    tanto por "ab-123" quanto por "123".
+
+    Args:
+        text (str): O texto.
+
+    Returns:
+        List[str]: Os termos, na ordem em que aparecem.
+    """
+    normalized = unicodedata.normalize("NFKD", text.lower())
+    normalized = "".join(char for char in normalized if not unicodedata.combining(char))
+    terms = []
+    for token in _TOKEN_PATTERN.findall(normalized):
+        terms.append(token)
+        parts = _PART_SEPARATORS.split(token)
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part)
+    return terms
+
+
+class BM25Index:
+    """
+    Índice BM25 incremental. Cada pedaço é identificado pelo mesmo ID usado no Chroma e
+    guarda o file_id, para que as buscas possam ser filtradas por documento.
+
+    Args:
+        k1 (float): Saturação da frequência dos termos.
+        b (float): Normalização pelo tamanho do pedaço.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # Versão do corpus refletida pelo índice (None enquanto o índice não foi construído).
+        self.version: Optional[int] = None
+        self._lock = threading.RLock()
+        # Alterações feitas durante uma reconstrução (None quando não há nenhuma em andamento),
+        # reaplicadas ao novo índice na troca (veja rebuild).
+        self._journal: Optional[List[Tuple[str, tuple]]] = None
+        # Versão que o índice terá ao fim da reconstrução em andamento (veja advance_version).
+        self._rebuild_version: Optional[int] = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self._postings: Dict[str, Set[str]] = {}  # termo -> IDs dos pedaços que o contêm
+        self._doc_terms: Dict[str, Counter] = {}  # ID -> frequência de cada termo no pedaço
+        self._doc_length: Dict[str, int] = {}
+        self._doc_file: Dict[str, int] = {}
+        self._file_docs: Dict[int, Set[str]] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    @property
+    def tracking(self) -> bool:
+        """Se o índice já foi construído ou está sendo reconstruído, e portanto deve receber as gravações."""
+        return self.version is not None or self._journal is not None
+
+    def _add_one(self, doc_id: str, text: str, file_id: int) -> None:
+        if doc_id in self._doc_terms:
+            self._remove_one(doc_id)
+        terms = Counter(tokenize(text))
+        self._doc_terms[doc_id] = terms
+        self._doc_length[doc_id] = sum(terms.values())
+        self._doc_file[doc_id] = file_id
+        self._file_docs.setdefault(file_id, set()).add(doc_id)
+        self._total_length += self._doc_length[doc_id]
+        for term in terms:
+            self._postings.setdefault(term, set()).add(doc_id)
+
+    def _remove_one(self, doc_id: str) -> None:
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.discard(doc_id)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._doc_length.pop(doc_id)
+        file_id = self._doc_file.pop(doc_id)
+        file_docs = self._file_docs.get(file_id)
+        if file_docs is not None:
+            file_docs.discard(doc_id)
+            if not file_docs:
+                del self._file_docs[file_id]
+
+    def add(self, ids: List[str], texts: List[str], file_ids: List[int]) -> None:
+        """
+        Indexa (ou reindexa) pedaços.
+
+        Args:
+            ids (List[str]): Os IDs dos pedaços.
+            texts (List[str]): Os textos dos pedaços.
+            file_ids (List[int]): O file_id de cada pedaço.
+        """
+        with self._lock:
+            for doc_id, text, file_id in zip(ids, texts, file_ids):
+                self._add_one(doc_id, text, file_id)
+            if self._journal is not None:
+                self._journal.append(("add", (list(ids), list(texts), list(file_ids))))
+
+    def remove(self, ids: List[str]) -> None:
+        """
+        Remove pedaços do índice.
+
+        Args:
+            ids (List[str]): Os IDs dos pedaços.
+        """
+        with self._lock:
+            for doc_id in ids:
+                self._remove_one(doc_id)
+            if self._journal is not None:
+                self._journal.append(("remove", (list(ids),)))
+
+    def remove_file(self, file_id: int) -> None:
+        """
+        Remove todos os pedaços de um arquivo do índice.
+
+        Args:
+            file_id (int): O ID do arquivo.
+        """
+        with self._lock:
+            for doc_id in list(self._file_docs.get(file_id, ())):
+                self._remove_one(doc_id)
+            if self._journal is not None:
+                self._journal.append(("remove_file", (file_id,)))
+
+    def rebuild(self, batches: Iterable[Tuple[List[str], List[str], List[int]]], version: int) -> None:
+        """
+        Reconstrói o índice inteiro. O novo índice é montado à parte e substitui o atual de uma
+        vez, então as buscas continuam sendo atendidas durante a reconstrução. As gravações e
+        exclusões feitas por este worker enquanto os pedaços eram lidos são registradas e
+        reaplicadas ao novo índice na troca, para que nenhuma se perca.
+
+        Args:
+            batches (Iterable[Tuple[List[str], List[str], List[int]]]): Lotes (IDs, textos, file_ids).
+            version (int): A versão do corpus lida antes de começar a leitura dos pedaços.
+        """
+        with self._lock:
+            self._journal = []
+            self._rebuild_version = version
+        fresh = BM25Index(self.k1, self.b)
+        try:
+            for ids, texts, file_ids in batches:
+                fresh.add(ids, texts, file_ids)
+        except BaseException:
+            with self._lock:
+                self._journal = None
+                self._rebuild_version = None
+            raise
+        with self._lock:
+            # Reaplicar uma alteração que a leitura já tinha visto não muda o resultado.
+            for operation, arguments in self._journal:
+                getattr(fresh, operation)(*arguments)
+            self._journal = None
+            self._postings = fresh._postings
+            self._doc_terms = fresh._doc_terms
+            self._doc_length = fresh._doc_length
+            self._doc_file = fresh._doc_file
+            self._file_docs = fresh._file_docs
+            self._total_length = fresh._total_length
+            # Inclui as versões criadas por este worker durante a leitura: as alterações
+            # correspondentes acabaram de ser reaplicadas.
+            self.version = self._rebuild_version
+            self._rebuild_version = None
+        logging.info(f"Índice BM25 reconstruído com {len(fresh)} pedaços (versão do corpus {self.version}).")
+
+    def advance_version(self, previous: int, current: int) -> None:
+        """
+        Registra uma alteração do corpus feita por este worker. As gravações e exclusões já foram
+        aplicadas incrementalmente, então o índice só precisa adotar a nova versão. Se a versão
+        anterior não é a do índice, outro worker também alterou o corpus, e o índice continua
+        marcado como desatualizado para ser reconstruído. Durante uma reconstrução, a versão é
+        adotada pelo novo índice, que recebe as alterações registradas.
+
+        Args:
+            previous (int): A versão antes da alteração.
+            current (int): A nova versão.
+        """
+        with self._lock:
+            if self._journal is not None and self._rebuild_version == previous:
+                self._rebuild_version = current
+            if self.version is not None and self.version == previous:
+                self.version = current
+
+    def search(self, query: str, k: int, file_ids: Optional[List[int]] = None) -> List[Tuple[str, float]]:
+        """
+        Busca os pedaços mais relevantes para uma consulta.
+
+        Args:
+            query (str): A consulta.
+            k (int): O número máximo de resultados.
+            file_ids (Optional[List[int]]): Restringe a busca aos pedaços destes arquivos.
+
+        Returns:
+            List[Tuple[str, float]]: Pares (ID do pedaço, pontuação BM25), do mais para o menos relevante.
+        """
+        query_terms = set(tokenize(query))
+        allowed = set(file_ids) if file_ids else None
+        with self._lock:
+            total_docs = len(self._doc_terms)
+            if not total_docs or not query_terms:
+                return []
+            average_length = self._total_length / total_docs
+            scores: Dict[str, float] = {}
+            for term in query_terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id in postings:
+                    if allowed is not None and self._doc_file[doc_id] not in allowed:
+                        continue
+                    frequency = self._doc_terms[doc_id][term]
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_length[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
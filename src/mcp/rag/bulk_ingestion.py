@@ -0,0 +1,343 @@
+# mcp/rag/bulk_ingestion.py
+# Este arquivo implementa a ingestão em massa de documentos: muitos arquivos (enviados em uma
+# única requisição, em uma pasta do servidor ou em um .zip) passam por uma única execução do
+# pipeline ler/dividir -> embutir -> gravar, com lotes grandes de escrita no Chroma.
+# Arquivos já conhecidos são reindexados de forma incremental; arquivos novos cujo conteúdo
+# já está no document_store são ignorados.
+
+import os
+import time
+import uuid
+import logging
+import zipfile
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+from mcp.config import INGESTION_CONFIG
+from mcp.rag.chroma_utils import delete_doc_from_chroma
+from mcp.rag.ingestion_pipeline import iter_corpus_batches, SUPPORTED_EXTENSIONS
+from mcp.rag.incremental_index import IncrementalIndexer, restore_file
+from mcp.rag.db_utils import mark_documents_ready, delete_document_record, update_document_record, \
+    get_documents_by_hashes, get_documents_by_keys, claim_document_for_ingestion, update_ingestion_job, \
+    update_ingestion_jobs
+from mcp.rag.semantic_cache import semantic_cache
+from mcp.utils.helpers import file_content_hash
+from mcp.utils.metrics import record_stage, timed_iter
+
+logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def resolve_import_path(path: str) -> str:
+    """
+    Resolve um caminho de importação do servidor, garantindo que ele esteja dentro da
+    pasta configurada em INGESTION_CONFIG["bulk_import_root"].
+
+    Args:
+        path (str): O caminho relativo à pasta de importação (ou absoluto dentro dela).
+
+    Returns:
+        str: O caminho absoluto resolvido.
+
+    Raises:
+        ValueError: Se o caminho estiver fora da pasta de importação ou não existir.
+    """
+    root = os.path.realpath(INGESTION_CONFIG["bulk_import_root"])
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise ValueError(f"O caminho {path} está fora da pasta de importação permitida.")
+    if not os.path.exists(resolved):
+        raise ValueError(f"O caminho {path} não existe.")
+    return resolved
+
+
+def collect_files(path: str) -> List[str]:
+    """
+    Lista, recursivamente e em ordem, os arquivos de uma pasta.
+
+    Args:
+        path (str): O caminho da pasta.
+
+    Returns:
+        List[str]: Os caminhos dos arquivos encontrados.
+    """
+    files = []
+    for directory, _, filenames in os.walk(path):
+        for filename in sorted(filenames):
+            files.append(os.path.join(directory, filename))
+    return sorted(files)
+
+
+def _open_zip(zip_path: str) -> zipfile.ZipFile:
+    """
+    Abre um .zip verificando, só pelo índice do arquivo, o número de arquivos e o tamanho
+    descompactado (INGESTION_CONFIG["zip_max_entries"] e ["zip_max_uncompressed_bytes"]).
+    Assim "zip bombs" são recusados sem gravar nada em disco; a extração não grava além do
+    tamanho declarado de cada arquivo.
+    """
+    try:
+        archive = zipfile.ZipFile(zip_path)
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"O arquivo {os.path.basename(zip_path)} não é um .zip válido: {e}")
+    members = [member for member in archive.infolist() if not member.is_dir()]
+    total_size = sum(member.file_size for member in members)
+    if len(members) > INGESTION_CONFIG["zip_max_entries"]:
+        archive.close()
+        raise ValueError(f"O .zip {os.path.basename(zip_path)} tem {len(members)} arquivos; o máximo é "
+                         f"{INGESTION_CONFIG['zip_max_entries']}.")
+    if total_size > INGESTION_CONFIG["zip_max_uncompressed_bytes"]:
+        archive.close()
+        raise ValueError(f"O .zip {os.path.basename(zip_path)} tem {total_size} bytes descompactado; o máximo "
+                         f"é {INGESTION_CONFIG['zip_max_uncompressed_bytes']}.")
+    return archive
+
+
+def check_zip(zip_path: str) -> None:
+    """
+    Verifica se um .zip é válido e está dentro dos limites de extração, sem extraí-lo.
+
+    Args:
+        zip_path (str): O caminho do .zip.
+
+    Raises:
+        ValueError: Se o .zip for inválido ou exceder os limites.
+    """
+    _open_zip(zip_path).close()
+
+
+def extract_zip(zip_path: str, destination: str) -> List[str]:
+    """
+    Extrai um arquivo .zip e lista os arquivos extraídos. Os limites de check_zip são
+    verificados antes da extração.
+
+    Args:
+        zip_path (str): O caminho do .zip.
+        destination (str): A pasta de destino.
+
+    Returns:
+        List[str]: Os caminhos dos arquivos extraídos.
+
+    Raises:
+        ValueError: Se o .zip for inválido ou exceder os limites.
+    """
+    with _open_zip(zip_path) as archive:
+        archive.extractall(destination)
+    return collect_files(destination)
+
+
+def expand_archives(files: List[Tuple[str, str]], work_folder: str) -> List[Tuple[str, str]]:
+    """
+    Substitui os arquivos .zip de uma lista pelos arquivos que eles contêm. Os limites de
+    extract_zip valem para cada .zip.
+
+    Args:
+        files (List[Tuple[str, str]]): Pares (caminho do arquivo, nome exibido).
+        work_folder (str): Pasta temporária onde os .zip são extraídos.
+
+    Returns:
+        List[Tuple[str, str]]: A lista expandida, com nomes no formato "<zip>/<caminho interno>".
+
+    Raises:
+        ValueError: Se um .zip for inválido ou exceder os limites.
+    """
+    expanded = []
+    for index, (file_path, filename) in enumerate(files):
+        if os.path.splitext(filename)[1].lower() != ".zip":
+            expanded.append((file_path, filename))
+            continue
+        destination = os.path.join(work_folder, f"zip_{index}")
+        for member_path in extract_zip(file_path, destination):
+            expanded.append((member_path, f"{filename}/{os.path.relpath(member_path, destination)}"))
+    return expanded
+
+
+def _with_retries(operation, description: str):
+    """Executa uma operação com novas tentativas e backoff exponencial."""
+    max_attempts = INGESTION_CONFIG["max_retries"] + 1
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return operation()
+        except Exception as e:
+            if attempt == max_attempts:
+                raise
+            logging.warning(f"{description}: tentativa {attempt}/{max_attempts} falhou: {e}")
+            time.sleep(INGESTION_CONFIG["retry_backoff_seconds"] * 2 ** (attempt - 1))
+
+
+def run_bulk_ingestion(files: List[Tuple[str, str]],
+                       on_progress: Optional[Callable[[int, int, int], None]] = None) -> dict:
+    """
+    Indexa vários arquivos em uma única passagem do pipeline.
+
+    Um arquivo cujo nome já está no document_store é uma nova versão do documento: apenas os
+    pedaços alterados são embutidos e os obsoletos são removidos. Arquivos novos são
+    deduplicados pelo hash do conteúdo (entre si e contra o document_store). Todos são lidos e
+    divididos no pool de processos e gravados no armazenamento vetorial em lotes de
+    INGESTION_CONFIG["bulk_upsert_batch_size"] pedaços. Cada documento passa a 'ready'
+    assim que todos os seus pedaços foram gravados. Nomes repetidos na mesma requisição são
+    ambíguos (qual versão vale?), então nenhum dos arquivos com esse nome é indexado.
+
+    Cada documento indexado ganha o seu próprio job em ingestion_jobs (como em um upload
+    individual), então um upload do mesmo documento durante a ingestão em massa é recusado, e
+    documentos com um job em andamento são ignorados aqui (status 'busy').
+
+    Args:
+        files (List[Tuple[str, str]]): Pares (caminho do arquivo, nome exibido). Os arquivos não são removidos.
+        on_progress (Optional[Callable[[int, int, int], None]]): Chamado após cada lote com os
+            documentos concluídos, os documentos a indexar e os pedaços gravados até o momento.
+
+    Returns:
+        dict: Resultado por arquivo e totais (documentos e pedaços por segundo).
+    """
+    start_time = time.perf_counter()
+    results: List[dict] = []
+    to_index: List[Tuple[str, int, str]] = []
+    results_by_file_id: Dict[int, dict] = {}
+    updates: Dict[int, str] = {}  # Documentos já indexados que serão reindexados: file_id -> novo hash.
+    document_jobs: Dict[int, str] = {}  # Job de cada documento indexado: file_id -> job_id.
+    snapshots: Dict[int, Dict[str, dict]] = {}  # Pedaços das versões já indexadas dos reenvios.
+
+    # Calcula os hashes e descarta arquivos não suportados ou com nomes repetidos.
+    name_counts = Counter(filename for _, filename in files)
+    hashed = []
+    for file_path, filename in files:
+        result = {"filename": filename, "status": "", "file_id": None, "chunks": 0, "chunks_unchanged": 0,
+                  "chunks_deleted": 0, "error": None}
+        results.append(result)
+        if os.path.splitext(filename)[1].lower() not in SUPPORTED_EXTENSIONS:
+            result["status"] = "unsupported"
+            continue
+        if name_counts[filename] > 1:
+            result["status"] = "duplicate_name"
+            result["error"] = f"O nome {filename} aparece {name_counts[filename]} vezes na requisição."
+            continue
+        hashed.append((file_path, result, file_content_hash(file_path)))
+
+    def fail(file_id: int, error: Exception):
+        result = results_by_file_id[file_id]
+        if result["status"] == "failed":
+            return
+        result["status"] = "failed"
+        result["error"] = str(error)
+        result["chunks"] = 0
+        if file_id in updates:
+            # Reenvio: desfaz os pedaços já gravados da nova versão; a anterior continua indexada.
+            # Depois de finish_file, o índice já tem a nova versão completa e é mantido.
+            if file_id in snapshots:
+                restore_file(file_id, snapshots[file_id])
+        else:
+            # Documento novo: remove os pedaços parciais e o registro.
+            delete_doc_from_chroma(file_id)
+            delete_document_record(file_id)
+
+    chunks_embedded = 0
+    try:
+        # Cada arquivo é identificado pelo seu nome (caminho relativo): um nome já conhecido é uma
+        # nova versão do mesmo documento. Nomes novos ainda são deduplicados pelo hash do conteúdo.
+        by_key = get_documents_by_keys(list({result["filename"] for _, result, _ in hashed}))
+        by_hash = get_documents_by_hashes(list({content_hash for _, _, content_hash in hashed}))
+        for file_path, result, content_hash in hashed:
+            document_key = result["filename"]
+            if document_key not in by_key and content_hash in by_hash:
+                result["status"] = "duplicate"
+                result["file_id"] = by_hash[content_hash]
+                continue
+            # Consulta a identidade e registra o documento e o seu job em uma única transação.
+            claim = claim_document_for_ingestion(document_key, document_key, content_hash, str(uuid.uuid4()))
+            file_id = claim["file_id"]
+            result["file_id"] = file_id
+            if claim["status"] == "unchanged":
+                result["status"] = "unchanged"
+                continue
+            if claim["status"] == "busy":
+                result["status"] = "busy"
+                result["error"] = f"O documento já está sendo indexado pelo job {claim['job_id']}."
+                continue
+            if claim["is_update"]:
+                updates[file_id] = content_hash
+            by_hash[content_hash] = file_id
+            result["status"] = "pending"
+            results_by_file_id[file_id] = result
+            document_jobs[file_id] = claim["job_id"]
+            to_index.append((file_path, file_id, document_key))
+        update_ingestion_jobs(list(document_jobs.values()), status="running", stage="parsing",
+                              started_at=time.time())
+
+        indexer = IncrementalIndexer(list(updates))
+        snapshots.update(indexer.existing)
+        documents_done = chunks_done = 0
+        batches = iter_corpus_batches(to_index, INGESTION_CONFIG["bulk_upsert_batch_size"])
+        for batch in timed_iter(batches, "ingestion", "parse"):
+            for file_id, error in batch.failed.items():
+                fail(file_id, error)
+
+            if batch.documents:
+                embedded_before = sum(stats["embedded"] for stats in indexer.stats.values())
+                _with_retries(lambda: indexer.write_batch(batch.documents, batch.ids), "Gravação do lote")
+                chunks_embedded += sum(stats["embedded"] for stats in indexer.stats.values()) - embedded_before
+                chunks_done += len(batch.documents)
+                for doc in batch.documents:
+                    results_by_file_id[doc.metadata["file_id"]]["chunks"] += 1
+
+            completed = [file_id for file_id in batch.completed if results_by_file_id[file_id]["status"] == "pending"]
+            ready = []
+            for file_id in completed:
+                stats = indexer.finish_file(file_id)
+                snapshots.pop(file_id, None)
+                result = results_by_file_id[file_id]
+                result["chunks_unchanged"] = stats["unchanged"]
+                result["chunks_deleted"] = stats["deleted"]
+                if file_id in updates:
+                    update_document_record(file_id, result["filename"], updates[file_id])
+                    result["status"] = "updated"
+                else:
+                    ready.append(file_id)
+                    result["status"] = "indexed"
+            if ready:
+                mark_documents_ready(ready)
+            documents_done += len(batch.completed) + len(batch.failed)
+            if on_progress:
+                on_progress(documents_done, len(to_index), chunks_done)
+    except Exception as e:
+        # Falha que atinge todo o lote (ex.: API de embeddings indisponível): os documentos ainda
+        # não concluídos são marcados como falhos.
+        logging.error(f"Erro na ingestão em massa: {e}", exc_info=True)
+        for file_id, result in results_by_file_id.items():
+            if result["status"] == "pending":
+                fail(file_id, e)
+    finally:
+        _finish_document_jobs(document_jobs, results_by_file_id)
+
+    indexed = [result for result in results if result["status"] in ("indexed", "updated")]
+    if indexed or any(result["status"] == "failed" for result in results_by_file_id.values()):
+        semantic_cache.invalidate()
+
+    elapsed = time.perf_counter() - start_time
+    record_stage("ingestion", "bulk_total", elapsed)
+    chunks_indexed = sum(result["chunks"] for result in indexed)
+    documents_updated = sum(1 for result in indexed if result["status"] == "updated")
+    logging.info(f"Ingestão em massa: {len(indexed)} de {len(files)} arquivos indexados "
+                 f"({documents_updated} atualizados, {chunks_indexed} pedaços, {chunks_embedded} embutidos) "
+                 f"em {elapsed:.2f} s.")
+    return {
+        "files": results,
+        "documents_indexed": len(indexed),
+        "documents_updated": documents_updated,
+        "chunks_indexed": chunks_indexed,
+        "chunks_embedded": chunks_embedded,
+        "elapsed_seconds": elapsed,
+        "docs_per_second": len(indexed) / elapsed if elapsed > 0 else 0.0,
+        "chunks_per_second": chunks_indexed / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def _finish_document_jobs(document_jobs: Dict[int, str], results_by_file_id: Dict[int, dict]) -> None:
+    """Encerra os jobs dos documentos de uma ingestão em massa conforme o resultado de cada um."""
+    finished_at = time.time()
+    done = [job_id for file_id, job_id in document_jobs.items()
+            if results_by_file_id[file_id]["status"] in ("indexed", "updated")]
+    update_ingestion_jobs(done, status="completed", stage="done", finished_at=finished_at)
+    for file_id, job_id in document_jobs.items():
+        result = results_by_file_id[file_id]
+        if result["status"] not in ("indexed", "updated"):
+            update_ingestion_job(job_id, status="failed", error=result["error"] or "Ingestão em massa interrompida.",
+                                 finished_at=finished_at)
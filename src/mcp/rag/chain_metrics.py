@@ -0,0 +1,174 @@
+# mcp/rag/chain_metrics.py
+# Este arquivo implementa o callback do LangChain que instrumenta as cadeias de langchain_utils:
+# registra a duração das etapas internas (reescrita da pergunta, recuperação e geração) e os
+# tokens de entrada e de saída de cada chamada ao modelo, com o custo correspondente. Também
+# implementa o callback que separa, em cada execução, o tempo e os erros das chamadas ao modelo
+# (usado pelo roteamento de modelos para avaliar a saúde de cada modelo).
+
+import time
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+
+from mcp.utils.helpers import estimate_tokens
+from mcp.utils.metrics import current_pipeline, record_stage, record_token_usage
+
+logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Chamadas em andamento acompanhadas por callback. Chamadas interrompidas (ex.: o cliente fechou
+# o streaming) nunca terminam; as mais antigas são descartadas acima deste limite.
+_MAX_OPEN_RUNS = 10000
+
+# Prefixo das tags que identificam a etapa de uma chamada ao modelo (ex.: "stage:rewrite").
+STAGE_TAG_PREFIX = "stage:"
+
+
+def stage_tag(stage: str) -> str:
+    """
+    Retorna a tag que identifica a etapa de um componente da cadeia.
+
+    Args:
+        stage (str): O nome da etapa (ex.: "rewrite", "generation").
+
+    Returns:
+        str: A tag a ser passada em with_config(tags=[...]).
+    """
+    return STAGE_TAG_PREFIX + stage
+
+
+def _stage_from_tags(tags: Optional[List[str]], default: str) -> str:
+    # A tag mais interna (a última) é a do componente que gerou o evento.
+    for tag in reversed(tags or []):
+        if tag.startswith(STAGE_TAG_PREFIX):
+            return tag[len(STAGE_TAG_PREFIX):]
+    return default
+
+
+def _usage(response: LLMResult) -> Tuple[Optional[int], Optional[int], str]:
+    """Tokens informados pelo provedor (se houver) e o texto gerado."""
+    input_tokens = output_tokens = None
+    text = ""
+    for generations in response.generations:
+        for generation in generations:
+            text += generation.text
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                input_tokens = (input_tokens or 0) + usage.get("input_tokens", 0)
+                output_tokens = (output_tokens or 0) + usage.get("output_tokens", 0)
+    return input_tokens, output_tokens, text
+
+
+class ChainMetricsHandler(BaseCallbackHandler):
+    """
+    Callback que registra as etapas e o consumo de tokens das cadeias de um modelo.
+
+    Args:
+        model (str): O modelo usado pela cadeia (para a contagem de tokens e o custo).
+        pipeline (Optional[str]): O pipeline ao qual as etapas pertencem (ex.: "session_summary").
+            None usa o pipeline da requisição em andamento ("chat", "chat_stream", "chat_batch").
+    """
+
+    # Executado na própria thread do evento: é barato e preserva o contexto da requisição.
+    run_inline = True
+
+    def __init__(self, model: str, pipeline: Optional[str] = None):
+        self.model = model
+        self.pipeline = pipeline
+        self._llm_runs: Dict[UUID, Tuple[float, str, int]] = {}
+        self._retriever_runs: Dict[UUID, float] = {}
+
+    def _pipeline(self) -> str:
+        return self.pipeline or current_pipeline("chat")
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[BaseMessage]], *, run_id: UUID,
+                            tags: Optional[List[str]] = None, **kwargs: Any) -> None:
+        prompt_tokens = sum(estimate_tokens(message.content if isinstance(message.content, str)
+                                            else str(message.content))
+                            for batch in messages for message in batch)
+        self._llm_runs[run_id] = (time.perf_counter(), _stage_from_tags(tags, "llm"), prompt_tokens)
+        if len(self._llm_runs) > _MAX_OPEN_RUNS:
+            self._llm_runs.pop(next(iter(self._llm_runs)), None)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._llm_runs.pop(run_id, None)
+        if started is None:
+            return
+        start_time, stage, estimated_input = started
+        record_stage(self._pipeline(), stage, time.perf_counter() - start_time)
+        input_tokens, output_tokens, text = _usage(response)
+        record_token_usage(self.model,
+                           input_tokens if input_tokens is not None else estimated_input,
+                           output_tokens if output_tokens is not None else estimate_tokens(text),
+                           self._pipeline())
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._llm_runs.pop(run_id, None)
+        if started is not None:
+            record_stage(self._pipeline(), f"{started[1]}_error", time.perf_counter() - started[0])
+
+    def on_retriever_start(self, serialized: Dict[str, Any], query: str, *, run_id: UUID, **kwargs: Any) -> None:
+        self._retriever_runs[run_id] = time.perf_counter()
+        if len(self._retriever_runs) > _MAX_OPEN_RUNS:
+            self._retriever_runs.pop(next(iter(self._retriever_runs)), None)
+
+    def on_retriever_end(self, documents, *, run_id: UUID, **kwargs: Any) -> None:
+        start_time = self._retriever_runs.pop(run_id, None)
+        if start_time is not None:
+            record_stage(self._pipeline(), "retrieval", time.perf_counter() - start_time)
+
+    def on_retriever_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._retriever_runs.pop(run_id, None)
+
+
+class ModelCallTracker(BaseCallbackHandler):
+    """
+    Callback de uma única execução da cadeia que mede apenas as chamadas ao modelo (reescrita da
+    pergunta e geração) e guarda o erro de uma chamada que falhou. Usado pelo roteamento para
+    atribuir ao modelo só a latência e os erros dele, e não os da recuperação ou da espera no
+    semáforo. Passado em config["callbacks"] de cada ainvoke/astream.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self.calls = 0
+        self.error: Optional[BaseException] = None
+        self._elapsed = 0.0
+        self._open: Dict[UUID, float] = {}
+
+    @property
+    def failed(self) -> bool:
+        """
+        Se uma chamada ao modelo falhou ou foi interrompida (ex.: pelo tempo limite; o ainvoke
+        cancelado não chega a notificar o erro, então a chamada fica em aberto).
+        """
+        return self.error is not None or bool(self._open)
+
+    @property
+    def llm_seconds(self) -> float:
+        """Tempo gasto nas chamadas ao modelo, incluindo as que ainda estão em aberto."""
+        now = time.perf_counter()
+        return self._elapsed + sum(now - start_time for start_time in self._open.values())
+
+    def _close(self, run_id: UUID) -> bool:
+        start_time = self._open.pop(run_id, None)
+        if start_time is None:
+            return False
+        self.calls += 1
+        self._elapsed += time.perf_counter() - start_time
+        return True
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[BaseMessage]], *, run_id: UUID,
+                            **kwargs: Any) -> None:
+        self._open[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        self._close(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        if self._close(run_id):
+            self.error = error
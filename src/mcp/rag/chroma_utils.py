@@ -1,39 +1,279 @@
 # mcp/rag/chroma_utils.py
-# Este arquivo contém funções para interagir com o armazenamento vetorial Chroma,
-# incluindo indexação e exclusão de documentos.
-
-from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, UnstructuredHTMLLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_chroma import Chroma
-from typing import List
+# Este arquivo contém funções para interagir com o armazenamento vetorial, incluindo indexação e
+# exclusão de documentos. O backend (Chroma ou o índice mmap de mcp/rag/mmap_store.py) é escolhido
+# por VECTOR_STORE_CONFIG["backend"] e acessado pela interface de mcp/rag/vector_store.py.
+#
+# O modelo de embeddings e o armazenamento vetorial são criados sob demanda (get_embeddings,
+# get_vector_backend), no primeiro uso ou no aquecimento da inicialização (veja main.py), e não
+# na importação: assim a importação é rápida e a falta das credenciais não impede o processo de subir.
+
+from typing import Dict, Iterator, List, Optional, Tuple
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 import os
 import logging
+import threading
 
 # ADICIONADO: Importar para carregar credenciais da nova config
-from mcp.config import get_credentials # Importação corrigida
+from mcp.config import get_credentials, EMBEDDING_CACHE_CONFIG, INGESTION_CONFIG, RETRIEVAL_CONFIG, \
+    VECTOR_STORE_CONFIG # Importação corrigida
+from mcp.rag.embedding_cache import CachedEmbeddings
+from mcp.rag.ingestion_pipeline import iter_chunk_batches
+from mcp.rag.bm25_index import BM25Index
+from mcp.rag.corpus_version import read_corpus_version, add_corpus_listener
+from mcp.rag.vector_store import VectorStore, ChromaVectorStore
 
 # Configura o logging para este módulo.
 logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Obtém as credenciais usando a nova função de configuração
-credentials = get_credentials()
-
-# Inicializa o embedding model do Google Generative AI (Gemini).
-# O modelo padrão "models/embedding-001" é genérico para embeddings.
-embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001", credentials=credentials)
+# Nome do modelo de embeddings. Faz parte da chave do cache de embeddings.
+EMBEDDING_MODEL = "models/embedding-001"
 
 # Define o diretório onde o ChromaDB persistirá os dados.
 CHROMA_PATH = "chroma_data"
 
-# Inicializa o armazenamento vetorial Chroma com o diretório e o modelo de embeddings.
-# Isso garante que o Chroma crie/carregue seu banco de dados neste diretório.
-vectorstore = Chroma(persist_directory=CHROMA_PATH, embedding_function=embeddings)
+# Modelo de embeddings, Chroma e backend do armazenamento vetorial, criados na primeira chamada
+# de get_embeddings, get_vectorstore e get_vector_backend.
+_embeddings: Optional[CachedEmbeddings] = None
+_vectorstore = None
+_vector_backend: Optional[VectorStore] = None
+_init_lock = threading.Lock()
+_backend_lock = threading.Lock()
+
+
+def get_embeddings() -> CachedEmbeddings:
+    """
+    Retorna o modelo de embeddings compartilhado, criando-o na primeira chamada.
+
+    O modelo padrão "models/embedding-001" do Google Generative AI (Gemini) é envolvido por um
+    cache persistente: pedaços já embutidos não voltam à API.
+
+    Returns:
+        CachedEmbeddings: O modelo de embeddings com cache.
+
+    Raises:
+        FileNotFoundError: Se o arquivo de credenciais não existir.
+        RuntimeError: Se as credenciais não puderem ser carregadas.
+    """
+    global _embeddings
+    if _embeddings is None:
+        with _init_lock:
+            if _embeddings is None:
+                # Importado aqui para não pesar na importação do módulo.
+                from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+                _embeddings = CachedEmbeddings(
+                    GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL, credentials=get_credentials()),
+                    model_name=EMBEDDING_MODEL,
+                    cache_path=EMBEDDING_CACHE_CONFIG["path"],
+                    batch_size=EMBEDDING_CACHE_CONFIG["batch_size"],
+                    max_concurrency=EMBEDDING_CACHE_CONFIG["max_concurrency"],
+                    query_memo_size=EMBEDDING_CACHE_CONFIG["query_memo_size"],
+                )
+                logging.info(f"Modelo de embeddings {EMBEDDING_MODEL} inicializado.")
+    return _embeddings
+
+
+def configure_embeddings(embeddings: Embeddings, model_name: str) -> None:
+    """
+    Substitui o modelo de embeddings padrão (Gemini) por outro, por exemplo um modelo local ou
+    os embeddings falsos dos benchmarks. Deve ser chamada antes do primeiro uso de
+    get_embeddings; o nome do modelo separa os seus vetores no cache de embeddings.
+
+    Args:
+        embeddings (Embeddings): O modelo de embeddings do LangChain.
+        model_name (str): Nome do modelo, usado na chave do cache.
+
+    Raises:
+        RuntimeError: Se o modelo de embeddings já foi criado.
+    """
+    global _embeddings
+    with _init_lock:
+        if _embeddings is not None:
+            raise RuntimeError("O modelo de embeddings já foi inicializado.")
+        _embeddings = CachedEmbeddings(
+            embeddings,
+            model_name=model_name,
+            cache_path=EMBEDDING_CACHE_CONFIG["path"],
+            batch_size=EMBEDDING_CACHE_CONFIG["batch_size"],
+            max_concurrency=EMBEDDING_CACHE_CONFIG["max_concurrency"],
+            query_memo_size=EMBEDDING_CACHE_CONFIG["query_memo_size"],
+        )
+    logging.info(f"Modelo de embeddings {model_name} configurado.")
+
+
+def get_vectorstore():
+    """
+    Retorna o armazenamento vetorial Chroma compartilhado, abrindo-o na primeira chamada.
+    O Chroma cria ou carrega seu banco de dados no diretório CHROMA_PATH.
+
+    Returns:
+        Chroma: O armazenamento vetorial.
+    """
+    global _vectorstore
+    if _vectorstore is None:
+        embeddings = get_embeddings()
+        with _init_lock:
+            if _vectorstore is None:
+                from langchain_chroma import Chroma
+
+                _vectorstore = Chroma(persist_directory=CHROMA_PATH, embedding_function=embeddings)
+                logging.info(f"Chroma aberto em {CHROMA_PATH} com {_vectorstore._collection.count()} pedaços.")
+    return _vectorstore
+
+
+def get_vector_backend() -> VectorStore:
+    """
+    Retorna o backend do armazenamento vetorial configurado em VECTOR_STORE_CONFIG["backend"],
+    abrindo-o na primeira chamada. O backend "mmap" não depende do modelo de embeddings.
+
+    Returns:
+        VectorStore: O backend.
+
+    Raises:
+        ValueError: Se o backend configurado não existir.
+    """
+    global _vector_backend
+    if _vector_backend is None:
+        # Trava própria: get_vectorstore usa _init_lock, e o backend deve ser aberto uma única
+        # vez (duas instâncias do índice mmap no mesmo processo gravariam no mesmo arquivo).
+        with _backend_lock:
+            if _vector_backend is None:
+                backend = VECTOR_STORE_CONFIG["backend"]
+                if backend == "chroma":
+                    store = ChromaVectorStore(get_vectorstore())
+                elif backend == "mmap":
+                    from mcp.rag.mmap_store import MmapVectorStore
+
+                    store = MmapVectorStore(VECTOR_STORE_CONFIG["mmap_path"],
+                                            quantization=VECTOR_STORE_CONFIG["quantization"],
+                                            compact_min_rows=VECTOR_STORE_CONFIG["compact_min_rows"],
+                                            compact_ratio=VECTOR_STORE_CONFIG["compact_ratio"],
+                                            search_block_rows=VECTOR_STORE_CONFIG["search_block_rows"])
+                else:
+                    raise ValueError(f"Backend de armazenamento vetorial '{backend}' não é suportado.")
+                _vector_backend = store
+                logging.info(f"Armazenamento vetorial {backend} aberto com {store.count()} pedaços.")
+    return _vector_backend
+
+
+# Índice BM25 sobre os mesmos pedaços do armazenamento vetorial, usado na recuperação híbrida (mcp/rag/retrieval.py).
+# É construído na primeira busca e depois mantido pelas funções de gravação e exclusão abaixo.
+bm25_index = BM25Index(k1=RETRIEVAL_CONFIG["bm25_k1"], b=RETRIEVAL_CONFIG["bm25_b"])
+add_corpus_listener(bm25_index.advance_version)
+_bm25_build_lock = threading.Lock()
+# Reconstrução em segundo plano em andamento (None quando não há nenhuma).
+_bm25_rebuild_thread: Optional[threading.Thread] = None
+
+# Pedaços lidos do armazenamento vetorial por consulta ao reconstruir o índice BM25.
+_BM25_LOAD_PAGE_SIZE = 5000
+
+
+def _iter_stored_chunks() -> Iterator[Tuple[List[str], List[str], List[int]]]:
+    """Percorre todos os pedaços do armazenamento vetorial em páginas de (IDs, textos, file_ids)."""
+    for ids, documents, metadatas in get_vector_backend().iter_chunks(_BM25_LOAD_PAGE_SIZE):
+        yield ids, documents, [(metadata or {}).get("file_id") for metadata in metadatas]
+
+
+def _rebuild_bm25_index() -> None:
+    """Reconstrói o índice BM25 a partir dos pedaços indexados, se ele estiver desatualizado."""
+    global _bm25_rebuild_thread
+    try:
+        with _bm25_build_lock:
+            version = read_corpus_version()
+            if bm25_index.version != version:
+                bm25_index.rebuild(_iter_stored_chunks(), version)
+    except Exception as e:
+        logging.error(f"Erro ao reconstruir o índice BM25: {e}")
+    finally:
+        _bm25_rebuild_thread = None
+
+
+def get_bm25_index() -> BM25Index:
+    """
+    Retorna o índice BM25. Na primeira chamada o índice é construído antes de retornar. Depois,
+    se outro worker alterou o conjunto de documentos, a reconstrução roda em segundo plano e o
+    índice atual continua atendendo as buscas até ela terminar: pedaços excluídos por outro
+    worker são descartados na recuperação (não existem mais no armazenamento vetorial) e os
+    gravados por ele passam a ser encontrados quando a reconstrução termina.
+
+    Returns:
+        BM25Index: O índice (possivelmente ainda desatualizado enquanto é reconstruído).
+    """
+    global _bm25_rebuild_thread
+    if bm25_index.version is None:
+        with _bm25_build_lock:
+            if bm25_index.version is None:
+                version = read_corpus_version()
+                bm25_index.rebuild(_iter_stored_chunks(), version)
+        return bm25_index
+    if bm25_index.version != read_corpus_version() and _bm25_rebuild_thread is None:
+        with _init_lock:
+            if _bm25_rebuild_thread is None:
+                _bm25_rebuild_thread = threading.Thread(target=_rebuild_bm25_index, name="bm25-rebuild", daemon=True)
+                _bm25_rebuild_thread.start()
+    return bm25_index
+
+
+def upsert_chunks(splits: List[Document], ids: List[str], vectors: List[List[float]]) -> None:
+    """
+    Grava (ou sobrescreve) no armazenamento vetorial pedaços cujos embeddings já foram calculados.
+
+    Args:
+        splits (List[Document]): Os pedaços de documento.
+        ids (List[str]): Os IDs dos pedaços.
+        vectors (List[List[float]]): Os embeddings dos pedaços.
+    """
+    get_vector_backend().upsert(
+        ids=ids,
+        vectors=vectors,
+        documents=[doc.page_content for doc in splits],
+        metadatas=[doc.metadata for doc in splits],
+    )
+    if bm25_index.tracking:
+        bm25_index.add(ids, [doc.page_content for doc in splits], [doc.metadata.get("file_id") for doc in splits])
+
+
+def get_chunk_metadata(file_id: int) -> Dict[str, dict]:
+    """
+    Recupera os IDs e metadados de todos os pedaços de um arquivo já indexados.
+
+    Args:
+        file_id (int): O ID do arquivo.
+
+    Returns:
+        Dict[str, dict]: Os metadados de cada pedaço, por ID.
+    """
+    return get_vector_backend().get_file_metadata(file_id)
+
+
+def update_chunk_metadata(ids: List[str], metadatas: List[dict]) -> None:
+    """
+    Atualiza apenas os metadados de pedaços existentes, sem recalcular embeddings.
+
+    Args:
+        ids (List[str]): Os IDs dos pedaços.
+        metadatas (List[dict]): Os novos metadados.
+    """
+    get_vector_backend().update_metadata(ids, metadatas)
+
+
+def delete_chunks(ids: List[str]) -> None:
+    """
+    Exclui pedaços específicos do armazenamento vetorial.
+
+    Args:
+        ids (List[str]): Os IDs dos pedaços.
+    """
+    if ids:
+        get_vector_backend().delete(ids)
+        bm25_index.remove(ids)
+
 
 def index_document_to_chroma(file_path: str, file_id: int) -> bool:
     """
-    Carrega um documento, divide-o em pedaços e os indexa no Chroma.
+    Carrega um documento, divide-o em pedaços e os indexa no armazenamento vetorial configurado
+    (o nome da função é mantido por compatibilidade).
 
     Args:
         file_path (str): O caminho para o arquivo a ser indexado.
@@ -42,45 +282,29 @@ def index_document_to_chroma(file_path: str, file_id: int) -> bool:
     Returns:
         bool: True se a indexação for bem-sucedida, False caso contrário.
     """
+    backend = VECTOR_STORE_CONFIG["backend"]
     try:
-        # Carrega o documento baseado na extensão do arquivo.
-        loader = None
-        file_extension = os.path.splitext(file_path)[1].lower()
-        if file_extension == ".pdf":
-            loader = PyPDFLoader(file_path)
-        elif file_extension == ".docx":
-            loader = Docx2txtLoader(file_path)
-        elif file_extension == ".html":
-            loader = UnstructuredHTMLLoader(file_path)
-        else:
-            logging.error(f"Tipo de arquivo não suportado para indexação: {file_path}")
-            print(f"Tipo de arquivo não suportado: {file_path}")
-            return False
-
-        documents = loader.load()
-        logging.info(f"Documento {file_path} carregado. Número de páginas/documentos: {len(documents)}")
-
-        # Adiciona o metadata file_id a cada documento antes de dividir
-        for doc in documents:
-            doc.metadata["file_id"] = file_id
-
-        # Divide os documentos em pedaços para indexação.
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        splits: List[Document] = text_splitter.split_documents(documents)
-        logging.info(f"Documento {file_path} dividido em {len(splits)} pedaços.")
-
-        vectorstore.add_documents(splits)
-        logging.info(f"Documento do arquivo {file_path} (ID: {file_id}) indexado com sucesso no Chroma.")
+        # Lê e divide o documento em um pool de processos, gravando os pedaços em lotes
+        # à medida que ficam prontos.
+        chunk_count = 0
+        for batch in iter_chunk_batches(file_path, file_id, INGESTION_CONFIG["upsert_batch_size"]):
+            vectors = get_embeddings().embed_documents([doc.page_content for doc in batch.documents])
+            upsert_chunks(batch.documents, batch.ids, vectors)
+            chunk_count += len(batch.documents)
+        logging.info(f"Documento {file_path} dividido em {chunk_count} pedaços.")
+        logging.info(f"Documento do arquivo {file_path} (ID: {file_id}) indexado com sucesso no "
+                     f"armazenamento vetorial ({backend}).")
         return True
     except Exception as e:
-        logging.error(f"Erro ao indexar documento {file_path} (ID: {file_id}) no Chroma: {e}", exc_info=True)
-        print(f"Erro ao indexar documento: {e}")
+        logging.error(f"Erro ao indexar documento {file_path} (ID: {file_id}) no armazenamento vetorial "
+                      f"({backend}): {e}", exc_info=True)
         return False
 
 
 def delete_doc_from_chroma(file_id: int) -> bool:
     """
-    Exclui todos os pedaços de documento associados a um determinado file_id do Chroma.
+    Exclui todos os pedaços de documento associados a um determinado file_id do armazenamento
+    vetorial configurado e do índice BM25 (o nome da função é mantido por compatibilidade).
 
     Args:
         file_id (int): O ID do arquivo cujos pedaços devem ser excluídos.
@@ -88,16 +312,14 @@ def delete_doc_from_chroma(file_id: int) -> bool:
     Returns:
         bool: True se a exclusão for bem-sucedida, False caso contrário.
     """
+    backend = VECTOR_STORE_CONFIG["backend"]
     try:
-        docs = vectorstore.get(where={"file_id": file_id})
-        logging.info(f"Encontrados {len(docs.get('ids', []))} pedaços de documento para file_id {file_id} no Chroma.")
-        print(f"Encontrados {len(docs.get('ids', []))} pedaços de documento para file_id {file_id}")
-
-        vectorstore._collection.delete(where={"file_id": file_id})
-        logging.info(f"Todos os documentos com file_id {file_id} excluídos do Chroma.")
-        print(f"Todos os documentos com file_id {file_id} excluídos do Chroma.")
+        deleted = get_vector_backend().delete_file(file_id)
+        bm25_index.remove_file(file_id)
+        logging.info(f"{deleted} pedaços do documento com file_id {file_id} excluídos do armazenamento "
+                     f"vetorial ({backend}).")
         return True
     except Exception as e:
-        logging.error(f"Erro ao excluir documento com file_id {file_id} do Chroma: {e}", exc_info=True)
-        print(f"Erro ao excluir documento do Chroma: {e}")
-        return False
\ No newline at end of file
+        logging.error(f"Erro ao excluir documento com file_id {file_id} do armazenamento vetorial "
+                      f"({backend}): {e}", exc_info=True)
+        return False
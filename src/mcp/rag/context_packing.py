@@ -0,0 +1,287 @@
+# mcp/rag/context_packing.py
+# Este arquivo implementa o empacotamento do contexto enviado ao modelo, entre a recuperação e a
+# geração. Os pedaços recuperados se repetem em parte (o divisor de texto usa sobreposição) e
+# podem ser quase idênticos (o mesmo trecho em páginas ou versões diferentes de um documento).
+# Antes de montar o prompt:
+#   - descarta os pedaços quase duplicados de outro mais relevante;
+#   - une os pedaços sobrepostos ou vizinhos do mesmo arquivo em um único trecho;
+#   - ordena os trechos pela relevância (a ordem devolvida pela recuperação);
+#   - corta o contexto no orçamento de tokens do modelo ("context_token_budget" em MODEL_CONFIGS).
+
+import re
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import List, Optional, Set
+
+from langchain_core.documents import Document
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from mcp.config import CONTEXT_PACKING_CONFIG, INGESTION_CONFIG, MODEL_CONFIGS
+from mcp.utils.helpers import estimate_tokens
+from mcp.utils.metrics import current_pipeline, stage_timer
+
+logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+# Maior distância, em caracteres, entre dois pedaços vizinhos da mesma página (o separador
+# removido pelo divisor de texto) para que sejam unidos mesmo sem sobreposição.
+_MAX_ADJACENT_GAP = 2
+
+
+@dataclass
+class _Passage:
+    """Um trecho do contexto: um pedaço recuperado ou a união de pedaços vizinhos."""
+    rank: int  # Posição do pedaço mais relevante do trecho no resultado da recuperação.
+    id: str  # ID do pedaço mais relevante.
+    text: str
+    metadata: dict  # Metadados do pedaço mais relevante.
+    ids: List[str]  # IDs dos pedaços unidos, na ordem do texto.
+    start: Optional[int] = None  # Posição do trecho na página ("start_index"), se conhecida.
+    shingles: Set[int] = field(default_factory=set)
+
+    @property
+    def end(self) -> Optional[int]:
+        return None if self.start is None else self.start + len(self.text)
+
+
+def context_token_budget(model: Optional[str]) -> int:
+    """
+    Retorna o orçamento de tokens do contexto recuperado para um modelo, limitado pelo que sobra
+    da janela de contexto depois da resposta e do histórico.
+
+    Args:
+        model (Optional[str]): O nome do modelo.
+
+    Returns:
+        int: O número máximo de tokens dos pedaços enviados ao modelo.
+    """
+    config = MODEL_CONFIGS.get(model, {})
+    budget = config.get("context_token_budget", CONTEXT_PACKING_CONFIG["context_token_budget"])
+    if "context_window" in config:
+        available = config["context_window"] - config.get("max_tokens", 0) - config.get("history_token_budget", 0)
+        budget = min(budget, max(available, 0))
+    return budget
+
+
+def _shingles(text: str, size: int) -> Set[int]:
+    """Hashes das sequências de "size" palavras do texto, usados na comparação de quase-duplicatas."""
+    words = _WORD_PATTERN.findall(text.lower())
+    if len(words) < size:
+        return {hash(tuple(words))} if words else set()
+    return {hash(tuple(words[index:index + size])) for index in range(len(words) - size + 1)}
+
+
+def _is_duplicate(passage: _Passage, kept: _Passage, threshold: float) -> bool:
+    """Se a maior parte dos trechos de um dos dois textos aparece no outro."""
+    if not passage.shingles or not kept.shingles:
+        return passage.text.strip() == kept.text.strip()
+    common = len(passage.shingles & kept.shingles)
+    return common / min(len(passage.shingles), len(kept.shingles)) >= threshold
+
+
+def _text_overlap(left: str, right: str, min_chars: int, max_chars: int) -> int:
+    """
+    Retorna o tamanho do maior final de "left" que também é o começo de "right" (0 se for menor
+    que min_chars). Usado quando a posição dos pedaços na página não é conhecida.
+    """
+    if len(left) < min_chars or len(right) < min_chars:
+        return 0
+    tail = left[-max_chars:]
+    probe = right[:min_chars]
+    position = tail.find(probe)
+    while position != -1:
+        if right.startswith(tail[position:]):
+            return len(tail) - position
+        position = tail.find(probe, position + 1)
+    return 0
+
+
+def _join(left: _Passage, right: _Passage, min_overlap: int) -> Optional[str]:
+    """
+    Une dois trechos do mesmo arquivo se "right" continua "left" (com sobreposição ou logo em
+    seguida, na mesma página).
+
+    Returns:
+        Optional[str]: O texto unido, ou None se os trechos não forem vizinhos.
+    """
+    same_page = left.metadata.get("page") == right.metadata.get("page")
+    if same_page and left.start is not None and right.start is not None:
+        if not left.start <= right.start <= left.end + _MAX_ADJACENT_GAP:
+            return None
+        overlap = left.end - right.start
+        if overlap >= len(right.text):
+            return left.text
+        if overlap > 0:
+            return left.text + right.text[overlap:] if left.text.endswith(right.text[:overlap]) else None
+        return left.text + "\n" + right.text
+    overlap = _text_overlap(left.text, right.text, min_overlap, INGESTION_CONFIG["chunk_overlap"])
+    return left.text + right.text[overlap:] if overlap else None
+
+
+def _merge_neighbours(passages: List[_Passage], min_overlap: int) -> int:
+    """Une, no lugar, os trechos vizinhos do mesmo arquivo. Retorna o número de uniões."""
+    merges = 0
+    merged = True
+    while merged:
+        merged = False
+        for i, first in enumerate(passages):
+            for j in range(i + 1, len(passages)):
+                second = passages[j]
+                if first.metadata.get("file_id") != second.metadata.get("file_id"):
+                    continue
+                for left, right in ((first, second), (second, first)):
+                    text = _join(left, right, min_overlap)
+                    if text is None:
+                        continue
+                    best = first if first.rank < second.rank else second
+                    # A posição só continua válida se os dois trechos são da mesma página.
+                    same_page = left.metadata.get("page") == right.metadata.get("page")
+                    passages[i] = _Passage(rank=best.rank, id=best.id, text=text, metadata=best.metadata,
+                                           ids=left.ids + [doc_id for doc_id in right.ids if doc_id not in left.ids],
+                                           start=left.start if same_page else None,
+                                           shingles=first.shingles | second.shingles)
+                    del passages[j]
+                    merges += 1
+                    merged = True
+                    break
+                if merged:
+                    break
+            if merged:
+                break
+    return merges
+
+
+def _truncate(text: str, tokens: int) -> str:
+    """Corta o texto para caber em "tokens" (pela estimativa de estimate_tokens), no fim de uma palavra."""
+    limit = tokens * 4
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit)
+    return text[:cut if cut > limit // 2 else limit].rstrip()
+
+
+class ContextPackingStats:
+    """Contadores acumulados do empacotamento, exportados em /metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.chunks_in = 0
+        self.passages_out = 0
+        self.duplicates = 0
+        self.merges = 0
+        self.truncated = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    def record(self, chunks_in: int, passages_out: int, duplicates: int, merges: int, truncated: int,
+               tokens_in: int, tokens_out: int) -> None:
+        with self._lock:
+            self.calls += 1
+            self.chunks_in += chunks_in
+            self.passages_out += passages_out
+            self.duplicates += duplicates
+            self.merges += merges
+            self.truncated += truncated
+            self.tokens_in += tokens_in
+            self.tokens_out += tokens_out
+
+    def stats(self) -> dict:
+        """
+        Retorna os contadores do empacotamento.
+
+        Returns:
+            dict: Chamadas, pedaços recebidos, trechos enviados, duplicatas, uniões, cortes e tokens
+            antes e depois do empacotamento.
+        """
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "chunks_in": self.chunks_in,
+                "passages_out": self.passages_out,
+                "duplicates": self.duplicates,
+                "merges": self.merges,
+                "truncated": self.truncated,
+                "tokens_in": self.tokens_in,
+                "tokens_out": self.tokens_out,
+            }
+
+
+# Contadores compartilhados do empacotamento.
+packing_stats = ContextPackingStats()
+
+
+def pack_documents(documents: List[Document], token_budget: int) -> List[Document]:
+    """
+    Empacota os pedaços recuperados no contexto enviado ao modelo.
+
+    Args:
+        documents (List[Document]): Os pedaços, do mais para o menos relevante.
+        token_budget (int): O máximo de tokens do contexto (pela estimativa de estimate_tokens).
+
+    Returns:
+        List[Document]: Os trechos, do mais para o menos relevante. Trechos formados por vários
+        pedaços têm o ID do mais relevante e os IDs de todos em metadata["chunk_ids"]; trechos
+        cortados pelo orçamento têm metadata["truncated"] = True.
+    """
+    if not CONTEXT_PACKING_CONFIG["enabled"] or not documents:
+        return documents
+
+    with stage_timer(current_pipeline("chat"), "context_packing"):
+        threshold = CONTEXT_PACKING_CONFIG["duplicate_threshold"]
+        shingle_words = CONTEXT_PACKING_CONFIG["shingle_words"]
+        passages: List[_Passage] = []
+        duplicates = 0
+        for rank, doc in enumerate(documents):
+            if not doc.page_content.strip():
+                continue
+            passage = _Passage(rank=rank, id=doc.id, text=doc.page_content, metadata=doc.metadata, ids=[doc.id],
+                               start=doc.metadata.get("start_index"),
+                               shingles=_shingles(doc.page_content, shingle_words))
+            if any(_is_duplicate(passage, kept, threshold) for kept in passages):
+                duplicates += 1
+                continue
+            passages.append(passage)
+
+        merges = _merge_neighbours(passages, CONTEXT_PACKING_CONFIG["min_overlap_chars"])
+        passages.sort(key=lambda item: item.rank)
+
+        packed, used, truncated = [], 0, 0
+        for passage in passages:
+            tokens = estimate_tokens(passage.text)
+            metadata = dict(passage.metadata)
+            if len(passage.ids) > 1:
+                metadata["chunk_ids"] = passage.ids
+            if used + tokens > token_budget:
+                remaining = token_budget - used
+                if remaining < CONTEXT_PACKING_CONFIG["min_trimmed_tokens"]:
+                    break
+                metadata["truncated"] = True
+                text = _truncate(passage.text, remaining)
+                packed.append(Document(id=passage.id, page_content=text, metadata=metadata))
+                used += estimate_tokens(text)
+                truncated += 1
+                break
+            packed.append(Document(id=passage.id, page_content=passage.text, metadata=metadata))
+            used += tokens
+
+    packing_stats.record(len(documents), len(packed), duplicates, merges, truncated,
+                         sum(estimate_tokens(doc.page_content) for doc in documents), used)
+    return packed
+
+
+def context_packer(model: str) -> Runnable:
+    """
+    Retorna a etapa da cadeia RAG que empacota os pedaços recuperados no orçamento do modelo.
+    O orçamento é lido a cada chamada, então mudanças em MODEL_CONFIGS valem de imediato.
+
+    Args:
+        model (str): O nome do modelo.
+
+    Returns:
+        Runnable: Recebe e retorna uma lista de Document.
+    """
+    return RunnableLambda(lambda documents: pack_documents(documents, context_token_budget(model)),
+                          name="pack_context")
@@ -0,0 +1,76 @@
+# mcp/rag/corpus_version.py
+# Este arquivo controla a versão do conjunto de documentos indexados. A versão é um número
+# gravado em um arquivo compartilhado: qualquer worker que altera o corpus grava uma versão
+# maior, e os demais percebem a mudança na próxima leitura. O conteúdo do arquivo (e não o
+# mtime) é a versão, pois em sistemas de arquivos com mtime de baixa resolução duas mudanças
+# seguidas teriam o mesmo mtime. Caches e índices derivados do corpus (cache semântico,
+# índice BM25) usam a versão para saber quando estão desatualizados.
+
+import os
+import time
+import logging
+import threading
+from typing import Callable, List, Tuple
+
+from mcp.config import CORPUS_VERSION_FILE
+
+logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Funções chamadas com (versão anterior, nova versão) quando este worker altera o corpus.
+_listeners: List[Callable[[int, int], None]] = []
+_bump_lock = threading.Lock()
+
+
+def read_corpus_version() -> int:
+    """
+    Lê a versão atual do conjunto de documentos.
+
+    Returns:
+        int: A versão gravada no arquivo, ou 0 se ele ainda não existir.
+    """
+    try:
+        with open(CORPUS_VERSION_FILE) as version_file:
+            content = version_file.read().strip()
+    except FileNotFoundError:
+        return 0
+    try:
+        return int(content)
+    except ValueError:
+        # Arquivo de uma versão antiga da aplicação (vazio): usa o mtime, como antes.
+        return os.stat(CORPUS_VERSION_FILE).st_mtime_ns
+
+
+def bump_corpus_version() -> Tuple[int, int]:
+    """
+    Sinaliza, para todos os workers, que o conjunto de documentos mudou, e notifica os
+    ouvintes registrados neste worker.
+
+    Returns:
+        Tuple[int, int]: A versão anterior e a nova versão.
+    """
+    with _bump_lock:
+        previous = read_corpus_version()
+        # Sempre maior que a anterior, mesmo que o relógio não tenha avançado.
+        current = max(time.time_ns(), previous + 1)
+        os.makedirs(os.path.dirname(CORPUS_VERSION_FILE) or ".", exist_ok=True)
+        # Grava em um arquivo temporário e o renomeia: os leitores nunca veem o arquivo pela metade.
+        temporary = f"{CORPUS_VERSION_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "w") as version_file:
+            version_file.write(str(current))
+        os.replace(temporary, CORPUS_VERSION_FILE)
+        for listener in list(_listeners):
+            try:
+                listener(previous, current)
+            except Exception as e:
+                logging.error(f"Erro ao notificar a mudança de versão do corpus: {e}", exc_info=True)
+    return previous, current
+
+
+def add_corpus_listener(listener: Callable[[int, int], None]) -> None:
+    """
+    Registra uma função chamada sempre que este worker altera a versão do corpus.
+
+    Args:
+        listener (Callable[[int, int], None]): Recebe a versão anterior e a nova versão.
+    """
+    _listeners.append(listener)
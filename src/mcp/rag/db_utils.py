@@ -0,0 +1,765 @@
+# mcp/rag/db_utils.py
+# Este arquivo contém as funções de acesso ao banco de dados SQLite da aplicação:
+# logs de chat, resumos de sessão, registro de documentos e acompanhamento dos jobs de ingestão.
+#
+# O banco usa o modo WAL, em que as leituras não bloqueiam nem são bloqueadas pela escrita, e
+# cada thread mantém a sua própria conexão aberta. As escritas são transações curtas iniciadas
+# com BEGIN IMMEDIATE, que aguardam (busy_timeout) em vez de falhar quando outro worker do
+# uvicorn está gravando. Os logs de chat são gravados em lotes por uma thread em segundo plano
+# (ChatLogWriter).
+
+import os
+import time
+import uuid
+import queue
+import base64
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from mcp.config import DATABASE_CONFIG, INGESTION_CONFIG
+from mcp.utils.metrics import stage_timer
+
+logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Caminho do banco de dados SQLite.
+DB_NAME = DATABASE_CONFIG["path"]
+
+# Status possíveis de um documento no document_store.
+DOCUMENT_STATUS_PENDING = "pending"
+DOCUMENT_STATUS_READY = "ready"
+
+# Parâmetros por consulta nas buscas em lote (o SQLite aceita no mínimo 999).
+_SQLITE_MAX_PARAMS = 900
+
+# Conexão de cada thread.
+_local = threading.local()
+
+# Se as tabelas já foram criadas (e migradas) neste processo (veja init_database).
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def get_db_connection() -> sqlite3.Connection:
+    """
+    Retorna a conexão da thread atual com o banco de dados, abrindo-a na primeira chamada.
+    A conexão fica em modo autocommit (as escritas abrem transações explícitas), retorna as
+    linhas como sqlite3.Row e é reutilizada pela thread, portanto não deve ser fechada.
+
+    Returns:
+        sqlite3.Connection: A conexão da thread.
+    """
+    conn = getattr(_local, "connection", None)
+    # Um processo criado por fork não pode reutilizar a conexão herdada do processo pai.
+    if conn is None or _local.pid != os.getpid():
+        busy_timeout_ms = DATABASE_CONFIG["busy_timeout_ms"]
+        conn = sqlite3.connect(DB_NAME, timeout=busy_timeout_ms / 1000, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={busy_timeout_ms}")
+        _local.connection = conn
+        _local.pid = os.getpid()
+        if not _schema_ready and not getattr(_local, "initializing", False):
+            # Sem o aquecimento da inicialização, as tabelas são criadas na primeira conexão.
+            init_database()
+    return conn
+
+
+@contextmanager
+def _write() -> Iterator[sqlite3.Connection]:
+    """
+    Executa um bloco de escrita em uma transação. BEGIN IMMEDIATE reserva a escrita logo no
+    início, então a espera por outro worker acontece no busy_timeout, e não como um erro
+    "database is locked" no meio da transação.
+    """
+    conn = get_db_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _ensure_column(conn: sqlite3.Connection, table: str, column: str, definition: str) -> None:
+    """Adiciona uma coluna a uma tabela existente, caso ela ainda não exista."""
+    columns = [row["name"] for row in conn.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def create_application_logs():
+    """Cria a tabela de logs de chat e os índices por sessão e por data, se ainda não existirem."""
+    with _write() as conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS application_logs
+                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         session_id TEXT,
+                         user_query TEXT,
+                         gpt_response TEXT,
+                         model TEXT,
+                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_application_logs_session ON application_logs (session_id, id)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_application_logs_created_at ON application_logs (created_at)')
+
+
+def create_session_summaries():
+    """Cria a tabela de resumos acumulados das sessões de chat, se ainda não existir."""
+    with _write() as conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS session_summaries
+                        (session_id TEXT PRIMARY KEY,
+                         summary TEXT,
+                         summarized_turns INTEGER DEFAULT 0,
+                         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+
+def create_document_store():
+    """
+    Cria a tabela de documentos, se ainda não existir. Documentos criados antes da
+    coluna status já estavam indexados, por isso o valor padrão é 'ready'.
+    """
+    with _write() as conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS document_store
+                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         filename TEXT,
+                         upload_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        _ensure_column(conn, "document_store", "status", f"TEXT DEFAULT '{DOCUMENT_STATUS_READY}'")
+        _ensure_column(conn, "document_store", "content_hash", "TEXT")
+        # Identidade estável do documento (ID externo ou nome do arquivo), usada nos reenvios.
+        _ensure_column(conn, "document_store", "document_key", "TEXT")
+        conn.execute('UPDATE document_store SET document_key = filename WHERE document_key IS NULL')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_document_store_content_hash ON document_store (content_hash)')
+        # A identidade é única: dois uploads simultâneos do mesmo documento não podem criar dois
+        # registros. Em bancos antigos, os registros repetidos (o mesmo nome enviado mais de uma
+        # vez) mantêm a identidade apenas no mais recente, o que get_documents_by_keys já usava.
+        conn.execute("UPDATE document_store SET document_key = document_key || '#' || id "
+                     "WHERE id NOT IN (SELECT MAX(id) FROM document_store GROUP BY document_key)")
+        conn.execute('DROP INDEX IF EXISTS idx_document_store_document_key')
+        conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_document_store_document_key_unique '
+                     'ON document_store (document_key)')
+        # Atende a listagem paginada de /documents sem ordenar a tabela inteira.
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_document_store_listing '
+                     'ON document_store (status, upload_timestamp, id)')
+
+
+def create_ingestion_jobs():
+    """Cria a tabela de jobs de ingestão, se ainda não existir."""
+    with _write() as conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS ingestion_jobs
+                        (job_id TEXT PRIMARY KEY,
+                         file_id INTEGER,
+                         filename TEXT,
+                         status TEXT,
+                         stage TEXT,
+                         chunks_total INTEGER DEFAULT 0,
+                         chunks_done INTEGER DEFAULT 0,
+                         attempts INTEGER DEFAULT 0,
+                         error TEXT,
+                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                         started_at REAL,
+                         finished_at REAL)''')
+        _ensure_column(conn, "ingestion_jobs", "progress", "REAL DEFAULT 0")
+        _ensure_column(conn, "ingestion_jobs", "chunks_unchanged", "INTEGER DEFAULT 0")
+        _ensure_column(conn, "ingestion_jobs", "chunks_deleted", "INTEGER DEFAULT 0")
+        # Processo (worker do uvicorn) cujo pool executa o job.
+        _ensure_column(conn, "ingestion_jobs", "worker_pid", "INTEGER")
+        # Identifica a execução do processo (o PID pode ser reaproveitado depois de um reinício) e o
+        # prazo até o qual o job é considerado em andamento; o prazo é renovado pelo worker
+        # (renew_ingestion_job_leases) e um job com o prazo vencido é tratado como abandonado.
+        _ensure_column(conn, "ingestion_jobs", "worker_token", "TEXT")
+        _ensure_column(conn, "ingestion_jobs", "lease_expires_at", "REAL")
+        # 'file' (um documento) ou 'bulk' (ingestão em massa, com o resultado em JSON).
+        _ensure_column(conn, "ingestion_jobs", "kind", "TEXT DEFAULT 'file'")
+        _ensure_column(conn, "ingestion_jobs", "result", "TEXT")
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_file_id ON ingestion_jobs (file_id, status)')
+
+
+def init_database() -> None:
+    """
+    Cria as tabelas e aplica as migrações (colunas novas, índices, preenchimento de
+    document_key), uma vez por processo. Executada no aquecimento da inicialização (main.py),
+    para que a importação do módulo não acesse o banco; sem aquecimento, é executada na
+    primeira conexão.
+
+    Raises:
+        sqlite3.Error: Se o banco não puder ser criado ou migrado; a próxima chamada tenta novamente.
+    """
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if _schema_ready:
+            return
+        start_time = time.perf_counter()
+        # A primeira conexão desta thread pode ser aberta pelas funções abaixo; ela não deve
+        # chamar init_database de novo.
+        _local.initializing = True
+        try:
+            create_application_logs()
+            create_session_summaries()
+            create_document_store()
+            create_ingestion_jobs()
+        finally:
+            _local.initializing = False
+        _schema_ready = True
+        logging.info(f"Banco de dados {DB_NAME} inicializado em {time.perf_counter() - start_time:.3f} s.")
+
+
+def insert_application_logs(session_id: str, user_query: str, gpt_response: str, model: str):
+    """
+    Registra uma interação de chat imediatamente. Nas requisições de chat, prefira
+    chat_log_writer.submit, que grava em lotes.
+
+    Args:
+        session_id (str): O ID da sessão.
+        user_query (str): A pergunta do usuário.
+        gpt_response (str): A resposta gerada.
+        model (str): O modelo usado.
+    """
+    insert_application_logs_batch([(session_id, user_query, gpt_response, model)])
+
+
+def insert_application_logs_batch(rows: List[tuple]) -> None:
+    """
+    Registra várias interações de chat em uma única transação.
+
+    Args:
+        rows (List[tuple]): Tuplas (session_id, user_query, gpt_response, model), em ordem cronológica.
+    """
+    with _write() as conn:
+        conn.executemany('INSERT INTO application_logs (session_id, user_query, gpt_response, model) '
+                         'VALUES (?, ?, ?, ?)', rows)
+
+
+class ChatLogWriter:
+    """
+    Grava os logs de chat em segundo plano e em lotes: uma transação a cada flush_interval
+    segundos ou a cada batch_size interações, o que vier primeiro. Assim, cada requisição de
+    chat não espera pelo disco nem disputa a trava de escrita com os outros workers.
+
+    Args:
+        flush_interval (float): Intervalo máximo, em segundos, até gravar uma interação.
+        batch_size (int): Interações gravadas por transação.
+        max_attempts (int): Tentativas de gravação de um lote antes de descartá-lo.
+    """
+
+    def __init__(self, flush_interval: float, batch_size: int, max_attempts: int = 3):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self._listeners: List[Callable[[List[tuple]], None]] = []
+
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+
+    def add_listener(self, listener: Callable[[List[tuple]], None]) -> None:
+        """
+        Registra uma função chamada com as linhas de cada lote concluído (gravado ou descartado).
+
+        Args:
+            listener (Callable[[List[tuple]], None]): Recebe as tuplas do lote.
+        """
+        self._listeners.append(listener)
+
+    def submit(self, session_id: str, user_query: str, gpt_response: str, model: str) -> None:
+        """
+        Enfileira uma interação para gravação. Não bloqueia.
+
+        Args:
+            session_id (str): O ID da sessão.
+            user_query (str): A pergunta do usuário.
+            gpt_response (str): A resposta gerada.
+            model (str): O modelo usado.
+        """
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="chat-log-writer", daemon=True)
+                self._thread.start()
+        self._queue.put((session_id, user_query, gpt_response, model))
+
+    def _run(self) -> None:
+        while True:
+            rows = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(rows) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    rows.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._write_batch(rows)
+            for _ in rows:
+                self._queue.task_done()
+
+    def _write_batch(self, rows: List[tuple]) -> None:
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                with stage_timer("chat", "log_flush"):
+                    insert_application_logs_batch(rows)
+                self.written += len(rows)
+                self.batches += 1
+                break
+            except Exception as e:
+                logging.error(f"Erro ao gravar {len(rows)} logs de chat (tentativa {attempt}/{self.max_attempts}): "
+                              f"{e}", exc_info=True)
+                time.sleep(attempt)
+        else:
+            self.dropped += len(rows)
+            logging.critical(f"{len(rows)} logs de chat descartados após falhas de gravação.")
+        for listener in self._listeners:
+            try:
+                listener(rows)
+            except Exception as e:
+                logging.error(f"Erro ao notificar a gravação dos logs de chat: {e}", exc_info=True)
+
+    def flush(self) -> None:
+        """Aguarda a gravação de todas as interações enfileiradas. Usada no desligamento da aplicação."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+
+    def stats(self) -> dict:
+        """
+        Retorna os contadores do gravador.
+
+        Returns:
+            dict: Interações pendentes, gravadas e descartadas, e lotes gravados.
+        """
+        return {"pending": self._queue.qsize(), "written": self.written, "batches": self.batches,
+                "dropped": self.dropped}
+
+
+# Gravador compartilhado dos logs de chat.
+chat_log_writer = ChatLogWriter(flush_interval=DATABASE_CONFIG["log_flush_interval_seconds"],
+                                batch_size=DATABASE_CONFIG["log_batch_size"])
+
+
+def count_session_turns(session_id: str) -> int:
+    """
+    Conta as interações registradas de uma sessão.
+
+    Args:
+        session_id (str): O ID da sessão.
+
+    Returns:
+        int: O número de interações.
+    """
+    conn = get_db_connection()
+    return conn.execute('SELECT COUNT(*) FROM application_logs WHERE session_id = ?', (session_id,)).fetchone()[0]
+
+
+def get_session_turns(session_id: str, offset: int = 0) -> List[Tuple[str, str]]:
+    """
+    Recupera as interações de uma sessão em ordem cronológica, a partir de uma posição.
+
+    Args:
+        session_id (str): O ID da sessão.
+        offset (int): Quantas interações iniciais ignorar (ex.: as já resumidas).
+
+    Returns:
+        List[Tuple[str, str]]: Pares (pergunta, resposta).
+    """
+    conn = get_db_connection()
+    cursor = conn.execute('SELECT user_query, gpt_response FROM application_logs WHERE session_id = ? '
+                          'ORDER BY id LIMIT -1 OFFSET ?', (session_id, offset))
+    return [(row['user_query'], row['gpt_response']) for row in cursor.fetchall()]
+
+
+def get_session_summary(session_id: str) -> Tuple[str, int]:
+    """
+    Recupera o resumo acumulado de uma sessão.
+
+    Args:
+        session_id (str): O ID da sessão.
+
+    Returns:
+        Tuple[str, int]: O resumo (vazio se não houver) e quantas interações ele cobre.
+    """
+    conn = get_db_connection()
+    row = conn.execute('SELECT summary, summarized_turns FROM session_summaries WHERE session_id = ?',
+                       (session_id,)).fetchone()
+    return (row['summary'], row['summarized_turns']) if row else ("", 0)
+
+
+def save_session_summary(session_id: str, summary: str, summarized_turns: int) -> None:
+    """
+    Grava o resumo acumulado de uma sessão.
+
+    Args:
+        session_id (str): O ID da sessão.
+        summary (str): O novo resumo.
+        summarized_turns (int): Quantas interações, desde o início da sessão, o resumo cobre.
+    """
+    with _write() as conn:
+        conn.execute('INSERT INTO session_summaries (session_id, summary, summarized_turns) VALUES (?, ?, ?) '
+                     'ON CONFLICT(session_id) DO UPDATE SET summary = excluded.summary, '
+                     'summarized_turns = excluded.summarized_turns, updated_at = CURRENT_TIMESTAMP',
+                     (session_id, summary, summarized_turns))
+
+
+def get_chat_history(session_id: str) -> List[dict]:
+    """
+    Recupera o histórico de chat de uma sessão no formato esperado pelos prompts.
+
+    Args:
+        session_id (str): O ID da sessão.
+
+    Returns:
+        List[dict]: Mensagens alternadas {"role": "human"|"ai", "content": ...}, em ordem cronológica.
+    """
+    messages = []
+    for user_query, gpt_response in get_session_turns(session_id):
+        messages.extend([
+            {"role": "human", "content": user_query},
+            {"role": "ai", "content": gpt_response}
+        ])
+    return messages
+
+
+def insert_document_record(filename: str, status: str = DOCUMENT_STATUS_READY,
+                           content_hash: Optional[str] = None, document_key: Optional[str] = None) -> int:
+    """
+    Registra um documento no document_store.
+
+    Args:
+        filename (str): O nome do arquivo.
+        status (str): O status inicial do documento.
+        content_hash (Optional[str]): O hash SHA-256 do conteúdo do arquivo.
+        document_key (Optional[str]): A identidade estável do documento (padrão: o nome do arquivo).
+
+    Returns:
+        int: O ID (file_id) do documento.
+    """
+    with _write() as conn:
+        cursor = conn.execute('INSERT INTO document_store (filename, status, content_hash, document_key) '
+                              'VALUES (?, ?, ?, ?)', (filename, status, content_hash, document_key or filename))
+        return cursor.lastrowid
+
+
+def mark_document_ready(file_id: int) -> None:
+    """
+    Marca um documento como pronto, após a indexação ser concluída.
+
+    Args:
+        file_id (int): O ID do documento.
+    """
+    mark_documents_ready([file_id])
+
+
+def update_document_record(file_id: int, filename: str, content_hash: str) -> None:
+    """
+    Atualiza um documento após a reindexação de uma nova versão.
+
+    Args:
+        file_id (int): O ID do documento.
+        filename (str): O nome do arquivo da nova versão.
+        content_hash (str): O hash SHA-256 do conteúdo da nova versão.
+    """
+    with _write() as conn:
+        conn.execute('UPDATE document_store SET filename = ?, content_hash = ?, status = ?, '
+                     'upload_timestamp = CURRENT_TIMESTAMP WHERE id = ?',
+                     (filename, content_hash, DOCUMENT_STATUS_READY, file_id))
+
+
+def get_documents_by_keys(document_keys: List[str]) -> Dict[str, dict]:
+    """
+    Procura documentos pela identidade estável (ID externo ou nome do arquivo).
+
+    Args:
+        document_keys (List[str]): As identidades procuradas.
+
+    Returns:
+        Dict[str, dict]: id, content_hash e status do documento mais recente de cada identidade encontrada.
+    """
+    found = {}
+    conn = get_db_connection()
+    for start in range(0, len(document_keys), _SQLITE_MAX_PARAMS):
+        batch = document_keys[start:start + _SQLITE_MAX_PARAMS]
+        placeholders = ",".join("?" * len(batch))
+        cursor = conn.execute(f'SELECT id, document_key, content_hash, status FROM document_store '
+                              f'WHERE document_key IN ({placeholders}) ORDER BY id', batch)
+        for row in cursor.fetchall():
+            found[row['document_key']] = dict(row)
+    return found
+
+
+def mark_documents_ready(file_ids: List[int]) -> None:
+    """
+    Marca vários documentos como prontos em uma única transação.
+
+    Args:
+        file_ids (List[int]): Os IDs dos documentos.
+    """
+    with _write() as conn:
+        conn.executemany('UPDATE document_store SET status = ? WHERE id = ?',
+                         [(DOCUMENT_STATUS_READY, file_id) for file_id in file_ids])
+
+
+def get_documents_by_hashes(content_hashes: List[str]) -> Dict[str, int]:
+    """
+    Procura documentos já registrados (prontos ou pendentes) com os hashes de conteúdo informados.
+
+    Args:
+        content_hashes (List[str]): Os hashes SHA-256 do conteúdo dos arquivos.
+
+    Returns:
+        Dict[str, int]: O file_id existente de cada hash encontrado.
+    """
+    found = {}
+    conn = get_db_connection()
+    for start in range(0, len(content_hashes), _SQLITE_MAX_PARAMS):
+        batch = content_hashes[start:start + _SQLITE_MAX_PARAMS]
+        placeholders = ",".join("?" * len(batch))
+        cursor = conn.execute(f'SELECT id, content_hash FROM document_store WHERE content_hash IN ({placeholders})',
+                              batch)
+        for row in cursor.fetchall():
+            found[row['content_hash']] = row['id']
+    return found
+
+
+def delete_document_record(file_id: int) -> bool:
+    """
+    Exclui o registro de um documento.
+
+    Args:
+        file_id (int): O ID do documento.
+
+    Returns:
+        bool: True se a exclusão for bem-sucedida.
+    """
+    with _write() as conn:
+        conn.execute('DELETE FROM document_store WHERE id = ?', (file_id,))
+    return True
+
+
+def _encode_cursor(upload_timestamp: str, file_id: int) -> str:
+    """Codifica a posição do último documento de uma página como um cursor opaco."""
+    return base64.urlsafe_b64encode(f"{upload_timestamp}|{file_id}".encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, int]:
+    """Decodifica um cursor gerado por _encode_cursor. Levanta ValueError se ele for inválido."""
+    try:
+        upload_timestamp, file_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").rsplit("|", 1)
+        return upload_timestamp, int(file_id)
+    except Exception:
+        raise ValueError(f"Cursor de paginação inválido: {cursor}")
+
+
+def get_documents_page(limit: int, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """
+    Lista uma página de documentos prontos, do mais recente para o mais antigo. A paginação é
+    feita por cursor sobre (upload_timestamp, id), então cada página custa o mesmo, qualquer
+    que seja a sua posição ou o tamanho da tabela.
+
+    Args:
+        limit (int): O número máximo de documentos da página.
+        cursor (Optional[str]): O cursor retornado com a página anterior (None para a primeira).
+
+    Returns:
+        Tuple[List[dict], Optional[str]]: Documentos com id, filename e upload_timestamp, e o
+        cursor da próxima página (None se esta for a última).
+
+    Raises:
+        ValueError: Se o cursor for inválido.
+    """
+    conn = get_db_connection()
+    if cursor is None:
+        rows = conn.execute('SELECT id, filename, upload_timestamp FROM document_store WHERE status = ? '
+                            'ORDER BY upload_timestamp DESC, id DESC LIMIT ?',
+                            (DOCUMENT_STATUS_READY, limit + 1)).fetchall()
+    else:
+        upload_timestamp, file_id = _decode_cursor(cursor)
+        rows = conn.execute('SELECT id, filename, upload_timestamp FROM document_store WHERE status = ? '
+                            'AND (upload_timestamp < ? OR (upload_timestamp = ? AND id < ?)) '
+                            'ORDER BY upload_timestamp DESC, id DESC LIMIT ?',
+                            (DOCUMENT_STATUS_READY, upload_timestamp, upload_timestamp, file_id,
+                             limit + 1)).fetchall()
+    documents = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = documents[-1]
+        next_cursor = _encode_cursor(last["upload_timestamp"], last["id"])
+    return documents, next_cursor
+
+
+def get_all_documents() -> List[dict]:
+    """
+    Lista todos os documentos prontos (já indexados), do mais recente para o mais antigo.
+    Carrega a tabela inteira; para listagens expostas na API, use get_documents_page.
+
+    Returns:
+        List[dict]: Documentos com id, filename e upload_timestamp.
+    """
+    documents = []
+    cursor = None
+    while True:
+        page, cursor = get_documents_page(DATABASE_CONFIG["documents_max_page_size"], cursor)
+        documents.extend(page)
+        if cursor is None:
+            return documents
+
+
+def create_ingestion_job(job_id: str, file_id: Optional[int], filename: str, kind: str = "file"):
+    """
+    Registra um novo job de ingestão na fila.
+
+    Args:
+        job_id (str): O ID do job.
+        file_id (Optional[int]): O ID do documento sendo ingerido (None em um job de ingestão em massa).
+        filename (str): O nome do arquivo (ou a descrição dos arquivos, em um job em massa).
+        kind (str): 'file' ou 'bulk'.
+    """
+    with _write() as conn:
+        _insert_ingestion_job(conn, job_id, file_id, filename, kind)
+
+
+# Token desta execução do processo, gravado nos jobs que ela cria (veja _worker_token).
+_worker_token_value: Optional[Tuple[int, str]] = None
+
+
+def _worker_token() -> str:
+    """Retorna o token desta execução do processo, gerado de novo em um processo filho (fork)."""
+    global _worker_token_value
+    if _worker_token_value is None or _worker_token_value[0] != os.getpid():
+        _worker_token_value = (os.getpid(), uuid.uuid4().hex)
+    return _worker_token_value[1]
+
+
+def _insert_ingestion_job(conn: sqlite3.Connection, job_id: str, file_id: Optional[int], filename: str,
+                          kind: str) -> None:
+    """Insere um job na fila, em nome deste processo e com o prazo (lease) inicial."""
+    conn.execute('INSERT INTO ingestion_jobs (job_id, file_id, filename, status, stage, worker_pid, kind, '
+                 'worker_token, lease_expires_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                 (job_id, file_id, filename, "queued", "queued", os.getpid(), kind, _worker_token(),
+                  time.time() + INGESTION_CONFIG["job_lease_seconds"]))
+
+
+def renew_ingestion_job_leases() -> int:
+    """
+    Renova o prazo (lease) dos jobs em andamento criados por este processo.
+
+    Returns:
+        int: O número de jobs renovados.
+    """
+    with _write() as conn:
+        return conn.execute("UPDATE ingestion_jobs SET lease_expires_at = ? WHERE worker_token = ? "
+                            "AND status IN ('queued', 'running')",
+                            (time.time() + INGESTION_CONFIG["job_lease_seconds"], _worker_token())).rowcount
+
+
+def _process_alive(pid: Optional[int]) -> bool:
+    """Se o processo existe. Jobs sem processo registrado são considerados ativos."""
+    if not pid:
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _job_alive(job: sqlite3.Row) -> bool:
+    """
+    Se um job em andamento ainda pertence a um worker vivo: o prazo (lease) não venceu e o
+    processo existe. Só o PID não basta, pois ele pode ser reaproveitado depois de um reinício;
+    jobs sem prazo (gravados antes da coluna existir) são considerados abandonados.
+    """
+    if job['lease_expires_at'] is None or job['lease_expires_at'] < time.time():
+        return False
+    return _process_alive(job['worker_pid'])
+
+
+def claim_document_for_ingestion(document_key: str, filename: str, content_hash: str, job_id: str) -> dict:
+    """
+    Registra o job de ingestão de um documento, criando o registro do documento se a identidade
+    ainda não existe. A consulta e as gravações acontecem na mesma transação (BEGIN IMMEDIATE),
+    então dois envios simultâneos da mesma identidade nunca criam dois registros nem dois jobs.
+
+    Args:
+        document_key (str): A identidade estável do documento (ID externo ou nome do arquivo).
+        filename (str): O nome do arquivo.
+        content_hash (str): O hash SHA-256 do conteúdo do arquivo.
+        job_id (str): O ID do novo job.
+
+    Returns:
+        dict: O file_id, se o documento já existia (is_update) e o status: 'queued' (job criado),
+        'unchanged' (o conteúdo indexado é o mesmo) ou 'busy' (já há um job em andamento para o
+        documento; job_id traz o ID desse job). Jobs de um worker que já encerrou, ou cujo prazo
+        (lease) venceu sem ser renovado, são marcados como falhos e não impedem um novo envio.
+    """
+    with _write() as conn:
+        existing = conn.execute('SELECT id, content_hash, status FROM document_store WHERE document_key = ?',
+                                (document_key,)).fetchone()
+        if existing is not None:
+            file_id = existing['id']
+            for active in conn.execute("SELECT job_id, worker_pid, lease_expires_at FROM ingestion_jobs "
+                                       "WHERE file_id = ? AND status IN ('queued', 'running')",
+                                       (file_id,)).fetchall():
+                if _job_alive(active):
+                    return {"job_id": active['job_id'], "file_id": file_id, "is_update": True, "status": "busy"}
+                conn.execute("UPDATE ingestion_jobs SET status = 'failed', error = ?, finished_at = ? "
+                             "WHERE job_id = ?", ("O worker que executava o job foi encerrado.", time.time(),
+                                                  active['job_id']))
+            if existing['content_hash'] == content_hash and existing['status'] == DOCUMENT_STATUS_READY:
+                return {"job_id": None, "file_id": file_id, "is_update": True, "status": "unchanged"}
+        else:
+            file_id = conn.execute('INSERT INTO document_store (filename, status, content_hash, document_key) '
+                                   'VALUES (?, ?, ?, ?)',
+                                   (filename, DOCUMENT_STATUS_PENDING, content_hash, document_key)).lastrowid
+        _insert_ingestion_job(conn, job_id, file_id, filename, "file")
+    return {"job_id": job_id, "file_id": file_id, "is_update": existing is not None, "status": "queued"}
+
+
+def update_ingestion_job(job_id: str, **fields):
+    """
+    Atualiza campos de um job de ingestão (status, stage, chunks_total, chunks_done, progress, ...).
+
+    Args:
+        job_id (str): O ID do job.
+        **fields: Colunas e novos valores.
+    """
+    assignments = ", ".join(f"{column} = ?" for column in fields)
+    with _write() as conn:
+        conn.execute(f'UPDATE ingestion_jobs SET {assignments} WHERE job_id = ?', (*fields.values(), job_id))
+
+
+def update_ingestion_jobs(job_ids: List[str], **fields):
+    """
+    Atualiza os mesmos campos de vários jobs de ingestão em uma única transação.
+
+    Args:
+        job_ids (List[str]): Os IDs dos jobs.
+        **fields: Colunas e novos valores.
+    """
+    if not job_ids:
+        return
+    assignments = ", ".join(f"{column} = ?" for column in fields)
+    with _write() as conn:
+        conn.executemany(f'UPDATE ingestion_jobs SET {assignments} WHERE job_id = ?',
+                         [(*fields.values(), job_id) for job_id in job_ids])
+
+
+def get_ingestion_job(job_id: str) -> Optional[dict]:
+    """
+    Recupera um job de ingestão.
+
+    Args:
+        job_id (str): O ID do job.
+
+    Returns:
+        Optional[dict]: Os dados do job, ou None se não existir.
+    """
+    conn = get_db_connection()
+    row = conn.execute('SELECT * FROM ingestion_jobs WHERE job_id = ?', (job_id,)).fetchone()
+    return dict(row) if row else None
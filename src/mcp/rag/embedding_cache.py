@@ -0,0 +1,247 @@
+# mcp/rag/embedding_cache.py
+# Este arquivo implementa um cache persistente de embeddings endereçado por conteúdo.
+# Cada pedaço de texto é identificado pelo hash do seu conteúdo mais o nome do modelo
+# de embeddings, de modo que reindexar um documento inalterado não chama a API novamente.
+# Os embeddings das consultas ficam apenas em memória, em um LRU pequeno: a mesma pergunta é
+# embutida pelo cache semântico e pela recuperação, e perguntas populares se repetem.
+
+import asyncio
+import hashlib
+import inspect
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Limite de parâmetros por consulta SQL (o SQLite aceita no mínimo 999).
+_SQLITE_MAX_PARAMS = 900
+
+
+def content_hash(text: str, model_name: str) -> str:
+    """
+    Calcula a chave do cache de um pedaço de texto para um modelo de embeddings.
+
+    Args:
+        text (str): O texto do pedaço.
+        model_name (str): O nome do modelo de embeddings.
+
+    Returns:
+        str: O hash SHA-256 hexadecimal de modelo + texto.
+    """
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Envolve um modelo de embeddings com um cache SQLite local.
+
+    Em embed_documents, apenas os textos ausentes do cache são enviados ao modelo,
+    em lotes de tamanho configurável e com concorrência limitada. Embeddings de
+    consultas (embed_query, embed_queries) não vão para o SQLite: os mais recentes
+    ficam em um LRU em memória de query_memo_size entradas.
+    """
+
+    def __init__(self, underlying: Embeddings, model_name: str, cache_path: str, batch_size: int = 100,
+                 max_concurrency: int = 4, query_memo_size: int = 2048):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.cache_path = cache_path
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.query_memo_size = query_memo_size
+        self._local = threading.local()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+        self._query_memo: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._query_memo_lock = threading.Lock()
+        # Modelos como o GoogleGenerativeAIEmbeddings embutem vários textos como consultas em uma
+        # única chamada (embed_documents com task_type); nos demais, cada consulta é uma chamada.
+        self._batched_queries = "task_type" in inspect.signature(underlying.embed_documents).parameters
+
+        # Os contadores são atualizados por várias threads (requisições e jobs de ingestão).
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.query_hits = 0
+        self.query_misses = 0
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Retorna a conexão SQLite da thread atual, criando a tabela na primeira vez."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self.cache_path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with self._init_lock:
+                if not self._initialized:
+                    connection.execute('''CREATE TABLE IF NOT EXISTS embedding_cache
+                                          (key TEXT PRIMARY KEY,
+                                           vector BLOB NOT NULL)''')
+                    connection.commit()
+                    self._initialized = True
+            self._local.connection = connection
+        return connection
+
+    def _load_cached(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Busca no cache os vetores das chaves informadas."""
+        connection = self._get_connection()
+        found = {}
+        for start in range(0, len(keys), _SQLITE_MAX_PARAMS):
+            batch = keys[start:start + _SQLITE_MAX_PARAMS]
+            placeholders = ",".join("?" * len(batch))
+            rows = connection.execute(f"SELECT key, vector FROM embedding_cache WHERE key IN ({placeholders})",
+                                      batch).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def _save(self, items: Dict[str, List[float]]) -> None:
+        """Grava novos vetores no cache."""
+        connection = self._get_connection()
+        connection.executemany("INSERT OR REPLACE INTO embedding_cache (key, vector) VALUES (?, ?)",
+                               [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in
+                                items.items()])
+        connection.commit()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Gera embeddings para uma lista de textos, consultando o cache antes do modelo.
+
+        Args:
+            texts (List[str]): Os textos a serem transformados em embeddings.
+
+        Returns:
+            List[List[float]]: Um embedding por texto, na mesma ordem.
+        """
+        keys = [content_hash(text, self.model_name) for text in texts]
+        vectors = self._load_cached(list(set(keys)))
+
+        # Textos ausentes do cache, sem repetição (pedaços idênticos são embutidos uma única vez).
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+
+        with self._stats_lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        logging.info(f"Cache de embeddings: {len(texts) - len(missing)} acertos, {len(missing)} pedaços a embutir.")
+
+        if missing:
+            missing_keys = list(missing)
+            batches = [missing_keys[start:start + self.batch_size]
+                       for start in range(0, len(missing_keys), self.batch_size)]
+
+            def embed_batch(batch_keys: List[str]) -> Dict[str, List[float]]:
+                batch_vectors = self.underlying.embed_documents([missing[key] for key in batch_keys])
+                return dict(zip(batch_keys, batch_vectors))
+
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+                for batch_result in executor.map(embed_batch, batches):
+                    # Grava cada lote assim que fica pronto: uma falha posterior não perde o trabalho já feito.
+                    self._save(batch_result)
+                    vectors.update(batch_result)
+
+        return [vectors[key] for key in keys]
+
+    def _recall_query(self, text: str) -> Optional[List[float]]:
+        """Busca o embedding de uma consulta no LRU em memória."""
+        with self._query_memo_lock:
+            vector = self._query_memo.get(text)
+            if vector is not None:
+                self._query_memo.move_to_end(text)
+        with self._stats_lock:
+            if vector is None:
+                self.query_misses += 1
+            else:
+                self.query_hits += 1
+        return vector
+
+    def _remember_query(self, text: str, vector: List[float]) -> None:
+        """Guarda o embedding de uma consulta no LRU em memória."""
+        with self._query_memo_lock:
+            self._query_memo[text] = vector
+            self._query_memo.move_to_end(text)
+            while len(self._query_memo) > self.query_memo_size:
+                self._query_memo.popitem(last=False)
+
+    def embed_query(self, text: str) -> List[float]:
+        """Gera o embedding de uma consulta pelo modelo, reaproveitando os mais recentes."""
+        vector = self._recall_query(text)
+        if vector is None:
+            vector = self.underlying.embed_query(text)
+            self._remember_query(text, vector)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Gera os embeddings de várias consultas de uma vez (ex.: as perguntas de um lote de chat).
+        As consultas ausentes do LRU são enviadas ao modelo em uma única chamada em lotes quando o
+        modelo aceita, ou em chamadas paralelas limitadas por max_concurrency. As chamadas
+        seguintes de embed_query para os mesmos textos são atendidas pela memória.
+
+        Args:
+            texts (List[str]): As consultas.
+
+        Returns:
+            List[List[float]]: Um embedding por consulta, na mesma ordem.
+        """
+        vectors: Dict[str, List[float]] = {}
+        missing = []
+        for text in dict.fromkeys(texts):
+            vector = self._recall_query(text)
+            if vector is None:
+                missing.append(text)
+            else:
+                vectors[text] = vector
+
+        if missing:
+            if self._batched_queries:
+                computed = []
+                for start in range(0, len(missing), self.batch_size):
+                    computed.extend(self.underlying.embed_documents(missing[start:start + self.batch_size],
+                                                                    task_type="RETRIEVAL_QUERY"))
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(missing))) as executor:
+                    computed = list(executor.map(self.underlying.embed_query, missing))
+            for text, vector in zip(missing, computed):
+                self._remember_query(text, vector)
+                vectors[text] = vector
+        return [vectors[text] for text in texts]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Versão assíncrona de embed_documents."""
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Versão assíncrona de embed_query."""
+        vector = self._recall_query(text)
+        if vector is None:
+            vector = await self.underlying.aembed_query(text)
+            self._remember_query(text, vector)
+        return vector
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Versão assíncrona de embed_queries."""
+        return await asyncio.to_thread(self.embed_queries, texts)
+
+    def stats(self) -> dict:
+        """
+        Retorna os contadores do cache de embeddings.
+
+        Returns:
+            dict: Acertos, falhas e taxa de acerto dos pedaços, e acertos e falhas das consultas.
+        """
+        with self._stats_lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                    "query_hits": self.query_hits, "query_misses": self.query_misses}
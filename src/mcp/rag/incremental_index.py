@@ -0,0 +1,129 @@
+# mcp/rag/incremental_index.py
+# Este arquivo implementa a reindexação incremental: quando um documento já indexado é
+# reenviado, apenas os pedaços novos ou alterados são embutidos e gravados no Chroma, e os
+# pedaços que deixaram de existir são removidos. Os IDs dos pedaços são derivados do hash
+# do conteúdo (veja ingestion_pipeline.chunk_id), então um pedaço inalterado mantém o mesmo ID.
+
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Set
+
+from langchain_core.documents import Document
+
+from mcp.utils.metrics import stage_timer
+from mcp.rag.chroma_utils import get_embeddings, upsert_chunks, get_chunk_metadata, update_chunk_metadata, \
+    delete_chunks
+
+logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class IncrementalIndexer:
+    """
+    Grava lotes de pedaços comparando-os com o que já está no Chroma para cada file_id.
+
+    Args:
+        existing_file_ids (List[int]): Arquivos que já têm pedaços indexados (reenvios).
+            Para arquivos novos nenhuma consulta ao Chroma é feita.
+    """
+
+    def __init__(self, existing_file_ids: List[int]):
+        self.existing: Dict[int, Dict[str, dict]] = {file_id: get_chunk_metadata(file_id)
+                                                     for file_id in existing_file_ids}
+        self.seen: Dict[int, Set[str]] = defaultdict(set)
+        self.stats: Dict[int, Dict[str, int]] = defaultdict(lambda: {"embedded": 0, "unchanged": 0, "deleted": 0})
+
+    def write_batch(self, documents: List[Document], ids: List[str],
+                    on_stage: Optional[Callable[[str], None]] = None) -> None:
+        """
+        Embute e grava os pedaços novos ou alterados de um lote. Pedaços inalterados só têm os
+        metadados atualizados, e apenas quando eles mudaram (ex.: o texto mudou de página).
+        Os contadores só são atualizados depois que o lote foi gravado, então repetir um lote
+        que falhou não os conta duas vezes.
+
+        Args:
+            documents (List[Document]): Os pedaços do lote.
+            ids (List[str]): Os IDs dos pedaços.
+            on_stage (Optional[Callable[[str], None]]): Chamado com "embedding" e "upserting".
+        """
+        new_documents, new_ids = [], []
+        changed_ids, changed_metadatas = [], []
+        counts: Dict[int, Dict[str, int]] = defaultdict(lambda: {"embedded": 0, "unchanged": 0})
+        for doc, doc_id in zip(documents, ids):
+            file_id = doc.metadata["file_id"]
+            stored = self.existing.get(file_id, {}).get(doc_id)
+            if stored is None:
+                new_documents.append(doc)
+                new_ids.append(doc_id)
+                counts[file_id]["embedded"] += 1
+            else:
+                counts[file_id]["unchanged"] += 1
+                if stored != doc.metadata:
+                    changed_ids.append(doc_id)
+                    changed_metadatas.append(doc.metadata)
+
+        if new_documents:
+            if on_stage:
+                on_stage("embedding")
+            with stage_timer("ingestion", "embed"):
+                vectors = get_embeddings().embed_documents([doc.page_content for doc in new_documents])
+            if on_stage:
+                on_stage("upserting")
+            with stage_timer("ingestion", "upsert"):
+                upsert_chunks(new_documents, new_ids, vectors)
+        if changed_ids:
+            with stage_timer("ingestion", "metadata_update"):
+                update_chunk_metadata(changed_ids, changed_metadatas)
+
+        for doc, doc_id in zip(documents, ids):
+            self.seen[doc.metadata["file_id"]].add(doc_id)
+        for file_id, file_counts in counts.items():
+            self.stats[file_id]["embedded"] += file_counts["embedded"]
+            self.stats[file_id]["unchanged"] += file_counts["unchanged"]
+
+    def finish_file(self, file_id: int) -> Dict[str, int]:
+        """
+        Remove os pedaços de um arquivo que não apareceram na nova versão.
+        Deve ser chamado apenas depois que todos os pedaços do arquivo foram gravados.
+
+        Args:
+            file_id (int): O ID do arquivo.
+
+        Returns:
+            Dict[str, int]: Pedaços embutidos, inalterados e removidos do arquivo.
+        """
+        stale = [doc_id for doc_id in self.existing.pop(file_id, {}) if doc_id not in self.seen[file_id]]
+        if stale:
+            with stage_timer("ingestion", "delete_stale"):
+                delete_chunks(stale)
+        self.seen.pop(file_id, None)
+        stats = self.stats.pop(file_id, {"embedded": 0, "unchanged": 0, "deleted": 0})
+        stats["deleted"] = len(stale)
+        logging.info(f"Arquivo {file_id} indexado: {stats['embedded']} pedaços novos ou alterados, "
+                     f"{stats['unchanged']} inalterados, {stats['deleted']} removidos.")
+        return stats
+
+
+def restore_file(file_id: int, snapshot: Dict[str, dict]) -> int:
+    """
+    Desfaz uma reindexação que falhou no meio: remove os pedaços gravados que não existiam no
+    snapshot e devolve os metadados originais aos pedaços inalterados. Pedaços que a
+    reindexação já removeu (finish_file) não podem ser recuperados sem os seus embeddings.
+
+    Args:
+        file_id (int): O ID do arquivo.
+        snapshot (Dict[str, dict]): Os metadados de cada pedaço antes da reindexação (get_chunk_metadata).
+
+    Returns:
+        int: O número de pedaços do snapshot que não existem mais.
+    """
+    current = get_chunk_metadata(file_id)
+    added = [doc_id for doc_id in current if doc_id not in snapshot]
+    changed = [doc_id for doc_id, metadata in current.items() if doc_id in snapshot and snapshot[doc_id] != metadata]
+    if added:
+        delete_chunks(added)
+    if changed:
+        update_chunk_metadata(changed, [snapshot[doc_id] for doc_id in changed])
+    missing = sum(1 for doc_id in snapshot if doc_id not in current)
+    logging.info(f"Reindexação do arquivo {file_id} desfeita: {len(added)} pedaços removidos, "
+                 f"{len(changed)} metadados restaurados, {missing} pedaços não recuperáveis.")
+    return missing
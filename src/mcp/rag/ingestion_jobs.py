@@ -0,0 +1,262 @@
+# mcp/rag/ingestion_jobs.py
+# Este arquivo implementa a fila de jobs de ingestão de documentos. O upload apenas
+# registra o job e retorna; um pool de workers executa as etapas
+# ler/dividir -> embutir -> gravar no Chroma, com novas tentativas em caso de falha.
+# A ingestão em massa (bulk_ingestion) também roda como um job desta fila.
+# O progresso de cada job fica no SQLite, visível para qualquer worker do uvicorn.
+
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from mcp.config import INGESTION_CONFIG
+from mcp.rag.ingestion_pipeline import iter_chunk_batches
+from mcp.rag.chroma_utils import delete_doc_from_chroma, get_chunk_metadata
+from mcp.rag.incremental_index import IncrementalIndexer, restore_file
+from mcp.rag.bulk_ingestion import run_bulk_ingestion
+from mcp.rag.db_utils import mark_document_ready, delete_document_record, update_document_record, \
+    claim_document_for_ingestion, create_ingestion_job, update_ingestion_job, get_ingestion_job, \
+    renew_ingestion_job_leases
+from mcp.rag.semantic_cache import semantic_cache
+from mcp.utils.helpers import file_content_hash
+from mcp.utils.metrics import record_stage, timed_iter
+
+logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Pool de workers que executa os jobs de ingestão fora do ciclo da requisição HTTP.
+_executor = ThreadPoolExecutor(max_workers=INGESTION_CONFIG["max_workers"], thread_name_prefix="ingestion")
+
+# Thread que renova o prazo (lease) dos jobs deste worker, iniciada no primeiro envio.
+_lease_thread: Optional[threading.Thread] = None
+_lease_lock = threading.Lock()
+
+
+def _renew_leases_forever() -> None:
+    """Renova o prazo dos jobs deste worker a cada terço do prazo, enquanto o processo existir."""
+    interval = INGESTION_CONFIG["job_lease_seconds"] / 3
+    while True:
+        time.sleep(interval)
+        try:
+            renew_ingestion_job_leases()
+        except Exception as e:
+            logging.warning(f"Falha ao renovar o prazo dos jobs de ingestão: {e}")
+
+
+def _ensure_lease_renewal() -> None:
+    """Inicia, uma única vez por processo, a thread que renova o prazo dos jobs."""
+    global _lease_thread
+    if _lease_thread is None:
+        with _lease_lock:
+            if _lease_thread is None:
+                _lease_thread = threading.Thread(target=_renew_leases_forever, name="ingestion-lease",
+                                                 daemon=True)
+                _lease_thread.start()
+
+
+def _run_pipeline(job_id: str, file_path: str, file_id: int, filename: str, is_update: bool) -> dict:
+    """
+    Executa as etapas de ingestão de um arquivo, atualizando o progresso do job.
+    Em um reenvio, apenas os pedaços novos ou alterados são embutidos e gravados.
+
+    Args:
+        job_id (str): O ID do job.
+        file_path (str): O caminho do arquivo salvo.
+        file_id (int): O ID do documento.
+        filename (str): O nome do documento, gravado nos metadados dos pedaços.
+        is_update (bool): Se o documento já estava indexado (reenvio).
+
+    Returns:
+        dict: Pedaços embutidos, inalterados e removidos.
+    """
+    update_ingestion_job(job_id, stage="parsing")
+    indexer = IncrementalIndexer([file_id] if is_update else [])
+    chunk_count = 0
+    # A espera por cada lote (leitura e divisão no pool de processos) é a etapa "parse" das métricas.
+    batches = iter_chunk_batches(file_path, file_id, INGESTION_CONFIG["upsert_batch_size"], source=filename)
+    for batch in timed_iter(batches, "ingestion", "parse"):
+        indexer.write_batch(batch.documents, batch.ids,
+                            on_stage=lambda stage: update_ingestion_job(job_id, stage=stage))
+        chunk_count += len(batch.documents)
+        update_ingestion_job(job_id, stage="parsing", chunks_total=chunk_count, chunks_done=chunk_count,
+                             chunks_unchanged=indexer.stats[file_id]["unchanged"],
+                             progress=batch.tasks_done / batch.tasks_total)
+
+    stats = indexer.finish_file(file_id)
+    update_ingestion_job(job_id, chunks_deleted=stats["deleted"])
+    return stats
+
+
+def _run_job(job_id: str, file_path: str, file_id: int, filename: str, content_hash: str, is_update: bool) -> None:
+    """
+    Executa um job de ingestão com novas tentativas e backoff exponencial.
+    O documento só passa a 'ready' depois que todos os pedaços foram gravados. Se todas as
+    tentativas falharem, um documento novo é removido e um reenvio volta à versão anterior.
+    """
+    max_attempts = INGESTION_CONFIG["max_retries"] + 1
+    update_ingestion_job(job_id, status="running", started_at=time.time())
+    # Pedaços da versão indexada, para desfazer um reenvio que falhe no meio.
+    snapshot = None
+    try:
+        for attempt in range(1, max_attempts + 1):
+            update_ingestion_job(job_id, attempts=attempt)
+            try:
+                if is_update and snapshot is None:
+                    snapshot = get_chunk_metadata(file_id)
+                attempt_start = time.perf_counter()
+                stats = _run_pipeline(job_id, file_path, file_id, filename, is_update)
+                record_stage("ingestion", "job_total", time.perf_counter() - attempt_start)
+                if is_update:
+                    update_document_record(file_id, filename, content_hash)
+                else:
+                    mark_document_ready(file_id)
+                semantic_cache.invalidate()
+                update_ingestion_job(job_id, status="completed", stage="done", finished_at=time.time())
+                logging.info(f"Job {job_id}: arquivo {filename} (ID: {file_id}) indexado: "
+                             f"{stats['embedded']} pedaços embutidos, {stats['unchanged']} inalterados, "
+                             f"{stats['deleted']} removidos.")
+                return
+            except ValueError as e:
+                # Erros de conteúdo (ex.: formato não suportado) não melhoram com novas tentativas.
+                last_error = e
+                break
+            except Exception as e:
+                last_error = e
+                logging.warning(f"Job {job_id}: tentativa {attempt}/{max_attempts} falhou: {e}")
+                if attempt < max_attempts:
+                    time.sleep(INGESTION_CONFIG["retry_backoff_seconds"] * 2 ** (attempt - 1))
+
+        logging.error(f"Job {job_id}: falha ao indexar o arquivo {filename} (ID: {file_id}): {last_error}")
+        try:
+            if is_update:
+                # Remove os pedaços já gravados da nova versão, mantendo a anterior pesquisável.
+                if snapshot is not None:
+                    restore_file(file_id, snapshot)
+            else:
+                # Remove os pedaços parciais e o registro, para que o documento não apareça como indexado.
+                delete_doc_from_chroma(file_id)
+                delete_document_record(file_id)
+        except Exception as e:
+            logging.error(f"Job {job_id}: falha ao desfazer a indexação parcial do arquivo {file_id}: {e}",
+                          exc_info=True)
+        finally:
+            # Respostas geradas enquanto os pedaços parciais estavam no índice não valem mais.
+            semantic_cache.invalidate()
+            update_ingestion_job(job_id, status="failed", error=str(last_error), finished_at=time.time())
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+            logging.info(f"Arquivo temporário {file_path} removido.")
+
+
+def submit_ingestion_job(file_path: str, filename: str, external_id: Optional[str] = None) -> dict:
+    """
+    Cria o job de ingestão de um arquivo e o envia ao pool de workers.
+
+    O documento é identificado pelo external_id ou, na falta dele, pelo nome do arquivo. Se a
+    identidade já existe, o job reindexa o mesmo file_id de forma incremental; se o conteúdo
+    não mudou, ou se já há um job em andamento para o documento, nenhum job é criado.
+
+    Args:
+        file_path (str): O caminho do arquivo já salvo em disco. É removido ao final do processamento.
+        filename (str): O nome original do arquivo.
+        external_id (Optional[str]): Identidade estável do documento, definida pelo cliente.
+
+    Returns:
+        dict: O job_id (None se nada mudou; o do job em andamento se 'busy'), o file_id e o
+        status ('queued', 'unchanged' ou 'busy').
+    """
+    document_key = external_id or filename
+    content_hash = file_content_hash(file_path)
+    _ensure_lease_renewal()
+    claim = claim_document_for_ingestion(document_key, filename, content_hash, str(uuid.uuid4()))
+    job_id, file_id = claim["job_id"], claim["file_id"]
+
+    if claim["status"] == "unchanged":
+        os.remove(file_path)
+        logging.info(f"Documento {document_key} (ID: {file_id}) reenviado sem alterações.")
+    elif claim["status"] == "busy":
+        os.remove(file_path)
+        logging.info(f"Documento {document_key} (ID: {file_id}) reenviado com o job {job_id} em andamento.")
+    else:
+        _executor.submit(_run_job, job_id, file_path, file_id, filename, content_hash, claim["is_update"])
+        logging.info(f"Job {job_id} criado para o arquivo {filename} (ID: {file_id}, reenvio: {claim['is_update']}).")
+    return {"job_id": job_id, "file_id": file_id, "status": claim["status"]}
+
+
+def _run_bulk_job(job_id: str, collect: Callable[[], List[Tuple[str, str]]], work_folder: str) -> None:
+    """
+    Executa um job de ingestão em massa. As novas tentativas são feitas por lote, dentro de
+    run_bulk_ingestion; o resultado por arquivo fica gravado no job.
+    """
+    update_ingestion_job(job_id, status="running", stage="collecting", started_at=time.time(), attempts=1)
+    try:
+        files = collect()
+        update_ingestion_job(job_id, stage="parsing")
+
+        def on_progress(documents_done: int, documents_total: int, chunks_done: int) -> None:
+            update_ingestion_job(job_id, chunks_total=chunks_done, chunks_done=chunks_done,
+                                 progress=documents_done / documents_total if documents_total else 1.0)
+
+        result = run_bulk_ingestion(files, on_progress)
+        update_ingestion_job(job_id, status="completed", stage="done", progress=1.0,
+                             chunks_total=result["chunks_indexed"], chunks_done=result["chunks_indexed"],
+                             result=json.dumps(result, ensure_ascii=False), finished_at=time.time())
+        logging.info(f"Job {job_id}: ingestão em massa concluída ({result['documents_indexed']} documentos).")
+    except Exception as e:
+        logging.error(f"Job {job_id}: falha na ingestão em massa: {e}", exc_info=True)
+        update_ingestion_job(job_id, status="failed", error=str(e), finished_at=time.time())
+    finally:
+        shutil.rmtree(work_folder, ignore_errors=True)
+
+
+def submit_bulk_ingestion_job(collect: Callable[[], List[Tuple[str, str]]], description: str,
+                              work_folder: str) -> dict:
+    """
+    Cria um job de ingestão em massa e o envia ao pool de workers. A listagem dos arquivos
+    (incluindo a extração dos .zip) também é feita no job, fora da requisição HTTP.
+
+    Args:
+        collect (Callable[[], List[Tuple[str, str]]]): Retorna os pares (caminho do arquivo, nome
+            exibido) a indexar. Um ValueError (ex.: .zip acima dos limites) faz o job falhar.
+        description (str): Descrição dos arquivos, exibida no campo filename do job.
+        work_folder (str): Pasta temporária do job (uploads e .zip extraídos), removida ao final.
+
+    Returns:
+        dict: O job_id e o status ('queued').
+    """
+    job_id = str(uuid.uuid4())
+    _ensure_lease_renewal()
+    create_ingestion_job(job_id, None, description, kind="bulk")
+    _executor.submit(_run_bulk_job, job_id, collect, work_folder)
+    logging.info(f"Job {job_id} de ingestão em massa criado: {description}.")
+    return {"job_id": job_id, "status": "queued"}
+
+
+def get_job_status(job_id: str) -> Optional[dict]:
+    """
+    Retorna o progresso de um job, incluindo a vazão em pedaços por segundo.
+
+    Args:
+        job_id (str): O ID do job.
+
+    Returns:
+        Optional[dict]: Os dados do job (com o resultado por arquivo, em um job de ingestão em
+        massa concluído), ou None se não existir.
+    """
+    job = get_ingestion_job(job_id)
+    if job is None:
+        return None
+    chunks_per_second = 0.0
+    if job["started_at"]:
+        elapsed = (job["finished_at"] or time.time()) - job["started_at"]
+        if elapsed > 0:
+            chunks_per_second = job["chunks_done"] / elapsed
+    job["chunks_per_second"] = chunks_per_second
+    job["result"] = json.loads(job["result"]) if job.get("result") else None
+    return job
@@ -0,0 +1,278 @@
+# mcp/rag/ingestion_pipeline.py
+# Este arquivo implementa o pipeline de ingestão em streaming: as páginas de um documento
+# são lidas e divididas em pedaços em um pool de processos, e os pedaços são entregues em
+# lotes à medida que ficam prontos. Nos PDFs, apenas uma janela limitada de páginas fica em
+# memória, independentemente do tamanho do documento; DOCX e HTML são lidos inteiros por uma
+# única tarefa (veja plan_page_tasks).
+#
+# Este módulo é importado pelos processos do pool, por isso não deve importar módulos com
+# efeitos colaterais na importação (credenciais, Chroma, SQLite).
+
+import os
+import hashlib
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from langchain_community.document_loaders import Docx2txtLoader, UnstructuredHTMLLoader
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from mcp.config import INGESTION_CONFIG
+
+logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".html")
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Retorna o pool de processos de parsing, criando-o na primeira chamada.
+    Usa 'spawn' para não herdar threads e conexões abertas do processo do servidor.
+
+    Returns:
+        ProcessPoolExecutor: O pool compartilhado.
+    """
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=INGESTION_CONFIG["parse_workers"],
+                                            mp_context=multiprocessing.get_context("spawn"))
+    return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    """
+    Encerra o pool de processos de parsing, se ele foi criado. Tarefas ainda não iniciadas são
+    canceladas e a chamada aguarda o fim dos processos, para que nenhum fique órfão quando o
+    servidor é encerrado. Uma nova chamada a get_process_pool cria outro pool.
+    """
+    global _process_pool
+    pool, _process_pool = _process_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+        logging.info("Pool de processos de parsing encerrado.")
+
+
+def _parse_and_split(file_path: str, file_id: int, source: str, page_start: int,
+                     page_end: Optional[int]) -> List[Document]:
+    """
+    Lê um intervalo de páginas de um arquivo e o divide em pedaços. Executado no pool de processos.
+
+    Args:
+        file_path (str): O caminho do arquivo.
+        file_id (int): O ID do arquivo, gravado nos metadados de cada pedaço.
+        source (str): O nome do documento gravado nos metadados (o caminho temporário muda a cada upload).
+        page_start (int): A primeira página do intervalo (apenas PDF).
+        page_end (Optional[int]): A página seguinte à última do intervalo (apenas PDF).
+
+    Returns:
+        List[Document]: Os pedaços do intervalo, em ordem.
+    """
+    file_extension = os.path.splitext(file_path)[1].lower()
+    if file_extension == ".pdf":
+        from pypdf import PdfReader
+
+        reader = PdfReader(file_path)
+        total_pages = len(reader.pages)
+        pages = [
+            Document(page_content=reader.pages[index].extract_text() or "",
+                     metadata={"page": index, "total_pages": total_pages})
+            for index in range(page_start, page_end)
+        ]
+    elif file_extension == ".docx":
+        pages = Docx2txtLoader(file_path).load()
+    else:
+        pages = UnstructuredHTMLLoader(file_path).load()
+
+    for page in pages:
+        page.metadata["source"] = source
+        page.metadata["file_id"] = file_id
+
+    # "start_index" (a posição do pedaço na página) permite unir pedaços vizinhos no contexto
+    # enviado ao modelo (veja context_packing).
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=INGESTION_CONFIG["chunk_size"],
+                                                   chunk_overlap=INGESTION_CONFIG["chunk_overlap"],
+                                                   add_start_index=True)
+    return text_splitter.split_documents(pages)
+
+
+def plan_page_tasks(file_path: str) -> List[Tuple[int, Optional[int]]]:
+    """
+    Divide um arquivo em intervalos de páginas a serem processados em paralelo.
+    PDFs são divididos em blocos de "pages_per_task" páginas; DOCX e HTML formam uma única tarefa,
+    pois os carregadores desses formatos leem o documento inteiro de uma vez: para eles, o texto
+    completo (e seus pedaços) fica em memória no processo do pool, sem a janela limitada dos PDFs.
+
+    Args:
+        file_path (str): O caminho do arquivo.
+
+    Returns:
+        List[Tuple[int, Optional[int]]]: Os intervalos (página inicial, página final exclusiva).
+
+    Raises:
+        ValueError: Se o tipo de arquivo não for suportado.
+    """
+    file_extension = os.path.splitext(file_path)[1].lower()
+    if file_extension not in SUPPORTED_EXTENSIONS:
+        raise ValueError(f"Tipo de arquivo não suportado para indexação: {file_path}")
+    if file_extension != ".pdf":
+        return [(0, None)]
+
+    from pypdf import PdfReader
+
+    total_pages = len(PdfReader(file_path).pages)
+    step = INGESTION_CONFIG["pages_per_task"]
+    return [(start, min(start + step, total_pages)) for start in range(0, total_pages, step)]
+
+
+@dataclass
+class ChunkBatch:
+    """Um lote de pedaços prontos para serem embutidos e gravados no armazenamento vetorial."""
+    documents: List[Document]  # Os pedaços, na ordem dos documentos.
+    ids: List[str]  # IDs dos pedaços, derivados do conteúdo (veja chunk_id).
+    completed: List[int] = field(default_factory=list)  # Arquivos cujos pedaços já foram todos entregues.
+    failed: Dict[int, Exception] = field(default_factory=dict)  # Arquivos que falharam, com o erro.
+    tasks_done: int = 0  # Tarefas do pool concluídas até este lote.
+    tasks_total: int = 0  # Total de tarefas planejadas.
+
+
+def chunk_id(file_id: int, digest: str, occurrence: int) -> str:
+    """
+    Gera o ID de um pedaço a partir do hash do seu conteúdo. Um pedaço inalterado mantém o mesmo
+    ID quando o documento é reenviado, o que permite reindexar apenas os pedaços alterados.
+
+    Args:
+        file_id (int): O ID do arquivo.
+        digest (str): O hash do texto do pedaço.
+        occurrence (int): Quantas vezes o mesmo texto já apareceu antes no arquivo.
+
+    Returns:
+        str: O ID "<file_id>-<hash>" (com o sufixo "-<ocorrência>" para textos repetidos).
+    """
+    return f"{file_id}-{digest}" if occurrence == 0 else f"{file_id}-{digest}-{occurrence}"
+
+
+def iter_corpus_batches(files: List[Tuple[str, int, str]], batch_size: int) -> Iterator[ChunkBatch]:
+    """
+    Gera os pedaços de um conjunto de arquivos em lotes, na ordem dos arquivos, à medida que o
+    pool os produz. As tarefas de todos os arquivos compartilham a mesma janela de no máximo
+    "max_inflight_tasks" intervalos em processamento, o que mantém todos os processos ocupados
+    com muitos arquivos pequenos e limita a memória usada com documentos muito grandes.
+
+    Uma falha em um arquivo não interrompe os demais: os pedaços ainda não entregues do arquivo
+    são descartados e ele é informado em ChunkBatch.failed. Pedaços já entregues em lotes
+    anteriores devem ser removidos por quem consome o gerador.
+
+    Args:
+        files (List[Tuple[str, int, str]]): Triplas (caminho do arquivo, file_id, nome do documento).
+        batch_size (int): O número de pedaços por lote.
+
+    Yields:
+        ChunkBatch: O próximo lote de pedaços.
+    """
+    failed: Dict[int, Exception] = {}
+    tasks = []
+    for file_path, file_id, source in files:
+        try:
+            file_tasks = plan_page_tasks(file_path)
+        except Exception as e:
+            failed[file_id] = e
+            continue
+        if not file_tasks:
+            # Arquivo sem páginas: nada a indexar, mas ainda precisa ser concluído.
+            file_tasks = [(0, 0)]
+        for index, (page_start, page_end) in enumerate(file_tasks):
+            tasks.append((file_path, file_id, source, page_start, page_end, index == len(file_tasks) - 1))
+
+    pool = get_process_pool()
+    max_inflight = INGESTION_CONFIG["max_inflight_tasks"]
+
+    pending = deque()
+    next_task = 0
+    tasks_done = 0
+    occurrences: Dict[int, Dict[str, int]] = {}  # Por arquivo: quantas vezes cada hash de texto já apareceu.
+    failed_files = set(failed)
+    documents: List[Document] = []
+    ids: List[str] = []
+    parsed: List[int] = []  # Arquivos totalmente lidos, aguardando a entrega dos seus últimos pedaços.
+
+    def take_batch(size: int) -> ChunkBatch:
+        nonlocal documents, ids, parsed, failed
+        batch = ChunkBatch(documents=documents[:size], ids=ids[:size], failed=failed, tasks_done=tasks_done,
+                           tasks_total=len(tasks))
+        documents, ids = documents[size:], ids[size:]
+        remaining = {doc.metadata["file_id"] for doc in documents}
+        batch.completed = [file_id for file_id in parsed if file_id not in remaining]
+        parsed = [file_id for file_id in parsed if file_id in remaining]
+        failed = {}
+        return batch
+
+    while next_task < len(tasks) or pending:
+        # Mantém a janela de tarefas em processamento cheia.
+        while next_task < len(tasks) and len(pending) < max_inflight:
+            file_path, file_id, source, page_start, page_end, is_last = tasks[next_task]
+            future = pool.submit(_parse_and_split, file_path, file_id, source, page_start, page_end)
+            pending.append((future, file_id, is_last))
+            next_task += 1
+
+        # Consome os resultados na ordem dos documentos, para que os IDs dos pedaços sejam estáveis.
+        future, file_id, is_last = pending.popleft()
+        tasks_done += 1
+        if file_id in failed_files:
+            # Tarefa restante de um arquivo que já falhou: o resultado é descartado.
+            continue
+        try:
+            chunks = future.result()
+        except Exception as e:
+            logging.error(f"Falha ao ler o arquivo de file_id {file_id}: {e}")
+            failed[file_id] = e
+            failed_files.add(file_id)
+            keep = [i for i, doc in enumerate(documents) if doc.metadata["file_id"] != file_id]
+            documents = [documents[i] for i in keep]
+            ids = [ids[i] for i in keep]
+            continue
+
+        file_occurrences = occurrences.setdefault(file_id, {})
+        for chunk in chunks:
+            digest = hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest()[:32]
+            occurrence = file_occurrences.get(digest, 0)
+            file_occurrences[digest] = occurrence + 1
+            documents.append(chunk)
+            ids.append(chunk_id(file_id, digest, occurrence))
+        if is_last:
+            parsed.append(file_id)
+
+        while len(documents) >= batch_size:
+            yield take_batch(batch_size)
+
+    if documents or parsed or failed:
+        yield take_batch(len(documents))
+
+
+def iter_chunk_batches(file_path: str, file_id: int, batch_size: int,
+                       source: Optional[str] = None) -> Iterator[ChunkBatch]:
+    """
+    Gera os pedaços de um único arquivo em lotes (veja iter_corpus_batches).
+
+    Args:
+        file_path (str): O caminho do arquivo.
+        file_id (int): O ID do arquivo.
+        batch_size (int): O número de pedaços por lote.
+        source (Optional[str]): O nome do documento gravado nos metadados (padrão: o nome do arquivo).
+
+    Yields:
+        ChunkBatch: O próximo lote de pedaços.
+
+    Raises:
+        Exception: O erro que impediu a leitura do arquivo.
+    """
+    source = source or os.path.basename(file_path)
+    for batch in iter_corpus_batches([(file_path, file_id, source)], batch_size):
+        if batch.failed:
+            raise batch.failed[file_id]
+        yield batch
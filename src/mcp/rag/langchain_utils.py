@@ -2,68 +2,377 @@
 # Este arquivo implementa o núcleo do sistema RAG usando LangChain,
 # configurando o modelo de linguagem, retriever e a cadeia RAG.
 
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.chains import create_history_aware_retriever, create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
-from typing import List
+from langchain_core.runnables import Runnable, RunnableConfig, ConfigurableField, RunnablePassthrough, RunnableLambda
+from typing import Callable, List, Dict, Optional, Tuple
 from langchain_core.documents import Document
 import os
 import logging
-# Importação corrigida para o vectorstore
-from mcp.rag.chroma_utils import vectorstore
+import asyncio
+import threading
+from mcp.rag.retrieval import HybridRetriever
+from mcp.rag.chain_metrics import ChainMetricsHandler, stage_tag
+from mcp.rag.context_packing import context_packer
 
 # Importação corrigida para as credenciais
-from mcp.config import get_credentials
+from mcp.config import get_credentials, MODEL_CONFIGS
 
 logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Obtém as credenciais usando a nova função de configuração
-credentials = get_credentials()
+# Cria o retriever híbrido (vetorial + BM25). Seus parâmetros podem ser ajustados por
+# requisição, sem reconstruir a cadeia, pelos campos configuráveis (veja retrieval_config).
+retriever = HybridRetriever().configurable_fields(
+    k=ConfigurableField(id="retrieval_k", name="k", description="Pedaços enviados ao modelo."),
+    file_ids=ConfigurableField(id="retrieval_file_ids", name="file_ids",
+                               description="Restringe a busca a estes arquivos."),
+    score_threshold=ConfigurableField(id="retrieval_score_threshold", name="score_threshold",
+                                      description="Similaridade de cosseno mínima."),
+)
 
-# Cria um retriever a partir do vectorstore. Isso permite buscar documentos relevantes.
-retriever = vectorstore.as_retriever()
+
+def retrieval_config(k: Optional[int] = None, file_ids: Optional[List[int]] = None,
+                     score_threshold: Optional[float] = None) -> RunnableConfig:
+    """
+    Monta a configuração de execução da cadeia RAG com os parâmetros de recuperação de uma requisição.
+
+    Args:
+        k (Optional[int]): Pedaços enviados ao modelo.
+        file_ids (Optional[List[int]]): Restringe a busca a estes arquivos.
+        score_threshold (Optional[float]): Similaridade de cosseno mínima.
+
+    Returns:
+        RunnableConfig: A configuração a ser passada em invoke/ainvoke/astream.
+    """
+    configurable = {}
+    if k is not None:
+        configurable["retrieval_k"] = k
+    if file_ids:
+        configurable["retrieval_file_ids"] = list(file_ids)
+    if score_threshold is not None:
+        configurable["retrieval_score_threshold"] = score_threshold
+    return {"configurable": configurable}
+
+# Os prompts de conversa recebem, em {summary}, o resumo acumulado das interações antigas da sessão
+# (veja _fold_summary). Ele faz parte da instrução de sistema: o Gemini só aceita mensagens de
+# sistema no início da conversa.
 
 # Template de prompt para contextualizar a pergunta do usuário com o histórico de chat.
 contextualize_q_prompt = ChatPromptTemplate.from_messages([
-    ("system", "Dado um histórico de chat e uma pergunta de acompanhamento, gere uma pergunta autônoma que possa ser usada para recuperar documentos relevantes. Se não houver histórico de chat, retorne a pergunta original."),
+    ("system", "Dado um histórico de chat e uma pergunta de acompanhamento, gere uma pergunta autônoma que possa ser usada para recuperar documentos relevantes. Se não houver histórico de chat, retorne a pergunta original.{summary}"),
     MessagesPlaceholder("chat_history"),
     ("human", "{input}"),
 ])
 
 # Template de prompt para a cadeia de perguntas e respostas.
 qa_prompt = ChatPromptTemplate.from_messages([
-    ("system", "Você é um assistente de IA útil. Use o seguinte contexto para responder à pergunta do usuário. Se você não souber a resposta, diga que não sabe. Não tente inventar uma resposta."),
+    ("system", "Você é um assistente de IA útil. Use o seguinte contexto para responder à pergunta do usuário. Se você não souber a resposta, diga que não sabe. Não tente inventar uma resposta.{summary}"),
     ("system", "Contexto: {context}"),
     MessagesPlaceholder(variable_name="chat_history"),
     ("human", "{input}")
 ])
 
 
-def get_rag_chain(model: str = "gemini-2.0-flash"):
+# Template de prompt para conversas sem recuperação de documentos (context_type 'chat').
+chat_prompt = ChatPromptTemplate.from_messages([
+    ("system", "Você é um assistente de IA útil. Responda à pergunta do usuário de forma clara e objetiva.{summary}"),
+    MessagesPlaceholder(variable_name="chat_history"),
+    ("human", "{input}")
+])
+
+# Template de prompt para o resumo acumulado das conversas longas (mcp/rag/session_memory.py).
+summary_prompt = ChatPromptTemplate.from_messages([
+    ("system", "Você resume conversas entre um usuário e um assistente de IA. Atualize o resumo existente com as novas mensagens, preservando fatos, nomes, números, decisões e perguntas em aberto. Responda apenas com o novo resumo, em no máximo {max_words} palavras."),
+    ("human", "Resumo existente:\n{summary}\n\nNovas mensagens:\n{messages}"),
+])
+
+
+# Registro de cadeias por tipo ("rag" ou "chat") e modelo. Cada entrada guarda a "impressão
+# digital" da configuração usada na construção, para que a cadeia seja reconstruída apenas
+# quando a configuração do modelo em MODEL_CONFIGS mudar.
+_rag_chain_registry: Dict[Tuple[str, str], Tuple[tuple, Runnable]] = {}
+_rag_chain_registry_lock = threading.Lock()
+
+
+def _config_fingerprint(model: str) -> tuple:
     """
-    Cria e retorna a cadeia RAG (Retrieval-Augmented Generation).
+    Gera uma representação imutável da configuração de um modelo em MODEL_CONFIGS.
 
     Args:
-        model (str): O nome do modelo de linguagem a ser usado (padrão: "gemini-2.0-flash").
+        model (str): O nome do modelo.
 
     Returns:
-        Runnable: A cadeia RAG completa pronta para ser invocada.
+        tuple: Pares (chave, valor) ordenados da configuração do modelo.
     """
-    # Inicializa o modelo de linguagem de chat do Google Generative AI (Gemini).
+    return tuple(sorted(MODEL_CONFIGS.get(model, {}).items()))
+
+
+def _build_gemini_llm(model: str, model_config: dict) -> BaseChatModel:
+    """Cria o cliente de um modelo Gemini do Google Generative AI."""
+    # Importado aqui para não pesar na importação do módulo: o cliente só é criado com a
+    # primeira cadeia (no aquecimento da inicialização ou na primeira requisição).
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
     # Passando as credenciais explicitamente.
-    llm = ChatGoogleGenerativeAI(model=model, temperature=0.7, credentials=credentials)
+    return ChatGoogleGenerativeAI(model=model, temperature=model_config.get("temperature", 0.7),
+                                  credentials=get_credentials())
+
+
+# Fábricas de clientes por engine de MODEL_CONFIGS. Recebem o nome do modelo e sua configuração.
+_LLM_ENGINES: Dict[str, Callable[[str, dict], BaseChatModel]] = {"gemini": _build_gemini_llm}
+
+
+def register_llm_engine(engine: str, factory: Callable[[str, dict], BaseChatModel]) -> None:
+    """
+    Registra a fábrica de clientes de um engine, usada pelos modelos de MODEL_CONFIGS com
+    "engine" igual a este nome (ex.: modelos locais ou os modelos falsos dos benchmarks).
+    As cadeias já construídas para um modelo só são refeitas se a configuração dele mudar.
+
+    Args:
+        engine (str): O nome do engine.
+        factory (Callable[[str, dict], BaseChatModel]): Recebe o nome e a configuração do
+            modelo e retorna o cliente.
+    """
+    _LLM_ENGINES[engine] = factory
+
+
+def supported_engines() -> Tuple[str, ...]:
+    """Retorna os engines com fábrica de clientes registrada."""
+    return tuple(_LLM_ENGINES)
+
 
-    # Cria um retriever ciente do histórico.
-    history_aware_retriever = create_history_aware_retriever(llm, retriever, contextualize_q_prompt)
+def _build_llm(model: str) -> BaseChatModel:
+    """
+    Cria o cliente do modelo de linguagem informado.
+
+    Args:
+        model (str): O nome do modelo de linguagem a ser usado.
+
+    Returns:
+        BaseChatModel: O cliente do modelo.
+
+    Raises:
+        ValueError: Se o engine do modelo em MODEL_CONFIGS não for suportado.
+        FileNotFoundError: Se o arquivo de credenciais não existir.
+    """
+    model_config = MODEL_CONFIGS.get(model, {})
+    engine = model_config.get("engine", "gemini")
+    factory = _LLM_ENGINES.get(engine)
+    if factory is None:
+        raise ValueError(f"Engine '{engine}' do modelo {model} não é suportado.")
+    return factory(model, model_config)
+
+
+def _fold_summary(inputs: dict) -> dict:
+    """
+    Retira do histórico as mensagens de sistema (o resumo acumulado da sessão, que
+    session_memory coloca no início) e as entrega em "summary", para os prompts as incluírem
+    na instrução de sistema.
+    """
+    summary, history = "", []
+    for message in inputs.get("chat_history", []):
+        if isinstance(message, dict) and message.get("role") == "system":
+            summary += f"\n\n{message['content']}"
+        else:
+            history.append(message)
+    return {**inputs, "chat_history": history, "summary": summary}
+
+
+# Primeira etapa das cadeias de conversa (veja _fold_summary).
+fold_summary = RunnableLambda(_fold_summary, name="fold_summary")
+
+
+def _build_rag_chain(model: str) -> Runnable:
+    """
+    Constrói uma nova cadeia RAG para o modelo informado.
+
+    Args:
+        model (str): O nome do modelo de linguagem a ser usado.
+
+    Returns:
+        Runnable: A cadeia RAG completa pronta para ser invocada.
+    """
+    llm = _build_llm(model)
+
+    # Cria um retriever ciente do histórico. As tags identificam as etapas nas métricas
+    # (veja chain_metrics). Os pedaços recuperados são empacotados no orçamento de tokens do
+    # modelo antes de chegarem ao prompt (veja context_packing).
+    history_aware_retriever = create_history_aware_retriever(llm.with_config(tags=[stage_tag("rewrite")]),
+                                                             retriever, contextualize_q_prompt)
+    history_aware_retriever = history_aware_retriever | context_packer(model)
 
     # Cria uma cadeia de documentos que combina os documentos recuperados com a pergunta
     # para gerar uma resposta usando o LLM e o qa_prompt.
-    Youtube_chain = create_stuff_documents_chain(llm, qa_prompt)
+    Youtube_chain = create_stuff_documents_chain(llm.with_config(tags=[stage_tag("generation")]), qa_prompt)
 
     # Cria a cadeia de recuperação que orquestra o retriever ciente do histórico
     # e a cadeia de perguntas e respostas.
     rag_chain = create_retrieval_chain(history_aware_retriever, Youtube_chain)
 
-    return rag_chain
\ No newline at end of file
+    return fold_summary | rag_chain
+
+
+def _build_chat_chain(model: str) -> Runnable:
+    """
+    Constrói uma cadeia de conversa sem recuperação para o modelo informado. A saída tem a
+    mesma chave "answer" da cadeia RAG.
+
+    Args:
+        model (str): O nome do modelo de linguagem a ser usado.
+
+    Returns:
+        Runnable: A cadeia pronta para ser invocada.
+    """
+    llm = _build_llm(model).with_config(tags=[stage_tag("generation")])
+    return fold_summary | RunnablePassthrough.assign(answer=chat_prompt | llm | StrOutputParser())
+
+
+def _build_summary_chain(model: str) -> Runnable:
+    """
+    Constrói a cadeia que atualiza o resumo acumulado de uma sessão.
+
+    Args:
+        model (str): O nome do modelo de linguagem a ser usado.
+
+    Returns:
+        Runnable: A cadeia, que recebe summary, messages e max_words e retorna o novo resumo.
+    """
+    return summary_prompt | _build_llm(model).with_config(tags=[stage_tag("summary")]) | StrOutputParser()
+
+
+_CHAIN_BUILDERS = {"rag": _build_rag_chain, "chat": _build_chat_chain, "summary": _build_summary_chain}
+
+# Pipeline em que as etapas e os tokens de cada tipo de cadeia são registrados. As cadeias de
+# chat usam o pipeline do endpoint que as chamou ("chat", "chat_stream" ou "chat_batch").
+_CHAIN_PIPELINES = {"rag": None, "chat": None, "summary": "session_summary"}
+
+
+def _get_chain(kind: str, model: str) -> Runnable:
+    """Retorna a cadeia do tipo e modelo informados, construindo-a apenas quando necessário."""
+    key = (kind, model)
+    fingerprint = _config_fingerprint(model)
+    cached = _rag_chain_registry.get(key)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+
+    with _rag_chain_registry_lock:
+        # Verifica novamente: outra thread pode ter construído a cadeia enquanto esperávamos.
+        cached = _rag_chain_registry.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+
+        if cached is None:
+            logging.info(f"Construindo cadeia {kind} para o modelo {model}.")
+        else:
+            logging.info(f"Configuração do modelo {model} alterada. Reconstruindo cadeia {kind}.")
+        chain = _CHAIN_BUILDERS[kind](model).with_config(
+            callbacks=[ChainMetricsHandler(model, _CHAIN_PIPELINES[kind])])
+        _rag_chain_registry[key] = (fingerprint, chain)
+        return chain
+
+
+def get_rag_chain(model: str = "gemini-2.0-flash") -> Runnable:
+    """
+    Retorna a cadeia RAG (Retrieval-Augmented Generation) do modelo informado.
+
+    A cadeia (e o cliente do modelo, com seu pool de conexões HTTP) é construída uma
+    única vez por modelo e compartilhada entre as requisições. Ela só é reconstruída
+    quando a configuração do modelo em MODEL_CONFIGS muda.
+
+    Args:
+        model (str): O nome do modelo de linguagem a ser usado (padrão: "gemini-2.0-flash").
+
+    Returns:
+        Runnable: A cadeia RAG completa pronta para ser invocada.
+    """
+    return _get_chain("rag", model)
+
+
+def get_chat_chain(model: str = "gemini-2.0-flash") -> Runnable:
+    """
+    Retorna a cadeia de conversa sem recuperação de documentos do modelo informado,
+    compartilhada entre as requisições como em get_rag_chain.
+
+    Args:
+        model (str): O nome do modelo de linguagem a ser usado (padrão: "gemini-2.0-flash").
+
+    Returns:
+        Runnable: A cadeia pronta para ser invocada, com a resposta na chave "answer".
+    """
+    return _get_chain("chat", model)
+
+
+def get_summary_chain(model: str) -> Runnable:
+    """
+    Retorna a cadeia de resumo de sessões do modelo informado.
+
+    Args:
+        model (str): O nome do modelo de linguagem a ser usado.
+
+    Returns:
+        Runnable: A cadeia pronta para ser invocada.
+    """
+    return _get_chain("summary", model)
+
+
+def get_chain(model: str, use_retrieval: bool) -> Runnable:
+    """
+    Retorna a cadeia RAG ou a cadeia de conversa do modelo, conforme a decisão de roteamento.
+
+    Args:
+        model (str): O nome do modelo de linguagem a ser usado.
+        use_retrieval (bool): Se a pergunta passa pela recuperação de documentos.
+
+    Returns:
+        Runnable: A cadeia pronta para ser invocada.
+    """
+    return get_rag_chain(model) if use_retrieval else get_chat_chain(model)
+
+
+# Semáforos por modelo que limitam o número de chamadas simultâneas ao LLM em cada worker.
+_model_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+# Limite usado quando o modelo não define "max_concurrency" em MODEL_CONFIGS.
+DEFAULT_MAX_CONCURRENCY = 64
+
+
+def get_model_semaphore(model: str) -> asyncio.Semaphore:
+    """
+    Retorna o semáforo que limita a concorrência de chamadas ao modelo informado.
+
+    Args:
+        model (str): O nome do modelo.
+
+    Returns:
+        asyncio.Semaphore: Semáforo com o limite "max_concurrency" do modelo.
+    """
+    semaphore = _model_semaphores.get(model)
+    if semaphore is None:
+        limit = MODEL_CONFIGS.get(model, {}).get("max_concurrency", DEFAULT_MAX_CONCURRENCY)
+        semaphore = _model_semaphores.setdefault(model, asyncio.Semaphore(limit))
+    return semaphore
+
+
+def warm_rag_chains() -> None:
+    """
+    Pré-constrói as cadeias RAG e de conversa de todos os modelos configurados em MODEL_CONFIGS,
+    criando os clientes dos modelos. Deve ser chamada na inicialização da aplicação para que a
+    primeira requisição não pague o custo de construção.
+
+    Raises:
+        RuntimeError: Se a cadeia de algum modelo não puder ser construída (os demais são
+            construídos mesmo assim).
+    """
+    failed = []
+    for model in MODEL_CONFIGS:
+        try:
+            get_rag_chain(model)
+            get_chat_chain(model)
+        except Exception as e:
+            logging.error(f"Falha ao pré-construir a cadeia RAG para o modelo {model}: {e}", exc_info=True)
+            failed.append(model)
+    if failed:
+        raise RuntimeError(f"Falha ao pré-construir as cadeias dos modelos: {', '.join(failed)}")
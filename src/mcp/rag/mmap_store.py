@@ -0,0 +1,519 @@
+# mcp/rag/mmap_store.py
+# Este arquivo implementa um backend de armazenamento vetorial embutido na aplicação, alternativo
+# ao Chroma (VECTOR_STORE_CONFIG["backend"] = "mmap"). Os embeddings ficam em matrizes NumPy
+# gravadas em arquivos .npy e abertas com mmap somente leitura: os workers do uvicorn
+# compartilham as mesmas páginas do cache do sistema operacional, em vez de cada um carregar o
+# índice inteiro na sua memória. As matrizes podem ser quantizadas (float16 ou int8 com escala
+# por linha) e a busca é exata (força bruta), vetorizada em blocos e em lote para várias consultas.
+#
+# Layout da pasta do índice:
+#   chunks.db   SQLite com os pedaços (ID, file_id, texto, metadados e o embedding float32
+#               normalizado), as lápides dos pedaços removidos e os metadados do índice. É a
+#               fonte da verdade e é compartilhado entre os workers (modo WAL).
+#   seg-<geração>.<parte>.npy
+#               O segmento compactado: vetores, escalas (int8), seqs e file_ids de todos os
+#               pedaços gravados até a compactação, imutável depois de escrito.
+#
+# Pedaços gravados depois da última compactação formam o "delta", mantido em memória por cada
+# worker e lido de forma incremental do SQLite. Remoções e sobrescritas geram lápides (tombstones)
+# que escondem as linhas antigas do segmento. Quando o delta e as lápides passam do limite
+# configurado, um novo segmento é gerado e os workers passam a mapeá-lo na próxima busca.
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from mcp.rag.vector_store import VectorStore
+
+logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Tipos de quantização aceitos para o segmento compactado.
+QUANTIZATIONS = ("float32", "float16", "int8")
+
+# Parâmetros por consulta nas buscas em lote (o SQLite aceita no mínimo 999).
+_SQLITE_MAX_PARAMS = 900
+
+# Duração máxima de uma compactação; depois disso outro processo pode assumi-la.
+_COMPACTION_LEASE_SECONDS = 600
+
+# file_id gravado para pedaços sem "file_id" nos metadados.
+_NO_FILE_ID = -1
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def quantize(vectors: np.ndarray, quantization: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Converte vetores float32 para o tipo do segmento.
+
+    Args:
+        vectors (np.ndarray): Os vetores, um por linha.
+        quantization (str): "float32", "float16" ou "int8".
+
+    Returns:
+        Tuple[np.ndarray, Optional[np.ndarray]]: Os vetores convertidos e, em int8, a escala de
+        cada linha (o vetor original é aproximadamente linha * escala).
+    """
+    if quantization == "float32":
+        return vectors.astype(np.float32, copy=False), None
+    if quantization == "float16":
+        return vectors.astype(np.float16), None
+    if quantization == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    raise ValueError(f"Quantização '{quantization}' não suportada. Use uma de {', '.join(QUANTIZATIONS)}.")
+
+
+@dataclass(frozen=True)
+class _SearchState:
+    """Visão imutável do índice usada pelas buscas; substituída por inteiro a cada atualização."""
+    version: int  # Versão do índice (meta "version") refletida por este estado.
+    generation: int  # Geração do segmento mapeado (0 = nenhum segmento).
+    max_seq: int  # Maior seq incluída no segmento.
+    last_seq: int  # Maior seq já carregada no delta.
+    last_tombstone: int  # Maior ID de lápide já aplicado.
+    vectors: Optional[np.ndarray]  # Vetores do segmento (mmap).
+    scales: Optional[np.ndarray]  # Escalas por linha do segmento int8 (mmap).
+    seqs: Optional[np.ndarray]  # Seq de cada linha do segmento, em ordem crescente (mmap).
+    file_ids: Optional[np.ndarray]  # file_id de cada linha do segmento (mmap).
+    alive: Optional[np.ndarray]  # Linhas do segmento ainda válidas (None = todas).
+    delta: Tuple[Tuple[np.ndarray, np.ndarray, np.ndarray], ...]  # Blocos (seqs, file_ids, vetores).
+    dead: frozenset  # Seqs removidas do delta.
+
+
+_EMPTY_STATE = _SearchState(version=-1, generation=-1, max_seq=0, last_seq=0, last_tombstone=0, vectors=None,
+                            scales=None, seqs=None, file_ids=None, alive=None, delta=(), dead=frozenset())
+
+
+class MmapVectorStore(VectorStore):
+    """
+    Armazenamento vetorial em arquivos NumPy mapeados em memória.
+
+    Args:
+        path (str): A pasta do índice (criada se não existir).
+        quantization (str): Tipo dos vetores nos próximos segmentos: "float32", "float16" ou "int8".
+        compact_min_rows (int): Tamanho mínimo do delta (pedaços novos mais lápides) para compactar.
+        compact_ratio (float): Compacta quando o delta passa desta fração do segmento.
+        search_block_rows (int): Linhas do segmento avaliadas por vez na busca (limita a memória
+            temporária de cada busca).
+    """
+
+    name = "mmap"
+
+    def __init__(self, path: str, quantization: str = "int8", compact_min_rows: int = 20000,
+                 compact_ratio: float = 0.2, search_block_rows: int = 8192):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Quantização '{quantization}' não suportada. Use uma de {', '.join(QUANTIZATIONS)}.")
+        self.path = path
+        self.quantization = quantization
+        self.compact_min_rows = compact_min_rows
+        self.compact_ratio = compact_ratio
+        self.search_block_rows = search_block_rows
+        self._local = threading.local()
+        self._state = _EMPTY_STATE
+        self._refresh_lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        with self._write() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS chunks
+                            (seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                             id TEXT NOT NULL UNIQUE,
+                             file_id INTEGER NOT NULL,
+                             document TEXT,
+                             metadata TEXT,
+                             vector BLOB NOT NULL)''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_chunks_file_id ON chunks (file_id)')
+            conn.execute('''CREATE TABLE IF NOT EXISTS tombstones
+                            (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                             seq INTEGER NOT NULL)''')
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            for key, value in (("version", "0"), ("generation", "0"), ("max_seq", "0"), ("rows", "0"),
+                               ("quantization", quantization), ("dimensions", "0"), ("compaction_lease", "0")):
+                conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexão da thread atual com o chunks.db (reaberta em processos criados por fork)."""
+        conn = getattr(self._local, "connection", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(os.path.join(self.path, "chunks.db"), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        """Transação de escrita (BEGIN IMMEDIATE), que também avança a versão do índice."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'version'")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @contextmanager
+    def _read(self) -> Iterator[sqlite3.Connection]:
+        """Transação de leitura: todas as consultas do bloco veem o mesmo estado do índice."""
+        conn = self._connection()
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            conn.execute("COMMIT")
+
+    @staticmethod
+    def _meta(conn: sqlite3.Connection) -> Dict[str, str]:
+        return dict(conn.execute("SELECT key, value FROM meta").fetchall())
+
+    @staticmethod
+    def _select_in(conn: sqlite3.Connection, query: str, values: Sequence) -> list:
+        """Executa `query` (com um "IN ({})") em lotes de valores, juntando as linhas."""
+        rows = []
+        for start in range(0, len(values), _SQLITE_MAX_PARAMS):
+            batch = list(values[start:start + _SQLITE_MAX_PARAMS])
+            rows.extend(conn.execute(query.format(",".join("?" * len(batch))), batch).fetchall())
+        return rows
+
+    @staticmethod
+    def _bury(conn: sqlite3.Connection, seqs: List[int]) -> None:
+        """Remove as linhas e registra as lápides das seqs informadas."""
+        if seqs:
+            conn.executemany("INSERT INTO tombstones (seq) VALUES (?)", [(seq,) for seq in seqs])
+            for start in range(0, len(seqs), _SQLITE_MAX_PARAMS):
+                batch = seqs[start:start + _SQLITE_MAX_PARAMS]
+                conn.execute(f"DELETE FROM chunks WHERE seq IN ({','.join('?' * len(batch))})", batch)
+
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def upsert(self, ids: List[str], vectors: List[List[float]], documents: List[str],
+               metadatas: List[dict]) -> None:
+        if not ids:
+            return
+        matrix = _normalize(np.asarray(vectors, dtype=np.float32))
+        with self._write() as conn:
+            dimensions = int(self._meta(conn)["dimensions"])
+            if dimensions and matrix.shape[1] != dimensions:
+                raise ValueError(f"Embeddings com {matrix.shape[1]} dimensões; o índice usa {dimensions}.")
+            if not dimensions:
+                conn.execute("UPDATE meta SET value = ? WHERE key = 'dimensions'", (str(matrix.shape[1]),))
+            existing = self._select_in(conn, "SELECT seq FROM chunks WHERE id IN ({})", ids)
+            self._bury(conn, [row[0] for row in existing])
+            conn.executemany(
+                "INSERT INTO chunks (id, file_id, document, metadata, vector) VALUES (?, ?, ?, ?, ?)",
+                [(chunk_id, _file_id(metadata), document, json.dumps(metadata or {}), vector.tobytes())
+                 for chunk_id, document, metadata, vector in zip(ids, documents, metadatas, matrix)])
+        self._maybe_compact()
+
+    def update_metadata(self, ids: List[str], metadatas: List[dict]) -> None:
+        if not ids:
+            return
+        by_id = dict(zip(ids, metadatas))
+        moved = []
+        with self._write() as conn:
+            rows = self._select_in(conn, "SELECT seq, id, file_id, document, vector FROM chunks WHERE id IN ({})", ids)
+            for seq, chunk_id, file_id, document, vector in rows:
+                metadata = by_id[chunk_id]
+                if _file_id(metadata) == file_id:
+                    conn.execute("UPDATE chunks SET metadata = ? WHERE seq = ?", (json.dumps(metadata or {}), seq))
+                else:
+                    # O file_id também está no segmento: a linha é regravada com uma nova seq.
+                    moved.append((seq, chunk_id, document, metadata, vector))
+            self._bury(conn, [seq for seq, *_ in moved])
+            conn.executemany(
+                "INSERT INTO chunks (id, file_id, document, metadata, vector) VALUES (?, ?, ?, ?, ?)",
+                [(chunk_id, _file_id(metadata), document, json.dumps(metadata or {}), vector)
+                 for _, chunk_id, document, metadata, vector in moved])
+        if moved:
+            self._maybe_compact()
+
+    def delete(self, ids: List[str]) -> None:
+        if not ids:
+            return
+        with self._write() as conn:
+            self._bury(conn, [row[0] for row in self._select_in(conn, "SELECT seq FROM chunks WHERE id IN ({})", ids)])
+        self._maybe_compact()
+
+    def delete_file(self, file_id: int) -> int:
+        with self._write() as conn:
+            seqs = [row[0] for row in conn.execute("SELECT seq FROM chunks WHERE file_id = ?", (file_id,))]
+            self._bury(conn, seqs)
+        self._maybe_compact()
+        return len(seqs)
+
+
+    def get(self, ids: List[str], include_embeddings: bool = False) -> Dict[str, list]:
+        rows = self._select_in(self._connection(), "SELECT id, document, metadata, vector FROM chunks WHERE id IN ({})",
+                               list(dict.fromkeys(ids)))
+        by_id = {row[0]: row for row in rows}
+        found = [by_id[chunk_id] for chunk_id in dict.fromkeys(ids) if chunk_id in by_id]
+        result = {"ids": [row[0] for row in found], "documents": [row[1] for row in found],
+                  "metadatas": [json.loads(row[2]) for row in found]}
+        if include_embeddings:
+            result["embeddings"] = [np.frombuffer(row[3], dtype=np.float32) for row in found]
+        return result
+
+    def get_file_metadata(self, file_id: int) -> Dict[str, dict]:
+        rows = self._connection().execute("SELECT id, metadata FROM chunks WHERE file_id = ?", (file_id,))
+        return {chunk_id: json.loads(metadata) for chunk_id, metadata in rows}
+
+    def iter_chunks(self, page_size: int) -> Iterator[Tuple[List[str], List[str], List[dict]]]:
+        last_seq = 0
+        while True:
+            rows = self._connection().execute("SELECT seq, id, document, metadata FROM chunks WHERE seq > ? "
+                                              "ORDER BY seq LIMIT ?", (last_seq, page_size)).fetchall()
+            if not rows:
+                return
+            yield [row[1] for row in rows], [row[2] for row in rows], [json.loads(row[3]) for row in rows]
+            last_seq = rows[-1][0]
+
+
+    def _segment_path(self, generation: int, part: str) -> str:
+        return os.path.join(self.path, f"seg-{generation:06d}.{part}.npy")
+
+    def _refresh(self) -> _SearchState:
+        """
+        Atualiza a visão do índice se outro worker (ou esta thread) gravou desde a última busca.
+        Um novo segmento é mapeado por inteiro; caso contrário, só os pedaços e as lápides novos
+        são lidos.
+        """
+        state = self._state
+        conn = self._connection()
+        if int(conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]) == state.version:
+            return state
+        with self._refresh_lock:
+            state = self._state
+            with self._read() as conn:
+                meta = self._meta(conn)
+                if int(meta["version"]) == state.version:
+                    return state
+                generation, max_seq = int(meta["generation"]), int(meta["max_seq"])
+                if generation != state.generation:
+                    state = self._load_segment(generation, max_seq, int(meta["rows"]), meta["quantization"])
+                new_tombstones = conn.execute("SELECT id, seq FROM tombstones WHERE id > ? ORDER BY id",
+                                              (state.last_tombstone,)).fetchall()
+                new_rows = conn.execute("SELECT seq, file_id, vector FROM chunks WHERE seq > ? ORDER BY seq",
+                                        (max(state.last_seq, max_seq),)).fetchall()
+            alive, dead = state.alive, state.dead
+            if new_tombstones:
+                buried = np.fromiter((seq for _, seq in new_tombstones), dtype=np.int64)
+                in_segment = buried[buried <= state.max_seq]
+                if len(in_segment) and state.seqs is not None:
+                    # As seqs do segmento estão em ordem crescente.
+                    positions = np.searchsorted(state.seqs, in_segment)
+                    inside = positions < len(state.seqs)
+                    positions, in_segment = positions[inside], in_segment[inside]
+                    positions = positions[state.seqs[positions] == in_segment]
+                    alive = np.ones(len(state.seqs), dtype=bool) if alive is None else alive.copy()
+                    alive[positions] = False
+                dead = dead | frozenset(int(seq) for seq in buried[buried > state.max_seq])
+            delta, last_seq = state.delta, state.last_seq
+            if new_rows:
+                block = (np.fromiter((row[0] for row in new_rows), dtype=np.int64, count=len(new_rows)),
+                         np.fromiter((row[1] for row in new_rows), dtype=np.int64, count=len(new_rows)),
+                         np.vstack([np.frombuffer(row[2], dtype=np.float32) for row in new_rows]))
+                delta, last_seq = delta + (block,), new_rows[-1][0]
+            last_tombstone = new_tombstones[-1][0] if new_tombstones else state.last_tombstone
+            self._state = state = _SearchState(
+                version=int(meta["version"]), generation=state.generation, max_seq=state.max_seq,
+                last_seq=max(last_seq, state.max_seq), last_tombstone=last_tombstone, vectors=state.vectors,
+                scales=state.scales, seqs=state.seqs, file_ids=state.file_ids, alive=alive, delta=delta, dead=dead)
+            return state
+
+    def _load_segment(self, generation: int, max_seq: int, rows: int, quantization: str) -> _SearchState:
+        """Mapeia o segmento de uma geração, com delta e lápides vazios (lidos em seguida por _refresh)."""
+        vectors = scales = seqs = file_ids = None
+        if generation and rows:
+            vectors = np.load(self._segment_path(generation, "vectors"), mmap_mode="r")
+            seqs = np.load(self._segment_path(generation, "seqs"), mmap_mode="r")
+            file_ids = np.load(self._segment_path(generation, "file_ids"), mmap_mode="r")
+            if quantization == "int8":
+                scales = np.load(self._segment_path(generation, "scales"), mmap_mode="r")
+            logging.info(f"Índice vetorial mmap: segmento {generation} com {rows} pedaços ({quantization}) mapeado.")
+        return _SearchState(version=-1, generation=generation, max_seq=max_seq, last_seq=max_seq, last_tombstone=0,
+                            vectors=vectors, scales=scales, seqs=seqs, file_ids=file_ids, alive=None, delta=(),
+                            dead=frozenset())
+
+    def search(self, query_vectors: np.ndarray, k: int, file_ids: Optional[Sequence[int]] = None) -> List[List[str]]:
+        state = self._refresh()
+        queries = _normalize(np.atleast_2d(np.asarray(query_vectors, dtype=np.float32)))
+        wanted = np.asarray(list(file_ids), dtype=np.int64) if file_ids else None
+        scores_parts, seq_parts = [], []
+
+        def collect(block: np.ndarray, block_seqs: np.ndarray, mask: Optional[np.ndarray],
+                    block_scales: Optional[np.ndarray] = None):
+            # Similaridade de todas as linhas do bloco com todas as consultas: (linhas, consultas).
+            scores = block.astype(np.float32, copy=False) @ queries.T
+            if block_scales is not None:
+                scores *= block_scales[:, None]
+            if mask is not None:
+                scores[~mask] = -np.inf
+            if len(scores) > k:
+                top = np.argpartition(-scores, k - 1, axis=0)[:k]
+                scores_parts.append(np.take_along_axis(scores, top, axis=0))
+                seq_parts.append(np.asarray(block_seqs)[top])
+            else:
+                scores_parts.append(scores)
+                seq_parts.append(np.repeat(np.asarray(block_seqs)[:, None], len(queries), axis=1))
+
+        if state.vectors is not None:
+            for start in range(0, len(state.seqs), self.search_block_rows):
+                end = start + self.search_block_rows
+                mask = state.alive[start:end] if state.alive is not None else None
+                if wanted is not None:
+                    in_files = np.isin(state.file_ids[start:end], wanted)
+                    mask = in_files if mask is None else mask & in_files
+                    if not mask.any():
+                        continue
+                collect(state.vectors[start:end], state.seqs[start:end], mask,
+                        state.scales[start:end] if state.scales is not None else None)
+        for block_seqs, block_file_ids, block_vectors in state.delta:
+            mask = None
+            if state.dead:
+                mask = ~np.isin(block_seqs, np.fromiter(state.dead, dtype=np.int64))
+            if wanted is not None:
+                in_files = np.isin(block_file_ids, wanted)
+                mask = in_files if mask is None else mask & in_files
+            collect(block_vectors, block_seqs, mask)
+
+        if not scores_parts:
+            return [[] for _ in range(len(queries))]
+        scores = np.concatenate(scores_parts, axis=0)
+        seqs = np.concatenate(seq_parts, axis=0)
+        order = np.argsort(-scores, axis=0, kind="stable")[:k]
+        results_seqs = []
+        for column in range(len(queries)):
+            rows = order[:, column]
+            rows = rows[np.isfinite(scores[rows, column])]
+            results_seqs.append([int(seq) for seq in seqs[rows, column]])
+
+        unique = sorted({seq for result in results_seqs for seq in result})
+        id_by_seq = dict(self._select_in(self._connection(), "SELECT seq, id FROM chunks WHERE seq IN ({})", unique))
+        # Pedaços removidos depois da atualização da visão já não têm ID e são descartados.
+        return [[id_by_seq[seq] for seq in result if seq in id_by_seq] for result in results_seqs]
+
+
+    def _maybe_compact(self) -> None:
+        """Compacta o índice se o delta e as lápides passaram do limite configurado."""
+        conn = self._connection()
+        meta = self._meta(conn)
+        pending = conn.execute("SELECT COUNT(*) FROM chunks WHERE seq > ?", (int(meta["max_seq"]),)).fetchone()[0]
+        pending += conn.execute("SELECT COUNT(*) FROM tombstones").fetchone()[0]
+        if pending >= max(self.compact_min_rows, self.compact_ratio * int(meta["rows"])):
+            self.compact()
+
+    def compact(self) -> bool:
+        """
+        Grava um novo segmento com todos os pedaços atuais, no tipo de quantização configurado,
+        e descarta as lápides que ele torna desnecessárias. Apenas um processo compacta por vez.
+
+        Returns:
+            bool: True se a compactação foi feita, False se outra já estava em andamento.
+        """
+        if not self._compact_lock.acquire(blocking=False):
+            return False
+        try:
+            with self._write() as conn:
+                if float(self._meta(conn)["compaction_lease"]) > time.time():
+                    return False
+                conn.execute("UPDATE meta SET value = ? WHERE key = 'compaction_lease'",
+                             (str(time.time() + _COMPACTION_LEASE_SECONDS),))
+            try:
+                return self._compact()
+            finally:
+                with self._write() as conn:
+                    conn.execute("UPDATE meta SET value = '0' WHERE key = 'compaction_lease'")
+        finally:
+            self._compact_lock.release()
+
+    def _compact(self) -> bool:
+        started = time.perf_counter()
+        with self._read() as conn:
+            meta = self._meta(conn)
+            generation = int(meta["generation"]) + 1
+            dimensions = int(meta["dimensions"])
+            rows, max_seq = conn.execute("SELECT COUNT(*), COALESCE(MAX(seq), 0) FROM chunks").fetchone()
+            last_tombstone = conn.execute("SELECT COALESCE(MAX(id), 0) FROM tombstones").fetchone()[0]
+            if rows:
+                dtype = np.int8 if self.quantization == "int8" else np.dtype(self.quantization)
+                vectors = np.lib.format.open_memmap(self._segment_path(generation, "vectors"), mode="w+",
+                                                    dtype=dtype, shape=(rows, dimensions))
+                seqs = np.lib.format.open_memmap(self._segment_path(generation, "seqs"), mode="w+",
+                                                 dtype=np.int64, shape=(rows,))
+                file_ids = np.lib.format.open_memmap(self._segment_path(generation, "file_ids"), mode="w+",
+                                                     dtype=np.int64, shape=(rows,))
+                scales = None
+                if self.quantization == "int8":
+                    scales = np.lib.format.open_memmap(self._segment_path(generation, "scales"), mode="w+",
+                                                       dtype=np.float32, shape=(rows,))
+                cursor = conn.execute("SELECT seq, file_id, vector FROM chunks ORDER BY seq")
+                position = 0
+                while batch := cursor.fetchmany(self.search_block_rows):
+                    end = position + len(batch)
+                    block, block_scales = quantize(np.vstack([np.frombuffer(row[2], dtype=np.float32)
+                                                              for row in batch]), self.quantization)
+                    vectors[position:end] = block
+                    if scales is not None:
+                        scales[position:end] = block_scales
+                    seqs[position:end] = [row[0] for row in batch]
+                    file_ids[position:end] = [row[1] for row in batch]
+                    position = end
+                for array in (vectors, seqs, file_ids, scales):
+                    if array is not None:
+                        array.flush()
+                del vectors, seqs, file_ids, scales
+
+        with self._write() as conn:
+            if int(self._meta(conn)["generation"]) != generation - 1:
+                return False
+            for key, value in (("generation", generation), ("max_seq", max_seq), ("rows", rows),
+                               ("quantization", self.quantization)):
+                conn.execute("UPDATE meta SET value = ? WHERE key = ?", (str(value), key))
+            # As lápides lidas acima referem-se a pedaços que já não estão no novo segmento.
+            conn.execute("DELETE FROM tombstones WHERE id <= ?", (last_tombstone,))
+        self._remove_old_segments(generation)
+        logging.info(f"Índice vetorial mmap compactado: segmento {generation} com {rows} pedaços "
+                     f"({self.quantization}) em {time.perf_counter() - started:.2f} s.")
+        return True
+
+    def _remove_old_segments(self, generation: int) -> None:
+        """Apaga os segmentos anteriores à geração anterior (que ainda pode estar mapeada por outros workers)."""
+        for name in os.listdir(self.path):
+            if name.startswith("seg-"):
+                try:
+                    if int(name.split(".")[0][4:]) < generation - 1:
+                        os.remove(os.path.join(self.path, name))
+                except (ValueError, OSError) as e:
+                    logging.warning(f"Não foi possível remover o segmento antigo {name}: {e}")
+
+    def stats(self) -> dict:
+        """Tamanho do segmento, do delta e das lápides vistos por este worker."""
+        state = self._refresh()
+        return {"backend": self.name, "generation": state.generation,
+                "segment_rows": 0 if state.seqs is None else len(state.seqs),
+                "delta_rows": sum(len(block[0]) for block in state.delta),
+                "tombstones": len(state.dead) + (0 if state.alive is None else int((~state.alive).sum())),
+                "quantization": self._meta(self._connection())["quantization"]}
+
+
+def _file_id(metadata: Optional[dict]) -> int:
+    file_id = (metadata or {}).get("file_id")
+    return int(file_id) if file_id is not None else _NO_FILE_ID
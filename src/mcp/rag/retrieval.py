@@ -0,0 +1,222 @@
+# mcp/rag/retrieval.py
+# Este arquivo implementa a recuperação híbrida usada pela cadeia RAG: a busca vetorial (Chroma
+# ou índice mmap, veja mcp/rag/vector_store.py) e a busca por palavras-chave do índice BM25 são
+# combinadas por fusão de posições recíprocas (RRF). Os candidatos podem ser filtrados por
+# similaridade mínima, reordenados por um cross-encoder local (opcional) e diversificados por MMR
+# antes de irem para o prompt.
+
+import asyncio
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun, AsyncCallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from mcp.config import RETRIEVAL_CONFIG
+from mcp.rag.chroma_utils import get_embeddings, get_vector_backend, get_bm25_index
+from mcp.utils.metrics import stage_timer
+
+logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Cross-encoder carregado sob demanda (None enquanto não carregado; False se indisponível).
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], rrf_k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Combina várias listas ordenadas de IDs pela fusão de posições recíprocas: cada lista
+    contribui com 1 / (rrf_k + posição) para cada ID que contém.
+
+    Args:
+        rankings (List[List[str]]): As listas de IDs, cada uma da mais para a menos relevante.
+        rrf_k (int): A constante de suavização da fusão.
+
+    Returns:
+        List[Tuple[str, float]]: Pares (ID, pontuação combinada), da maior para a menor pontuação.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for position, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + position)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def mmr_select(relevance: np.ndarray, vectors: np.ndarray, k: int, lambda_mult: float) -> List[int]:
+    """
+    Escolhe k candidatos por maximal marginal relevance: a cada passo, o candidato com a maior
+    relevância descontada da similaridade com os já escolhidos.
+
+    Args:
+        relevance (np.ndarray): A relevância de cada candidato, entre 0 e 1.
+        vectors (np.ndarray): Os embeddings normalizados dos candidatos (uma linha por candidato).
+        k (int): Quantos candidatos escolher.
+        lambda_mult (float): O peso da relevância frente à diversidade (1.0 = só relevância).
+
+    Returns:
+        List[int]: As posições dos candidatos escolhidos, na ordem de escolha.
+    """
+    selected: List[int] = []
+    if not len(relevance):
+        return selected
+    similarity = vectors @ vectors.T
+    max_similarity = np.full(len(relevance), -np.inf)
+    available = np.ones(len(relevance), dtype=bool)
+    while len(selected) < min(k, len(relevance)):
+        redundancy = np.where(np.isfinite(max_similarity), max_similarity, 0.0)
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, similarity[best])
+    return selected
+
+
+def _get_reranker():
+    """Carrega o cross-encoder configurado, ou retorna None se a etapa estiver desativada ou indisponível."""
+    global _reranker
+    model_name = RETRIEVAL_CONFIG.get("reranker_model")
+    if not model_name or _reranker is False:
+        return None
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                try:
+                    from sentence_transformers import CrossEncoder
+
+                    _reranker = CrossEncoder(model_name)
+                    logging.info(f"Cross-encoder {model_name} carregado para a reordenação.")
+                except Exception as e:
+                    # A dependência é opcional: sem ela, a recuperação segue sem reordenação.
+                    logging.warning(f"Cross-encoder {model_name} indisponível, reordenação desativada: {e}")
+                    _reranker = False
+    return _reranker or None
+
+
+def _normalize(values: np.ndarray) -> np.ndarray:
+    """Escala os valores para o intervalo [0, 1]."""
+    if not len(values):
+        return values
+    spread = values.max() - values.min()
+    if spread == 0:
+        return np.ones_like(values)
+    return (values - values.min()) / spread
+
+
+def hybrid_search(query: str, k: Optional[int] = None, file_ids: Optional[List[int]] = None,
+                  score_threshold: Optional[float] = None) -> List[Document]:
+    """
+    Recupera os pedaços mais relevantes para uma consulta combinando busca vetorial e BM25.
+
+    Etapas: até "fetch_k" candidatos de cada índice, fusão por RRF, filtro por similaridade de
+    cosseno mínima com a consulta, reordenação por cross-encoder (se configurado) e seleção
+    final por MMR (se habilitado).
+
+    Args:
+        query (str): A consulta.
+        k (Optional[int]): O número de pedaços retornados (padrão: RETRIEVAL_CONFIG["k"]).
+        file_ids (Optional[List[int]]): Restringe a busca aos pedaços destes arquivos.
+        score_threshold (Optional[float]): Similaridade de cosseno mínima (padrão: RETRIEVAL_CONFIG).
+
+    Returns:
+        List[Document]: Os pedaços escolhidos, do mais para o menos relevante, com o ID do pedaço e
+        a similaridade com a consulta em metadata["relevance_score"].
+    """
+    k = min(k or RETRIEVAL_CONFIG["k"], RETRIEVAL_CONFIG["max_k"])
+    fetch_k = max(RETRIEVAL_CONFIG["fetch_k"], k)
+    if score_threshold is None:
+        score_threshold = RETRIEVAL_CONFIG["score_threshold"]
+    # Cada etapa é registrada no pipeline "retrieval" das métricas.
+    with stage_timer("retrieval", "embed_query"):
+        query_vector = np.asarray(get_embeddings().embed_query(query), dtype=np.float32)
+        query_vector /= np.linalg.norm(query_vector) or 1.0
+
+    rankings = []
+    backend = get_vector_backend()
+    with stage_timer("retrieval", "vector_search"):
+        rankings.append(backend.search(query_vector[None, :], fetch_k, file_ids)[0])
+    if RETRIEVAL_CONFIG["use_bm25"]:
+        with stage_timer("retrieval", "bm25_search"):
+            rankings.append([doc_id for doc_id, _ in get_bm25_index().search(query, fetch_k, file_ids)])
+
+    fused = reciprocal_rank_fusion(rankings, RETRIEVAL_CONFIG["rrf_k"])
+    if not fused:
+        return []
+
+    # Busca texto, metadados e embeddings de todos os candidatos em uma única consulta.
+    candidate_ids = [doc_id for doc_id, _ in fused]
+    with stage_timer("retrieval", "fetch_candidates"):
+        stored = backend.get(candidate_ids, include_embeddings=True)
+    position = {doc_id: index for index, doc_id in enumerate(stored["ids"])}
+    candidates = [(doc_id, score) for doc_id, score in fused if doc_id in position]
+    if not candidates:
+        return []
+    rows = [position[doc_id] for doc_id, _ in candidates]
+    vectors = np.asarray([stored["embeddings"][row] for row in rows], dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True).clip(min=1e-12)
+    similarity = vectors @ query_vector
+    relevance = np.asarray([score for _, score in candidates], dtype=np.float32)
+    texts = [stored["documents"][row] for row in rows]
+    metadatas = [stored["metadatas"][row] or {} for row in rows]
+
+    keep = np.arange(len(candidates))
+    if score_threshold is not None:
+        keep = keep[similarity[keep] >= score_threshold]
+
+    reranker = _get_reranker()
+    if reranker is not None and len(keep):
+        top = keep[np.argsort(-relevance[keep], kind="stable")][:RETRIEVAL_CONFIG["rerank_top_n"]]
+        with stage_timer("retrieval", "rerank"):
+            rerank_scores = np.asarray(reranker.predict([(query, texts[index]) for index in top]), dtype=np.float32)
+        keep = top
+        relevance = relevance.copy()
+        relevance[top] = rerank_scores
+
+    if RETRIEVAL_CONFIG["use_mmr"] and len(keep) > k:
+        keep = keep[mmr_select(_normalize(relevance[keep]), vectors[keep], k, RETRIEVAL_CONFIG["mmr_lambda"])]
+    # O MMR só escolhe quais pedaços entram; eles são devolvidos do mais para o menos relevante,
+    # a ordem que o empacotamento do contexto (mcp/rag/context_packing.py) e as fontes esperam.
+    keep = keep[np.argsort(-relevance[keep], kind="stable")][:k]
+
+    documents = []
+    for index in keep:
+        metadata = dict(metadatas[index])
+        metadata["relevance_score"] = float(similarity[index])
+        documents.append(Document(id=candidates[index][0], page_content=texts[index], metadata=metadata))
+    return documents
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever LangChain sobre hybrid_search. Os parâmetros podem ser ajustados por requisição
+    pelos campos configuráveis da cadeia (veja langchain_utils.retrieval_config).
+    """
+
+    k: Optional[int] = None  # Pedaços retornados (None usa RETRIEVAL_CONFIG["k"]).
+    file_ids: Optional[List[int]] = None  # Restringe a busca a estes arquivos.
+    score_threshold: Optional[float] = None  # Similaridade de cosseno mínima.
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return hybrid_search(query, self.k, self.file_ids, self.score_threshold)
+
+    async def _aget_relevant_documents(self, query: str, *,
+                                       run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        return await asyncio.to_thread(hybrid_search, query, self.k, self.file_ids, self.score_threshold)
+
+
+def warm_retrieval() -> None:
+    """
+    Constrói o índice BM25 (e carrega o cross-encoder, se configurado) na inicialização da
+    aplicação, para que a primeira pergunta não pague esse custo.
+
+    Raises:
+        Exception: Se o armazenamento vetorial não puder ser lido; a recuperação tenta novamente na primeira pergunta.
+    """
+    if RETRIEVAL_CONFIG["use_bm25"]:
+        get_bm25_index()
+    _get_reranker()
@@ -0,0 +1,267 @@
+# mcp/rag/semantic_cache.py
+# Este arquivo implementa um cache semântico de respostas que fica na frente da cadeia RAG.
+# Perguntas repetidas ou quase idênticas (pela similaridade de cosseno dos embeddings)
+# reutilizam a resposta já gerada, evitando uma nova recuperação e uma nova chamada ao Gemini.
+
+import re
+import sys
+import time
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from mcp.config import SEMANTIC_CACHE_CONFIG
+from mcp.rag.chroma_utils import get_embeddings
+from mcp.rag.corpus_version import read_corpus_version, bump_corpus_version
+
+logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normaliza uma pergunta para uso como chave do cache: minúsculas, espaços
+    colapsados e sem pontuação final.
+
+    Args:
+        question (str): A pergunta original.
+
+    Returns:
+        str: A pergunta normalizada.
+    """
+    normalized = re.sub(r"\s+", " ", question.strip().lower())
+    return normalized.rstrip("?!.;: ")
+
+
+@dataclass
+class CacheEntry:
+    """Uma resposta armazenada no cache."""
+    question: str
+    answer: str
+    embedding: np.ndarray
+    created_at: float
+    size_bytes: int
+
+
+class SemanticCache:
+    """
+    Cache de respostas indexado pelo embedding da pergunta normalizada, pelo modelo
+    e pela versão atual do conjunto de documentos.
+
+    As entradas são removidas por LRU, por TTL e quando o limite de memória é atingido.
+    Qualquer alteração no conjunto de documentos invalida o cache inteiro.
+    Sem embedding_function, usa o modelo de embeddings compartilhado (criado sob demanda).
+    """
+
+    def __init__(self, embedding_function, similarity_threshold: float, ttl_seconds: float, max_entries: int,
+                 max_memory_bytes: int):
+        self.embedding_function = embedding_function
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_memory_bytes = max_memory_bytes
+
+        self._entries: "OrderedDict[tuple, CacheEntry]" = OrderedDict()
+        # Matriz de embeddings normalizados por modelo, reconstruída apenas quando o cache muda.
+        self._matrices: Dict[str, tuple] = {}
+        self._memory_bytes = 0
+        self._corpus_version = read_corpus_version()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_stores = 0
+
+    # ----------------------------------------------------------------- versão do corpus
+
+    def _check_corpus_version(self) -> None:
+        """Descarta o cache se outro worker (ou este) alterou o conjunto de documentos."""
+        version = read_corpus_version()
+        if version != self._corpus_version:
+            self._clear()
+            self._corpus_version = version
+            self.invalidations += 1
+
+    def invalidate(self) -> None:
+        """
+        Sinaliza que o conjunto de documentos mudou e descarta todas as respostas em cache.
+        A sinalização é feita no arquivo de versão, para que todos os workers a percebam.
+        """
+        bump_corpus_version()
+        with self._lock:
+            self._check_corpus_version()
+        logging.info("Cache semântico invalidado: o conjunto de documentos mudou.")
+
+    # ----------------------------------------------------------------- consulta e inserção
+
+    def _clear(self) -> None:
+        self._entries.clear()
+        self._matrices.clear()
+        self._memory_bytes = 0
+
+    def _remove(self, key: tuple) -> None:
+        entry = self._entries.pop(key)
+        self._memory_bytes -= entry.size_bytes
+        self._matrices.pop(key[0], None)
+
+    def _expire(self, now: float) -> None:
+        """Remove as entradas com TTL vencido."""
+        expired = [key for key, entry in self._entries.items() if now - entry.created_at > self.ttl_seconds]
+        for key in expired:
+            self._remove(key)
+            self.evictions += 1
+
+    def _model_matrix(self, model: str):
+        """Retorna (chaves, matriz de embeddings) das entradas de um modelo."""
+        cached = self._matrices.get(model)
+        if cached is None:
+            keys = [key for key in self._entries if key[0] == model]
+            if keys:
+                matrix = np.vstack([self._entries[key].embedding for key in keys])
+            else:
+                matrix = np.empty((0, 0), dtype=np.float32)
+            cached = (keys, matrix)
+            self._matrices[model] = cached
+        return cached
+
+    def _embeddings(self):
+        return self.embedding_function if self.embedding_function is not None else get_embeddings()
+
+    def _embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self._embeddings().embed_query(question), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    async def _aembed(self, question: str) -> np.ndarray:
+        vector = np.asarray(await self._embeddings().aembed_query(question), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _lookup_embedding(self, model: str, embedding: np.ndarray) -> Tuple[Optional[str], int]:
+        with self._lock:
+            self._check_corpus_version()
+            self._expire(time.time())
+            keys, matrix = self._model_matrix(model)
+            if not keys:
+                self.misses += 1
+                return None, self._corpus_version
+            similarities = matrix @ embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                self.misses += 1
+                return None, self._corpus_version
+            self._entries.move_to_end(keys[best])
+            self.hits += 1
+            return self._entries[keys[best]].answer, self._corpus_version
+
+    def _store_embedding(self, model: str, question: str, answer: str, embedding: np.ndarray,
+                         corpus_version: Optional[int]) -> None:
+        entry = CacheEntry(question=question, answer=answer, embedding=embedding, created_at=time.time(),
+                           size_bytes=embedding.nbytes + sys.getsizeof(question) + sys.getsizeof(answer))
+        with self._lock:
+            self._check_corpus_version()
+            if corpus_version is not None and corpus_version != self._corpus_version:
+                # O corpus mudou enquanto a resposta era gerada: ela pode ter usado documentos
+                # removidos ou desconhecer os novos, então não é guardada.
+                self.stale_stores += 1
+                return
+            key = (model, question)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._memory_bytes += entry.size_bytes
+            self._matrices.pop(model, None)
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or self._memory_bytes > self.max_memory_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def lookup(self, question: str, model: str) -> Tuple[Optional[str], np.ndarray, int]:
+        """
+        Procura uma resposta em cache para uma pergunta semelhante.
+
+        Args:
+            question (str): A pergunta do usuário.
+            model (str): O modelo que geraria a resposta.
+
+        Returns:
+            Tuple[Optional[str], np.ndarray, int]: A resposta em cache (ou None se não houver
+            correspondência), o embedding calculado e a versão do corpus no momento da consulta;
+            os dois últimos devem ser repassados a store.
+        """
+        embedding = self._embed(normalize_question(question))
+        answer, corpus_version = self._lookup_embedding(model, embedding)
+        return answer, embedding, corpus_version
+
+    async def alookup(self, question: str, model: str) -> Tuple[Optional[str], np.ndarray, int]:
+        """Versão assíncrona de lookup."""
+        embedding = await self._aembed(normalize_question(question))
+        answer, corpus_version = self._lookup_embedding(model, embedding)
+        return answer, embedding, corpus_version
+
+    def store(self, question: str, model: str, answer: str, embedding: Optional[np.ndarray] = None,
+              corpus_version: Optional[int] = None) -> None:
+        """
+        Armazena a resposta gerada para uma pergunta.
+
+        Args:
+            question (str): A pergunta do usuário.
+            model (str): O modelo que gerou a resposta.
+            answer (str): A resposta gerada.
+            embedding (Optional[np.ndarray]): O embedding retornado por lookup, se disponível.
+            corpus_version (Optional[int]): A versão do corpus retornada por lookup. Se o corpus
+                mudou desde então, a resposta não é guardada.
+        """
+        normalized = normalize_question(question)
+        if embedding is None:
+            embedding = self._embed(normalized)
+        self._store_embedding(model, normalized, answer, embedding, corpus_version)
+
+    def stats(self) -> dict:
+        """
+        Retorna os contadores do cache.
+
+        Returns:
+            dict: Acertos, falhas, taxa de acerto, remoções e ocupação do cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "stale_stores": self.stale_stores,
+                "entries": len(self._entries),
+                "memory_bytes": self._memory_bytes,
+            }
+
+
+# Instância compartilhada do cache semântico.
+semantic_cache = SemanticCache(
+    embedding_function=None,
+    similarity_threshold=SEMANTIC_CACHE_CONFIG["similarity_threshold"],
+    ttl_seconds=SEMANTIC_CACHE_CONFIG["ttl_seconds"],
+    max_entries=SEMANTIC_CACHE_CONFIG["max_entries"],
+    max_memory_bytes=SEMANTIC_CACHE_CONFIG["max_memory_mb"] * 1024 * 1024,
+)
+
+
+def is_cacheable(chat_history: List, retrieval_overrides: bool = False) -> bool:
+    """
+    Indica se uma requisição pode usar o cache. Perguntas com histórico dependem do
+    contexto da conversa, e requisições com parâmetros de recuperação próprios (k, filtros)
+    podem ter outra resposta, então apenas perguntas sem histórico e sem esses parâmetros são cacheadas.
+
+    Args:
+        chat_history (List): O histórico de chat da sessão.
+        retrieval_overrides (bool): Se a requisição define parâmetros de recuperação.
+
+    Returns:
+        bool: True se o cache estiver habilitado e a requisição puder usá-lo.
+    """
+    return SEMANTIC_CACHE_CONFIG["enabled"] and not chat_history and not retrieval_overrides
@@ -0,0 +1,278 @@
+# mcp/rag/session_memory.py
+# Este arquivo implementa a memória das sessões de chat. As sessões recentes ficam em um cache
+# LRU em memória, e as novas interações são gravadas no application_logs em segundo plano, em
+# lotes, pelo chat_log_writer de db_utils. O histórico enviado ao modelo é limitado por um
+# orçamento de tokens por modelo: as interações mais antigas que saem da janela são condensadas
+# em um resumo acumulado, guardado na tabela session_summaries, de modo que o prompt mantém
+# aproximadamente o mesmo tamanho, por mais longa que seja a conversa.
+
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from mcp.config import MODEL_CONFIGS, SESSION_MEMORY_CONFIG
+from mcp.rag.db_utils import chat_log_writer, count_session_turns, get_session_turns, get_session_summary, \
+    save_session_summary
+from mcp.rag.langchain_utils import get_summary_chain
+from mcp.utils.helpers import estimate_tokens
+
+logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+@dataclass
+class SessionState:
+    """O estado de uma sessão em memória."""
+    summary: str  # Resumo acumulado das interações mais antigas.
+    summarized_turns: int  # Quantas interações, desde o início da sessão, o resumo cobre.
+    turns: List[Tuple[str, str]] = field(default_factory=list)  # Interações ainda não resumidas.
+    unflushed: int = 0  # Interações deste worker ainda não gravadas no SQLite.
+    summarizing: bool = False  # Se há uma atualização do resumo em andamento.
+
+    @property
+    def total_turns(self) -> int:
+        return self.summarized_turns + len(self.turns)
+
+
+def history_token_budget(model: Optional[str]) -> int:
+    """
+    Retorna o orçamento de tokens do histórico para um modelo. Sem modelo (roteamento
+    automático), usa o menor orçamento entre os modelos configurados.
+
+    Args:
+        model (Optional[str]): O nome do modelo.
+
+    Returns:
+        int: O número máximo de tokens do histórico (resumo incluído).
+    """
+    default = SESSION_MEMORY_CONFIG["history_token_budget"]
+    if model is not None:
+        return MODEL_CONFIGS.get(model, {}).get("history_token_budget", default)
+    return min((config.get("history_token_budget", default) for config in MODEL_CONFIGS.values()), default=default)
+
+
+class SessionMemory:
+    """
+    Cache LRU de sessões com gravação em segundo plano e resumo acumulado.
+
+    Args:
+        max_sessions (int): Sessões mantidas em memória.
+        validate_across_workers (bool): Se cada leitura confere se outro worker alterou a sessão.
+    """
+
+    def __init__(self, max_sessions: int, validate_across_workers: bool):
+        self.max_sessions = max_sessions
+        self.validate_across_workers = validate_across_workers
+
+        self._sessions: "OrderedDict[str, SessionState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-summary")
+
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.summaries = 0
+        chat_log_writer.add_listener(self._on_rows_written)
+
+    # ----------------------------------------------------------------- leitura
+
+    def _load(self, session_id: str) -> SessionState:
+        """Carrega do SQLite o resumo e as interações ainda não resumidas de uma sessão."""
+        summary, summarized_turns = get_session_summary(session_id)
+        return SessionState(summary=summary, summarized_turns=summarized_turns,
+                            turns=get_session_turns(session_id, summarized_turns))
+
+    def _evict(self) -> None:
+        """Remove as sessões menos usadas que não têm gravações ou resumos pendentes."""
+        for session_id in list(self._sessions):
+            if len(self._sessions) <= self.max_sessions:
+                return
+            state = self._sessions[session_id]
+            if not state.unflushed and not state.summarizing:
+                del self._sessions[session_id]
+
+    def _get_state(self, session_id: str) -> SessionState:
+        """Retorna o estado da sessão, carregando-o do SQLite se necessário. Bloqueante."""
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is not None:
+                self._sessions.move_to_end(session_id)
+
+        if state is not None and self.validate_across_workers:
+            # Interações gravadas por outro worker deixam a contagem no SQLite acima da local.
+            stored = count_session_turns(session_id)
+            with self._lock:
+                consistent = state.total_turns - state.unflushed <= stored <= state.total_turns
+            if not consistent:
+                logging.info(f"Sessão {session_id} alterada por outro worker. Recarregando o histórico.")
+                self.reloads += 1
+                loaded = self._load(session_id)
+                with self._lock:
+                    if state.unflushed:
+                        # Interações locais ainda na fila de gravação.
+                        loaded.turns.extend(state.turns[-state.unflushed:])
+                        loaded.unflushed = state.unflushed
+                    self._sessions[session_id] = loaded
+                return loaded
+
+        if state is not None:
+            self.hits += 1
+            return state
+
+        self.misses += 1
+        loaded = self._load(session_id)
+        with self._lock:
+            # Outra requisição da mesma sessão pode ter carregado o estado enquanto esperávamos.
+            state = self._sessions.setdefault(session_id, loaded)
+            self._sessions.move_to_end(session_id)
+            self._evict()
+        return state
+
+    def get_history(self, session_id: str, model: Optional[str] = None) -> List[dict]:
+        """
+        Retorna o histórico da sessão a ser enviado ao modelo: o resumo acumulado (se houver)
+        seguido das interações mais recentes que cabem no orçamento de tokens do modelo.
+        Interações que saem da janela são condensadas no resumo em segundo plano. O resumo vem
+        como a primeira mensagem, com role "system"; as cadeias de langchain_utils o movem para
+        a instrução de sistema do prompt (veja langchain_utils._fold_summary).
+
+        Args:
+            session_id (str): O ID da sessão.
+            model (Optional[str]): O modelo que receberá o histórico (None para o menor orçamento).
+
+        Returns:
+            List[dict]: Mensagens {"role": "system"|"human"|"ai", "content": ...}, em ordem cronológica.
+        """
+        state = self._get_state(session_id)
+        budget = history_token_budget(model)
+        with self._lock:
+            summary = state.summary
+            turns = list(state.turns)
+
+        remaining = budget - estimate_tokens(summary)
+        window = 0
+        for question, answer in reversed(turns):
+            cost = estimate_tokens(question) + estimate_tokens(answer)
+            # A interação mais recente é sempre mantida, mesmo que sozinha exceda o orçamento.
+            if window and cost > remaining:
+                break
+            remaining -= cost
+            window += 1
+
+        overflow = len(turns) - window
+        if overflow >= SESSION_MEMORY_CONFIG["summarize_min_turns"]:
+            self._schedule_summary(session_id, state, overflow)
+
+        messages = []
+        if summary:
+            messages.append({"role": "system", "content": f"Resumo da conversa até aqui: {summary}"})
+        for question, answer in turns[len(turns) - window:]:
+            messages.extend([
+                {"role": "human", "content": question},
+                {"role": "ai", "content": answer}
+            ])
+        return messages
+
+    async def aget_history(self, session_id: str, model: Optional[str] = None) -> List[dict]:
+        """Versão assíncrona de get_history (o carregamento usa o SQLite em uma thread)."""
+        return await asyncio.to_thread(self.get_history, session_id, model)
+
+    # ----------------------------------------------------------------- gravação
+
+    def append_turn(self, session_id: str, question: str, answer: str, model: str) -> None:
+        """
+        Registra uma interação: a sessão em memória é atualizada imediatamente e a gravação no
+        application_logs é feita em segundo plano. Não bloqueia.
+
+        Args:
+            session_id (str): O ID da sessão.
+            question (str): A pergunta do usuário.
+            answer (str): A resposta gerada.
+            model (str): O modelo usado.
+        """
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is not None:
+                state.turns.append((question, answer))
+                state.unflushed += 1
+        chat_log_writer.submit(session_id, question, answer, model)
+
+    def _on_rows_written(self, rows: List[tuple]) -> None:
+        """Chamada pelo chat_log_writer após gravar um lote: as interações deixam de estar pendentes."""
+        with self._lock:
+            for session_id, *_ in rows:
+                state = self._sessions.get(session_id)
+                if state is not None and state.unflushed:
+                    state.unflushed -= 1
+
+    def flush(self) -> None:
+        """Aguarda a gravação de todas as interações pendentes. Usada no desligamento da aplicação."""
+        chat_log_writer.flush()
+
+    # ----------------------------------------------------------------- resumo
+
+    def _schedule_summary(self, session_id: str, state: SessionState, count: int) -> None:
+        """Condensa no resumo, em segundo plano, as `count` interações mais antigas da sessão."""
+        with self._lock:
+            if state.summarizing:
+                return
+            state.summarizing = True
+            summary = state.summary
+            base = state.summarized_turns
+            folded = state.turns[:count]
+        self._summary_executor.submit(self._summarize, session_id, state, summary, base, folded)
+
+    def _summarize(self, session_id: str, state: SessionState, summary: str, base: int,
+                   folded: List[Tuple[str, str]]) -> None:
+        try:
+            messages = "\n".join(f"Usuário: {question}\nAssistente: {answer}" for question, answer in folded)
+            model = SESSION_MEMORY_CONFIG["summary_model"]
+            if model not in MODEL_CONFIGS:
+                # Modelo removido da configuração (ex.: descontinuado): usa o primeiro configurado.
+                model = next(iter(MODEL_CONFIGS))
+            new_summary = get_summary_chain(model).invoke({
+                "summary": summary or "(nenhum)",
+                "messages": messages,
+                "max_words": SESSION_MEMORY_CONFIG["summary_max_words"],
+            })
+            save_session_summary(session_id, new_summary, base + len(folded))
+            with self._lock:
+                if state.summarized_turns == base:
+                    state.summary = new_summary
+                    state.summarized_turns = base + len(folded)
+                    del state.turns[:len(folded)]
+            self.summaries += 1
+            logging.info(f"Resumo da sessão {session_id} atualizado com {len(folded)} interações "
+                         f"({base + len(folded)} resumidas no total).")
+        except Exception as e:
+            logging.error(f"Erro ao resumir a sessão {session_id}: {e}", exc_info=True)
+        finally:
+            with self._lock:
+                state.summarizing = False
+
+    def stats(self) -> dict:
+        """
+        Retorna os contadores da memória de sessões.
+
+        Returns:
+            dict: Sessões em memória, acertos, falhas, recargas, resumos e gravações pendentes.
+        """
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "summaries": self.summaries,
+                "pending_writes": chat_log_writer.stats()["pending"],
+            }
+
+
+# Instância compartilhada da memória de sessões.
+session_memory = SessionMemory(
+    max_sessions=SESSION_MEMORY_CONFIG["max_sessions"],
+    validate_across_workers=SESSION_MEMORY_CONFIG["validate_across_workers"],
+)
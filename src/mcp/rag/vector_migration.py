@@ -0,0 +1,124 @@
+# mcp/rag/vector_migration.py
+# Ferramenta de migração do Chroma (CHROMA_PATH) para o índice mmap (mcp/rag/mmap_store.py).
+# Copia os pedaços com os embeddings já calculados, sem chamar a API de embeddings, compacta o
+# índice no tipo de quantização escolhido e confere as contagens e o recall das buscas do novo
+# índice em relação à busca exata sobre os vetores originais. Depois da migração, basta mudar
+# VECTOR_STORE_CONFIG["backend"] para "mmap".
+#
+# Uso (no diretório da aplicação): PYTHONPATH=src python -m mcp.rag.vector_migration --quantization int8
+
+import time
+import logging
+import argparse
+
+import numpy as np
+
+from mcp.config import VECTOR_STORE_CONFIG
+from mcp.rag.chroma_utils import CHROMA_PATH
+from mcp.rag.mmap_store import MmapVectorStore, QUANTIZATIONS
+from mcp.rag.vector_store import ChromaVectorStore
+
+logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def open_chroma(path: str) -> ChromaVectorStore:
+    """Abre a coleção do Chroma sem modelo de embeddings (os vetores são lidos prontos)."""
+    from langchain_chroma import Chroma
+
+    return ChromaVectorStore(Chroma(persist_directory=path))
+
+
+def migrate(source: ChromaVectorStore, target: MmapVectorStore, batch_size: int = 1000) -> int:
+    """
+    Copia todos os pedaços do Chroma para o índice mmap e o compacta.
+
+    Args:
+        source (ChromaVectorStore): A coleção de origem.
+        target (MmapVectorStore): O índice de destino (pedaços com o mesmo ID são sobrescritos).
+        batch_size (int): Pedaços lidos e gravados por vez.
+
+    Returns:
+        int: O número de pedaços copiados.
+    """
+    copied, offset, started = 0, 0, time.perf_counter()
+    while True:
+        page = source.collection.get(include=["documents", "metadatas", "embeddings"], limit=batch_size,
+                                     offset=offset)
+        ids = page.get("ids", [])
+        if not ids:
+            break
+        target.upsert(ids, np.asarray(page["embeddings"], dtype=np.float32), page["documents"],
+                      [metadata or {} for metadata in page["metadatas"]])
+        copied += len(ids)
+        offset += len(ids)
+        print(f"{copied} pedaços copiados ({copied / (time.perf_counter() - started):.0f}/s)")
+    target.compact()
+    logging.info(f"Migração do Chroma para o índice mmap concluída: {copied} pedaços.")
+    return copied
+
+
+def verify(source: ChromaVectorStore, target: MmapVectorStore, queries: int = 100, k: int = 10, seed: int = 0,
+           batch_size: int = 1000) -> dict:
+    """
+    Compara os dois backends: a contagem de pedaços e o recall@k do índice mmap em relação à
+    busca exata (cosseno em float32) sobre os embeddings originais do Chroma, usando como
+    consultas embeddings de pedaços sorteados. Mede a perda da quantização.
+
+    Returns:
+        dict: As contagens e o recall médio.
+    """
+    source_count, target_count = source.count(), target.count()
+    if not source_count:
+        return {"chroma_chunks": 0, "mmap_chunks": target_count, "recall_at_k": None, "k": k}
+    rng = np.random.default_rng(seed)
+    offsets = rng.choice(source_count, size=min(queries, source_count), replace=False)
+    query_vectors = np.asarray([source.collection.get(include=["embeddings"], limit=1, offset=int(offset))
+                               ["embeddings"][0] for offset in offsets], dtype=np.float32)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True).clip(min=1e-12)
+
+    # Busca exata percorrendo o Chroma em páginas, mantendo os k melhores de cada consulta.
+    best_scores = np.full((len(query_vectors), 0), -np.inf, dtype=np.float32)
+    best_ids = np.empty((len(query_vectors), 0), dtype=object)
+    offset = 0
+    while True:
+        page = source.collection.get(include=["embeddings"], limit=batch_size, offset=offset)
+        if not page.get("ids"):
+            break
+        vectors = np.asarray(page["embeddings"], dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True).clip(min=1e-12)
+        scores = np.concatenate([best_scores, query_vectors @ vectors.T], axis=1)
+        ids = np.concatenate([best_ids, np.tile(np.asarray(page["ids"], dtype=object), (len(query_vectors), 1))],
+                             axis=1)
+        top = np.argsort(-scores, axis=1)[:, :k]
+        best_scores, best_ids = np.take_along_axis(scores, top, axis=1), np.take_along_axis(ids, top, axis=1)
+        offset += len(page["ids"])
+
+    found = target.search(query_vectors, k)
+    recall = float(np.mean([len(set(expected) & set(hits)) / max(len(expected), 1)
+                            for expected, hits in zip(best_ids.tolist(), found)]))
+    return {"chroma_chunks": source_count, "mmap_chunks": target_count, "recall_at_k": recall, "k": k}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra os pedaços do Chroma para o índice vetorial mmap.")
+    parser.add_argument("--source", default=CHROMA_PATH, help="Pasta do Chroma.")
+    parser.add_argument("--target", default=VECTOR_STORE_CONFIG["mmap_path"], help="Pasta do índice mmap.")
+    parser.add_argument("--quantization", default=VECTOR_STORE_CONFIG["quantization"], choices=QUANTIZATIONS)
+    parser.add_argument("--batch-size", type=int, default=1000, help="Pedaços copiados por vez.")
+    parser.add_argument("--verify-queries", type=int, default=100, help="Buscas usadas na verificação (0 desativa).")
+    args = parser.parse_args()
+
+    source = open_chroma(args.source)
+    # A compactação é feita uma única vez, no fim da cópia.
+    target = MmapVectorStore(args.target, quantization=args.quantization, compact_min_rows=2 ** 62,
+                             search_block_rows=VECTOR_STORE_CONFIG["search_block_rows"])
+    copied = migrate(source, target, args.batch_size)
+    print(f"Migração concluída: {copied} pedaços em {args.target} ({args.quantization}).")
+    if args.verify_queries:
+        report = verify(source, target, args.verify_queries)
+        print(f"Pedaços: Chroma {report['chroma_chunks']}, mmap {report['mmap_chunks']}; "
+              f"recall@{report['k']} em relação à busca exata: {report['recall_at_k']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# mcp/rag/vector_store.py
+# Este arquivo define a interface dos backends de armazenamento vetorial usados pela aplicação e
+# o backend padrão, sobre o Chroma. O backend em uso é escolhido por VECTOR_STORE_CONFIG["backend"]
+# (veja chroma_utils.get_vector_backend); a alternativa embutida, com matrizes NumPy mapeadas em
+# memória e compartilhadas entre os workers, está em mcp/rag/mmap_store.py.
+
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class VectorStore(ABC):
+    """
+    Armazenamento dos pedaços indexados: ID, texto, metadados (incluindo "file_id") e embedding.
+    As buscas são por similaridade de cosseno e podem ser restritas a um conjunto de file_ids.
+    """
+
+    # Nome do backend, usado nos logs e nas métricas.
+    name = "base"
+
+    @abstractmethod
+    def count(self) -> int:
+        """Retorna o número de pedaços armazenados."""
+
+    @abstractmethod
+    def upsert(self, ids: List[str], vectors: List[List[float]], documents: List[str],
+               metadatas: List[dict]) -> None:
+        """Grava (ou sobrescreve) pedaços com embeddings já calculados."""
+
+    @abstractmethod
+    def get(self, ids: List[str], include_embeddings: bool = False) -> Dict[str, list]:
+        """
+        Busca pedaços pelos IDs. IDs inexistentes são ignorados.
+
+        Returns:
+            Dict[str, list]: Listas paralelas "ids", "documents", "metadatas" e, se pedido, "embeddings".
+        """
+
+    @abstractmethod
+    def get_file_metadata(self, file_id: int) -> Dict[str, dict]:
+        """Retorna os metadados de todos os pedaços de um arquivo, por ID."""
+
+    @abstractmethod
+    def update_metadata(self, ids: List[str], metadatas: List[dict]) -> None:
+        """Substitui os metadados de pedaços existentes, sem alterar os embeddings."""
+
+    @abstractmethod
+    def delete(self, ids: List[str]) -> None:
+        """Exclui pedaços pelos IDs."""
+
+    @abstractmethod
+    def delete_file(self, file_id: int) -> int:
+        """Exclui todos os pedaços de um arquivo e retorna quantos foram excluídos."""
+
+    @abstractmethod
+    def search(self, query_vectors: np.ndarray, k: int, file_ids: Optional[Sequence[int]] = None) -> List[List[str]]:
+        """
+        Busca os k pedaços mais próximos de cada consulta.
+
+        Args:
+            query_vectors (np.ndarray): Uma consulta por linha.
+            k (int): Pedaços retornados por consulta.
+            file_ids (Optional[Sequence[int]]): Restringe a busca aos pedaços destes arquivos.
+
+        Returns:
+            List[List[str]]: Os IDs encontrados para cada consulta, do mais para o menos similar.
+        """
+
+    @abstractmethod
+    def iter_chunks(self, page_size: int) -> Iterator[Tuple[List[str], List[str], List[dict]]]:
+        """Percorre todos os pedaços em páginas de (IDs, textos, metadados)."""
+
+
+def file_id_filter(file_ids: Optional[Sequence[int]]) -> Optional[dict]:
+    """Monta o filtro "where" do Chroma para um conjunto de file_ids (None sem filtro)."""
+    if not file_ids:
+        return None
+    return {"file_id": file_ids[0]} if len(file_ids) == 1 else {"file_id": {"$in": list(file_ids)}}
+
+
+class ChromaVectorStore(VectorStore):
+    """
+    Backend sobre uma coleção do Chroma. Cada worker abre o próprio cliente do Chroma, com o
+    índice HNSW inteiro carregado na sua memória.
+
+    Args:
+        vectorstore (Chroma): O armazenamento vetorial do LangChain (veja chroma_utils.get_vectorstore).
+    """
+
+    name = "chroma"
+
+    def __init__(self, vectorstore):
+        self.vectorstore = vectorstore
+        self.collection = vectorstore._collection
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def upsert(self, ids: List[str], vectors: List[List[float]], documents: List[str],
+               metadatas: List[dict]) -> None:
+        self.collection.upsert(ids=ids, embeddings=vectors, documents=documents, metadatas=metadatas)
+
+    def get(self, ids: List[str], include_embeddings: bool = False) -> Dict[str, list]:
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        stored = self.collection.get(ids=ids, include=include)
+        result = {"ids": stored["ids"], "documents": stored["documents"], "metadatas": stored["metadatas"]}
+        if include_embeddings:
+            result["embeddings"] = stored["embeddings"]
+        return result
+
+    def get_file_metadata(self, file_id: int) -> Dict[str, dict]:
+        stored = self.collection.get(where={"file_id": file_id}, include=["metadatas"])
+        return dict(zip(stored.get("ids", []), stored.get("metadatas", [])))
+
+    def update_metadata(self, ids: List[str], metadatas: List[dict]) -> None:
+        self.collection.update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids: List[str]) -> None:
+        self.collection.delete(ids=ids)
+
+    def delete_file(self, file_id: int) -> int:
+        found = len(self.collection.get(where={"file_id": file_id}, include=[]).get("ids", []))
+        self.collection.delete(where={"file_id": file_id})
+        return found
+
+    def search(self, query_vectors: np.ndarray, k: int, file_ids: Optional[Sequence[int]] = None) -> List[List[str]]:
+        hits = self.collection.query(query_embeddings=np.asarray(query_vectors, dtype=np.float32).tolist(),
+                                     n_results=k, where=file_id_filter(file_ids), include=[])
+        return hits.get("ids") or [[] for _ in range(len(query_vectors))]
+
+    def iter_chunks(self, page_size: int) -> Iterator[Tuple[List[str], List[str], List[dict]]]:
+        offset = 0
+        while True:
+            page = self.collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            ids = page.get("ids", [])
+            if not ids:
+                return
+            yield ids, page["documents"], page["metadatas"]
+            offset += len(ids)
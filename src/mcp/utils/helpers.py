@@ -0,0 +1,38 @@
+# mcp/utils/helpers.py
+# Funções utilitárias compartilhadas pelos módulos do servidor.
+
+import hashlib
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estima rapidamente o número de tokens de um texto, sem chamar um tokenizador.
+    Usa a aproximação de ~4 caracteres por token, adequada para métricas e orçamentos.
+
+    Args:
+        text (str): O texto a ser medido.
+
+    Returns:
+        int: O número estimado de tokens (no mínimo 1 para textos não vazios).
+    """
+    if not text:
+        return 0
+    return max(1, len(text) // 4)
+
+
+def file_content_hash(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """
+    Calcula o hash SHA-256 do conteúdo de um arquivo, lendo-o em blocos.
+
+    Args:
+        file_path (str): O caminho do arquivo.
+        block_size (int): O tamanho de cada bloco lido.
+
+    Returns:
+        str: O hash hexadecimal do conteúdo.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,547 @@
+# mcp/utils/metrics.py
+# Este arquivo mantém métricas em memória do servidor, como o tempo até o primeiro
+# token (TTFT) e a vazão de tokens por segundo das respostas em streaming, por modelo,
+# e a saúde recente de cada modelo (latência e erros), usada pelo roteamento.
+#
+# Também mantém histogramas da duração de cada etapa dos pipelines de chat e de ingestão,
+# os tokens e o custo por modelo, e exporta tudo no formato de texto do Prometheus
+# (veja render_prometheus e o endpoint /metrics).
+
+import time
+import bisect
+import logging
+import threading
+import contextvars
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from mcp.config import MODEL_CONFIGS, PROFILING_CONFIG
+from mcp.utils.profiling import start_sampled_profile, finish_profile
+
+logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+T = TypeVar("T")
+
+# Quantidade de amostras recentes mantidas por modelo para o cálculo de percentis.
+MAX_SAMPLES = 1000
+
+
+def _percentile(samples, percentile: float) -> float:
+    """
+    Calcula o percentil de uma coleção de amostras (método do vizinho mais próximo).
+
+    Args:
+        samples: As amostras.
+        percentile (float): O percentil desejado, entre 0 e 100.
+
+    Returns:
+        float: O valor do percentil, ou 0.0 se não houver amostras.
+    """
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class StreamingStats:
+    """Estatísticas de streaming de um modelo: TTFT e tokens por segundo."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_tokens = 0
+        self.ttft_samples: Deque[float] = deque(maxlen=MAX_SAMPLES)
+        self.tokens_per_sec_samples: Deque[float] = deque(maxlen=MAX_SAMPLES)
+
+    def to_dict(self) -> dict:
+        return {
+            "streams": self.count,
+            "total_tokens": self.total_tokens,
+            "ttft_p50_ms": _percentile(self.ttft_samples, 50) * 1000,
+            "ttft_p95_ms": _percentile(self.ttft_samples, 95) * 1000,
+            "tokens_per_sec_p50": _percentile(self.tokens_per_sec_samples, 50),
+        }
+
+
+_streaming_stats: Dict[str, StreamingStats] = {}
+_lock = threading.Lock()
+
+
+def record_stream_metrics(model: str, ttft: float, tokens: int, generation_time: float) -> None:
+    """
+    Registra as métricas de uma resposta em streaming.
+
+    Args:
+        model (str): O nome do modelo usado.
+        ttft (float): Tempo, em segundos, entre o início da requisição e o primeiro token.
+        tokens (int): Número (estimado) de tokens gerados.
+        generation_time (float): Tempo, em segundos, entre o primeiro e o último token.
+    """
+    with _lock:
+        stats = _streaming_stats.setdefault(model, StreamingStats())
+        stats.count += 1
+        stats.total_tokens += tokens
+        stats.ttft_samples.append(ttft)
+        if generation_time > 0:
+            stats.tokens_per_sec_samples.append(tokens / generation_time)
+
+
+def get_stream_metrics() -> Dict[str, dict]:
+    """
+    Retorna um resumo das métricas de streaming de cada modelo.
+
+    Returns:
+        Dict[str, dict]: Métricas por nome de modelo.
+    """
+    with _lock:
+        return {model: stats.to_dict() for model, stats in _streaming_stats.items()}
+
+
+class ModelCallStats:
+    """Resultados recentes das chamadas a um modelo: latência, erros e limite de taxa."""
+
+    def __init__(self, window: int):
+        self.calls = 0
+        self.errors = 0
+        self.latency_samples: Deque[float] = deque(maxlen=window)
+        self.outcomes: Deque[bool] = deque(maxlen=window)  # True para chamadas bem-sucedidas.
+        self.cooldown_until = 0.0  # Até quando o modelo fica fora do roteamento após um limite de taxa.
+
+    def to_dict(self) -> dict:
+        recent = len(self.outcomes)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "samples": recent,
+            "latency_p50_ms": _percentile(self.latency_samples, 50) * 1000,
+            "latency_p95_ms": _percentile(self.latency_samples, 95) * 1000,
+            "error_rate": (recent - sum(self.outcomes)) / recent if recent else 0.0,
+            "cooldown_remaining_s": max(0.0, self.cooldown_until - time.time()),
+        }
+
+
+_model_call_stats: Dict[str, ModelCallStats] = {}
+
+# Chamadas recentes consideradas por modelo na saúde usada pelo roteamento.
+MODEL_HEALTH_WINDOW = 200
+
+
+def record_model_call(model: str, latency: float, ok: bool, cooldown_seconds: Optional[float] = None) -> None:
+    """
+    Registra o resultado de uma chamada a um modelo.
+
+    Args:
+        model (str): O nome do modelo.
+        latency (float): A duração da chamada, em segundos.
+        ok (bool): Se a chamada foi bem-sucedida.
+        cooldown_seconds (Optional[float]): Se informado, o modelo fica fora do roteamento por
+            esse tempo (ex.: após um erro de limite de taxa).
+    """
+    with _lock:
+        stats = _model_call_stats.setdefault(model, ModelCallStats(MODEL_HEALTH_WINDOW))
+        stats.calls += 1
+        stats.outcomes.append(ok)
+        if ok:
+            stats.latency_samples.append(latency)
+        else:
+            stats.errors += 1
+        if cooldown_seconds:
+            stats.cooldown_until = max(stats.cooldown_until, time.time() + cooldown_seconds)
+
+
+def get_model_health(model: str) -> dict:
+    """
+    Retorna a saúde recente de um modelo.
+
+    Args:
+        model (str): O nome do modelo.
+
+    Returns:
+        dict: Chamadas, erros, amostras recentes, latência p50/p95 (ms), taxa de erro e o tempo
+        restante de espera após um limite de taxa.
+    """
+    with _lock:
+        stats = _model_call_stats.get(model)
+        return stats.to_dict() if stats else ModelCallStats(MODEL_HEALTH_WINDOW).to_dict()
+
+
+def get_model_metrics() -> Dict[str, dict]:
+    """
+    Retorna a saúde recente de todos os modelos já chamados.
+
+    Returns:
+        Dict[str, dict]: Métricas por nome de modelo.
+    """
+    with _lock:
+        return {model: stats.to_dict() for model, stats in _model_call_stats.items()}
+
+
+# ----------------------------------------------------------------- duração das etapas
+
+# Limites superiores, em segundos, dos buckets dos histogramas de duração das etapas.
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Histogram:
+    """Histograma de durações com buckets fixos, no modelo dos histogramas do Prometheus."""
+
+    def __init__(self, buckets: Tuple[float, ...] = STAGE_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)  # Contagem por bucket (não cumulativa).
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            self.bucket_counts[index] += 1
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """Pares (limite superior, contagem acumulada), sem o bucket +Inf."""
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets, self.bucket_counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def quantile(self, q: float) -> float:
+        """Estimativa do quantil: o limite superior do bucket que o contém."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        for bound, total in self.cumulative():
+            if total >= target:
+                return bound
+        return float("inf")
+
+
+_stage_histograms: Dict[Tuple[str, str], Histogram] = {}
+
+# Etapas registradas na requisição em andamento (veja request_trace).
+_current_trace: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("current_trace",
+                                                                                            default=None)
+# Pipeline da requisição em andamento (veja request_trace e current_pipeline).
+_current_pipeline: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_pipeline", default=None)
+
+
+def current_pipeline(default: str) -> str:
+    """
+    Retorna o pipeline da requisição em andamento, para que etapas compartilhadas entre os
+    endpoints (ex.: o empacotamento do contexto e as etapas das cadeias) sejam registradas no
+    pipeline de quem as chamou ("chat", "chat_stream", "chat_batch").
+
+    Args:
+        default (str): O pipeline usado fora de um request_trace.
+
+    Returns:
+        str: O pipeline.
+    """
+    return _current_pipeline.get() or default
+
+
+def record_stage(pipeline: str, stage: str, seconds: float) -> None:
+    """
+    Registra a duração de uma etapa de um pipeline (ex.: "chat"/"retrieval", "ingestion"/"embed").
+    Dentro de um request_trace, a duração também entra no detalhamento da requisição.
+
+    Args:
+        pipeline (str): O pipeline.
+        stage (str): A etapa.
+        seconds (float): A duração, em segundos.
+    """
+    with _lock:
+        _stage_histograms.setdefault((pipeline, stage), Histogram()).observe(seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace[stage] = trace.get(stage, 0.0) + seconds
+
+
+class stage_timer:
+    """
+    Mede a duração de um bloco e a registra com record_stage.
+
+    Exemplo:
+        with stage_timer("chat", "history"):
+            chat_history = await session_memory.aget_history(session_id)
+    """
+
+    def __init__(self, pipeline: str, stage: str):
+        self.pipeline = pipeline
+        self.stage = stage
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record_stage(self.pipeline, self.stage, time.perf_counter() - self._start)
+        return False
+
+
+def timed_iter(iterable: Iterable[T], pipeline: str, stage: str) -> Iterator[T]:
+    """
+    Percorre um iterável registrando, como uma etapa, o tempo de espera por cada item
+    (ex.: a leitura e a divisão dos documentos, que produzem os lotes de pedaços).
+
+    Args:
+        iterable (Iterable[T]): O iterável.
+        pipeline (str): O pipeline.
+        stage (str): A etapa.
+
+    Returns:
+        Iterator[T]: Os mesmos itens.
+    """
+    iterator = iter(iterable)
+    while True:
+        start_time = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            record_stage(pipeline, stage, time.perf_counter() - start_time)
+            return
+        record_stage(pipeline, stage, time.perf_counter() - start_time)
+        yield item
+
+
+class request_trace:
+    """
+    Acompanha uma requisição: registra a duração total como a etapa "total" do pipeline,
+    reúne as etapas registradas durante a requisição e, se ela passar de
+    PROFILING_CONFIG["slow_request_seconds"], registra o detalhamento no log. As etapas
+    compartilhadas registradas durante a requisição usam o seu pipeline (veja current_pipeline).
+    Uma fração das requisições (PROFILING_CONFIG["sample_rate"]) é perfilada com cProfile, e o
+    perfil é guardado apenas se a requisição for lenta. O cProfile mede a thread do event loop
+    inteira: o perfil inclui as outras requisições atendidas ao mesmo tempo.
+
+    Args:
+        pipeline (str): O pipeline da requisição (ex.: "chat").
+        description (str): Identificação da requisição no log (ex.: o ID da sessão).
+    """
+
+    def __init__(self, pipeline: str, description: str = ""):
+        self.pipeline = pipeline
+        self.description = description
+        self.stages: Dict[str, float] = {}
+
+    def __enter__(self):
+        self._token = _current_trace.set(self.stages)
+        self._pipeline_token = _current_pipeline.set(self.pipeline)
+        self._profile = start_sampled_profile()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start
+        try:
+            _current_pipeline.reset(self._pipeline_token)
+            _current_trace.reset(self._token)
+        except ValueError:
+            # Encerrado em outro contexto (ex.: um streaming fechado pelo cliente).
+            pass
+        record_stage(self.pipeline, "total", elapsed)
+        slow = elapsed >= PROFILING_CONFIG["slow_request_seconds"]
+        if slow:
+            breakdown = ", ".join(f"{stage} {seconds * 1000:.0f} ms" for stage, seconds in self.stages.items())
+            logging.warning(f"Requisição lenta ({self.pipeline} {self.description}): {elapsed:.2f} s. "
+                            f"Etapas: {breakdown or 'nenhuma registrada'}.")
+        finish_profile(self._profile, keep=slow, label=f"{self.pipeline}-{self.description}")
+        return False
+
+
+def get_stage_metrics() -> Dict[str, Dict[str, dict]]:
+    """
+    Retorna um resumo da duração das etapas de cada pipeline.
+
+    Returns:
+        Dict[str, Dict[str, dict]]: Por pipeline e etapa: contagem, soma (s) e p50/p95/p99
+        estimados pelos buckets (ms).
+    """
+    with _lock:
+        summary: Dict[str, Dict[str, dict]] = {}
+        for (pipeline, stage), histogram in _stage_histograms.items():
+            summary.setdefault(pipeline, {})[stage] = {
+                "count": histogram.count,
+                "sum_s": histogram.sum,
+                "p50_ms": histogram.quantile(0.50) * 1000,
+                "p95_ms": histogram.quantile(0.95) * 1000,
+                "p99_ms": histogram.quantile(0.99) * 1000,
+            }
+        return summary
+
+
+# ----------------------------------------------------------------- tokens e custo
+
+class TokenUsage:
+    """Tokens e custo acumulados das chamadas a um modelo."""
+
+    def __init__(self):
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+
+    def to_dict(self) -> dict:
+        return {"calls": self.calls, "input_tokens": self.input_tokens, "output_tokens": self.output_tokens,
+                "cost": self.cost}
+
+
+_token_usage: Dict[Tuple[str, str], TokenUsage] = {}
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    """
+    Calcula o custo de uma chamada pelos preços "cost_per_token_*" do modelo em MODEL_CONFIGS.
+
+    Args:
+        model (str): O nome do modelo.
+        input_tokens (int): Tokens de entrada.
+        output_tokens (int): Tokens de saída.
+
+    Returns:
+        float: O custo (0.0 para modelos sem preço configurado).
+    """
+    model_config = MODEL_CONFIGS.get(model, {})
+    return (input_tokens * model_config.get("cost_per_token_input", 0.0)
+            + output_tokens * model_config.get("cost_per_token_output", 0.0))
+
+
+def record_token_usage(model: str, input_tokens: int, output_tokens: int, pipeline: str = "chat") -> None:
+    """
+    Registra os tokens de uma chamada a um modelo e o custo correspondente.
+
+    Args:
+        model (str): O nome do modelo.
+        input_tokens (int): Tokens de entrada.
+        output_tokens (int): Tokens de saída.
+        pipeline (str): O pipeline que fez a chamada (ex.: "chat", "session_summary").
+    """
+    with _lock:
+        usage = _token_usage.setdefault((pipeline, model), TokenUsage())
+        usage.calls += 1
+        usage.input_tokens += input_tokens
+        usage.output_tokens += output_tokens
+        usage.cost += estimate_cost(model, input_tokens, output_tokens)
+
+
+def get_usage_metrics() -> Dict[str, Dict[str, dict]]:
+    """
+    Retorna os tokens e o custo acumulados.
+
+    Returns:
+        Dict[str, Dict[str, dict]]: Por pipeline e modelo: chamadas, tokens de entrada e de saída e custo.
+    """
+    with _lock:
+        summary: Dict[str, Dict[str, dict]] = {}
+        for (pipeline, model), usage in _token_usage.items():
+            summary.setdefault(pipeline, {})[model] = usage.to_dict()
+        return summary
+
+
+# ----------------------------------------------------------------- exportação (Prometheus)
+
+# Fontes de métricas de outros módulos (cache semântico, sessões, ...), lidas a cada exportação.
+_gauge_sources: Dict[str, Callable[[], dict]] = {}
+
+
+def register_gauge_source(name: str, source: Callable[[], dict]) -> None:
+    """
+    Registra uma função cujos valores numéricos são exportados como gauges "mcp_<name>_<chave>".
+
+    Args:
+        name (str): O prefixo das métricas (ex.: "semantic_cache").
+        source (Callable[[], dict]): Retorna os valores atuais (ex.: SemanticCache.stats).
+    """
+    _gauge_sources[name] = source
+
+
+def _escape(value) -> str:
+    """Escapa um valor de rótulo: barra invertida, aspas e quebras de linha."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_bound(bound: float) -> str:
+    return repr(float(bound))
+
+
+def render_prometheus() -> str:
+    """
+    Exporta as métricas no formato de texto do Prometheus (versão 0.0.4).
+
+    Returns:
+        str: As métricas, uma por linha.
+    """
+    lines = []
+    with _lock:
+        histograms = [(key, histogram.cumulative(), histogram.count, histogram.sum)
+                      for key, histogram in sorted(_stage_histograms.items())]
+        usage = [(key, value.to_dict()) for key, value in sorted(_token_usage.items())]
+        calls = {model: (stats.calls, stats.errors, _percentile(stats.latency_samples, 50),
+                         _percentile(stats.latency_samples, 95)) for model, stats in _model_call_stats.items()}
+        streams = {model: (stats.count, _percentile(stats.ttft_samples, 50), _percentile(stats.ttft_samples, 95))
+                   for model, stats in _streaming_stats.items()}
+
+    lines.append("# HELP mcp_stage_duration_seconds Duração das etapas dos pipelines de chat e de ingestão.")
+    lines.append("# TYPE mcp_stage_duration_seconds histogram")
+    for (pipeline, stage), buckets, count, total in histograms:
+        for bound, cumulative in buckets:
+            lines.append(f"mcp_stage_duration_seconds_bucket"
+                         f"{_labels(pipeline=pipeline, stage=stage, le=_format_bound(bound))} {cumulative}")
+        lines.append(f"mcp_stage_duration_seconds_bucket{_labels(pipeline=pipeline, stage=stage, le='+Inf')} {count}")
+        lines.append(f"mcp_stage_duration_seconds_sum{_labels(pipeline=pipeline, stage=stage)} {total}")
+        lines.append(f"mcp_stage_duration_seconds_count{_labels(pipeline=pipeline, stage=stage)} {count}")
+
+    lines.append("# HELP mcp_model_tokens_total Tokens enviados e recebidos, por modelo.")
+    lines.append("# TYPE mcp_model_tokens_total counter")
+    for (pipeline, model), values in usage:
+        lines.append(f"mcp_model_tokens_total{_labels(pipeline=pipeline, model=model, direction='input')} "
+                     f"{values['input_tokens']}")
+        lines.append(f"mcp_model_tokens_total{_labels(pipeline=pipeline, model=model, direction='output')} "
+                     f"{values['output_tokens']}")
+    lines.append("# HELP mcp_model_cost_total Custo acumulado das chamadas, pelos preços de MODEL_CONFIGS.")
+    lines.append("# TYPE mcp_model_cost_total counter")
+    for (pipeline, model), values in usage:
+        lines.append(f"mcp_model_cost_total{_labels(pipeline=pipeline, model=model)} {values['cost']}")
+
+    lines.append("# HELP mcp_model_calls_total Chamadas aos modelos feitas pelo roteamento.")
+    lines.append("# TYPE mcp_model_calls_total counter")
+    for model, (total_calls, _, _, _) in sorted(calls.items()):
+        lines.append(f"mcp_model_calls_total{_labels(model=model)} {total_calls}")
+    lines.append("# TYPE mcp_model_errors_total counter")
+    for model, (_, errors, _, _) in sorted(calls.items()):
+        lines.append(f"mcp_model_errors_total{_labels(model=model)} {errors}")
+    lines.append("# HELP mcp_model_latency_seconds Latência recente das chamadas bem-sucedidas.")
+    lines.append("# TYPE mcp_model_latency_seconds gauge")
+    for model, (_, _, p50, p95) in sorted(calls.items()):
+        lines.append(f"mcp_model_latency_seconds{_labels(model=model, quantile='0.5')} {p50}")
+        lines.append(f"mcp_model_latency_seconds{_labels(model=model, quantile='0.95')} {p95}")
+
+    lines.append("# HELP mcp_stream_ttft_seconds Tempo recente até o primeiro token nas respostas em streaming.")
+    lines.append("# TYPE mcp_stream_ttft_seconds gauge")
+    for model, (_, p50, p95) in sorted(streams.items()):
+        lines.append(f"mcp_stream_ttft_seconds{_labels(model=model, quantile='0.5')} {p50}")
+        lines.append(f"mcp_stream_ttft_seconds{_labels(model=model, quantile='0.95')} {p95}")
+
+    lines.append("# HELP mcp_profiling_sample_rate Fração das requisições perfiladas com cProfile (0 se desativado). "
+                 "O perfil cobre a thread do event loop inteira, incluindo as requisições concorrentes.")
+    lines.append("# TYPE mcp_profiling_sample_rate gauge")
+    lines.append(f"mcp_profiling_sample_rate {PROFILING_CONFIG['sample_rate'] if PROFILING_CONFIG['enabled'] else 0}")
+
+    for name, source in sorted(_gauge_sources.items()):
+        try:
+            values = source()
+        except Exception as e:
+            logging.error(f"Erro ao ler as métricas de {name}: {e}", exc_info=True)
+            continue
+        for key, value in values.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f"# TYPE mcp_{name}_{key} gauge")
+                lines.append(f"mcp_{name}_{key} {value}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,84 @@
+# mcp/utils/profiling.py
+# Este arquivo implementa o perfilamento amostrado das requisições lentas. Uma fração das
+# requisições (PROFILING_CONFIG["sample_rate"]) é executada sob o cProfile; se a requisição
+# passar do limite de lentidão, o perfil é gravado em PROFILING_CONFIG["output_dir"] (formato
+# pstats, para snakeviz ou python -m pstats) e as funções mais custosas vão para o log.
+#
+# O cProfile mede a thread do event loop inteira, então o perfil inclui as outras requisições
+# atendidas ao mesmo tempo. Apenas uma requisição é perfilada por vez em cada worker.
+
+import os
+import io
+import time
+import uuid
+import random
+import pstats
+import cProfile
+import logging
+import threading
+from typing import Optional
+
+from mcp.config import PROFILING_CONFIG
+
+logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Garante um único perfil ativo por processo (o interpretador aceita apenas um profiler por thread).
+_profile_lock = threading.Lock()
+
+
+def start_sampled_profile() -> Optional[cProfile.Profile]:
+    """
+    Sorteia se a requisição atual será perfilada e, se sim, inicia o cProfile.
+
+    Returns:
+        Optional[cProfile.Profile]: O perfil em andamento, ou None se a requisição não foi
+        sorteada, se o perfilamento está desativado ou se outro perfil já está ativo.
+    """
+    if not PROFILING_CONFIG["enabled"] or random.random() >= PROFILING_CONFIG["sample_rate"]:
+        return None
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Outro profiler (ex.: um depurador) já está ativo nesta thread.
+        _profile_lock.release()
+        return None
+    return profile
+
+
+def finish_profile(profile: Optional[cProfile.Profile], keep: bool, label: str) -> Optional[str]:
+    """
+    Encerra um perfil iniciado por start_sampled_profile, gravando-o se a requisição foi lenta.
+
+    Args:
+        profile (Optional[cProfile.Profile]): O perfil (None não faz nada).
+        keep (bool): Se o perfil deve ser gravado.
+        label (str): Identificação da requisição, usada no nome do arquivo.
+
+    Returns:
+        Optional[str]: O caminho do arquivo gravado, ou None.
+    """
+    if profile is None:
+        return None
+    try:
+        profile.disable()
+        if not keep:
+            return None
+        output_dir = PROFILING_CONFIG["output_dir"]
+        os.makedirs(output_dir, exist_ok=True)
+        safe_label = "".join(char if char.isalnum() or char in "-_" else "_" for char in label)[:80]
+        # O sufixo aleatório separa requisições da mesma sessão gravadas no mesmo segundo.
+        file_name = f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_label}-{uuid.uuid4().hex[:8]}.prof"
+        path = os.path.join(output_dir, file_name)
+        profile.dump_stats(path)
+        summary = io.StringIO()
+        pstats.Stats(profile, stream=summary).sort_stats("cumulative").print_stats(PROFILING_CONFIG["top_functions"])
+        logging.warning(f"Perfil da requisição lenta {label} gravado em {path}:\n{summary.getvalue()}")
+        return path
+    except Exception as e:
+        logging.error(f"Erro ao gravar o perfil da requisição {label}: {e}", exc_info=True)
+        return None
+    finally:
+        _profile_lock.release()
@@ -0,0 +1,187 @@
+# mcp/utils/startup.py
+# Este arquivo acompanha a inicialização de cada worker: o tempo de importação da aplicação e o
+# aquecimento dos componentes (banco de dados, Chroma, clientes dos modelos, índice BM25),
+# executado em segundo plano depois que o processo sobe. Etapas obrigatórias que falharam são
+# tentadas novamente pela verificação de readiness. O estado alimenta os endpoints de liveness e readiness
+# (veja main.py) e fica registrado no log, para acompanhar regressões no tempo de subida.
+
+import time
+import asyncio
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Set
+
+from mcp.config import STARTUP_CONFIG
+
+logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Status possíveis de uma etapa do aquecimento.
+STATUS_PENDING = "pending"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+
+
+class StartupState:
+    """
+    Estado da inicialização de um worker.
+
+    Args:
+        required_components (List[str]): Etapas que precisam concluir com sucesso para o
+            worker ser considerado pronto.
+    """
+
+    def __init__(self, required_components: List[str]):
+        self.required_components = list(required_components)
+        self.import_seconds: Optional[float] = None
+        self.started_at = time.time()
+        self.warm_up_seconds: Optional[float] = None
+        self.warm_up_done = False
+        self._components: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        # Etapas e tempo máximo do aquecimento, guardados para a nova tentativa (veja retry_failed).
+        self._warm_functions: Dict[str, Callable[[], None]] = {}
+        self._timeout = 120.0
+        self._retry_task: Optional[asyncio.Task] = None
+        self._last_retry = 0.0
+        # Etapas cuja thread ainda está executando. O tempo máximo (wait_for) não interrompe a
+        # thread, então uma etapa que estourou o tempo só é tentada de novo quando ela termina.
+        self._running: Set[str] = set()
+
+    def record_import_time(self, seconds: float) -> None:
+        """
+        Registra o tempo de importação dos módulos da aplicação.
+
+        Args:
+            seconds (float): O tempo, em segundos.
+        """
+        self.import_seconds = seconds
+        logging.info(f"Inicialização: módulos da aplicação importados em {seconds:.3f} s.")
+
+    def _set(self, name: str, **fields) -> None:
+        with self._lock:
+            self._components.setdefault(name, {"status": STATUS_PENDING, "seconds": None, "error": None})
+            self._components[name].update(fields)
+
+    def _run_in_thread(self, name: str, warm: Callable[[], None]) -> None:
+        try:
+            warm()
+        finally:
+            with self._lock:
+                self._running.discard(name)
+
+    async def _run_component(self, name: str, warm: Callable[[], None], timeout: float) -> None:
+        with self._lock:
+            if name in self._running:
+                logging.info(f"Inicialização: {name} ainda está sendo aquecido; nova tentativa adiada.")
+                return
+            self._running.add(name)
+        start_time = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.to_thread(self._run_in_thread, name, warm), timeout=timeout)
+        except Exception as e:
+            seconds = time.perf_counter() - start_time
+            error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+            self._set(name, status=STATUS_FAILED, seconds=seconds, error=error)
+            logging.error(f"Inicialização: falha ao aquecer {name} após {seconds:.3f} s: {error}", exc_info=True)
+            return
+        seconds = time.perf_counter() - start_time
+        self._set(name, status=STATUS_READY, seconds=seconds)
+        logging.info(f"Inicialização: {name} pronto em {seconds:.3f} s.")
+
+    async def warm_up(self, components: Dict[str, Callable[[], None]], parallel: bool = True,
+                      timeout: float = 120) -> None:
+        """
+        Aquece os componentes, cada um em uma thread, registrando a duração e o resultado de cada
+        etapa. Uma etapa que falha não interrompe as demais: o componente é criado no primeiro uso.
+
+        Args:
+            components (Dict[str, Callable[[], None]]): As etapas, por nome, na ordem de execução.
+            parallel (bool): Se as etapas são executadas em paralelo.
+            timeout (float): O tempo máximo de cada etapa, em segundos.
+        """
+        self._warm_functions = dict(components)
+        self._timeout = timeout
+        for name in components:
+            self._set(name, status=STATUS_PENDING)
+        start_time = time.perf_counter()
+        if parallel:
+            await asyncio.gather(*(self._run_component(name, warm, timeout) for name, warm in components.items()))
+        else:
+            for name, warm in components.items():
+                await self._run_component(name, warm, timeout)
+        self.warm_up_seconds = time.perf_counter() - start_time
+        self.warm_up_done = True
+        logging.info(f"Inicialização: aquecimento concluído em {self.warm_up_seconds:.3f} s "
+                     f"({'paralelo' if parallel else 'sequencial'}); pronto={self.is_ready()}.")
+
+    def retry_failed(self, min_interval: float) -> bool:
+        """
+        Tenta aquecer novamente, em segundo plano, as etapas obrigatórias que falharam (ex.: o
+        banco de dados estava indisponível na subida), para que o worker possa ficar pronto sem
+        ser reiniciado. Chamada pela verificação de readiness; não faz nada se o aquecimento
+        ainda não terminou, se outra tentativa está em andamento ou se a última foi há menos de
+        min_interval segundos. Uma etapa que estourou o tempo só é tentada de novo depois que a
+        sua thread termina.
+
+        Args:
+            min_interval (float): O intervalo mínimo entre as tentativas, em segundos.
+
+        Returns:
+            bool: True se uma nova tentativa foi iniciada.
+        """
+        if not self.warm_up_done or (self._retry_task is not None and not self._retry_task.done()):
+            return False
+        if time.monotonic() - self._last_retry < min_interval:
+            return False
+        with self._lock:
+            failed = [name for name in self.required_components
+                      if self._components.get(name, {}).get("status") == STATUS_FAILED
+                      and name in self._warm_functions and name not in self._running]
+        if not failed:
+            return False
+        self._last_retry = time.monotonic()
+        logging.info(f"Inicialização: nova tentativa de aquecer {', '.join(failed)}.")
+        self._retry_task = asyncio.ensure_future(asyncio.gather(
+            *(self._run_component(name, self._warm_functions[name], self._timeout) for name in failed)))
+        return True
+
+    def mark_ready(self) -> None:
+        """Marca a inicialização como concluída sem aquecimento (componentes criados no primeiro uso)."""
+        self.warm_up_seconds = 0.0
+        self.warm_up_done = True
+
+    def is_ready(self) -> bool:
+        """
+        Indica se o worker pode receber tráfego: o aquecimento terminou e as etapas obrigatórias
+        que foram executadas concluíram com sucesso.
+
+        Returns:
+            bool: True se o worker estiver pronto.
+        """
+        if not self.warm_up_done:
+            return False
+        with self._lock:
+            return all(self._components[name]["status"] == STATUS_READY
+                       for name in self.required_components if name in self._components)
+
+    def report(self) -> dict:
+        """
+        Retorna o estado da inicialização.
+
+        Returns:
+            dict: Se o worker está pronto, os tempos de importação e de aquecimento e o status,
+            a duração e o erro de cada etapa.
+        """
+        with self._lock:
+            components = {name: dict(component) for name, component in self._components.items()}
+        return {
+            "ready": self.is_ready(),
+            "uptime_s": time.time() - self.started_at,
+            "import_s": self.import_seconds,
+            "warm_up_s": self.warm_up_seconds,
+            "components": components,
+        }
+
+
+# Estado compartilhado da inicialização deste worker.
+startup_state = StartupState(required_components=STARTUP_CONFIG["required_components"])
@@ -0,0 +1,93 @@
+# test_benchmark_fakes.py
+# Teste rápido dos substitutos locais usados pelos benchmarks (benchmarks/fakes.py e
+# benchmarks/fake_server.py): os modelos falsos carregam e respondem, e a aplicação completa sobe
+# com eles e atende uma pergunta em /chat, sem rede e sem credentials.json.
+# Execute com: python -m pytest test_benchmark_fakes.py
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import subprocess
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fakes import FakeChatModel, FakeEmbeddings  # noqa: E402
+
+# Tempo máximo até a aplicação falsa ficar pronta (importação e aquecimento).
+_STARTUP_TIMEOUT_SECONDS = 90
+
+
+def test_fake_embeddings_are_deterministic_and_normalized():
+    embeddings = FakeEmbeddings(dimensions=64)
+    first, second, other = embeddings.embed_documents(["bomba hidráulica de óleo", "bomba hidráulica",
+                                                       "relatório financeiro anual"])
+
+    assert embeddings.embed_query("bomba hidráulica de óleo") == first
+    assert abs(np.linalg.norm(first) - 1.0) < 1e-5
+    assert np.dot(first, second) > np.dot(first, other)
+
+
+def test_fake_chat_model_answers_and_streams():
+    model = FakeChatModel(latency=0.0, response_tokens=5)
+
+    answer = model.invoke("Qual é a capital da França?").content
+    assert len(answer.split()) == 5
+    assert model.invoke("Qual é a capital da França?").content == answer
+
+    async def stream():
+        return "".join([chunk.content async for chunk in model.astream("Qual é a capital da França?")])
+
+    assert asyncio.run(stream()).strip() == answer
+
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def _request(url: str, payload: dict = None):
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.status, json.loads(response.read())
+
+
+def test_fake_server_answers_a_chat_request(tmp_path):
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, "benchmarks", "fake_server.py"),
+                               "--workdir", str(tmp_path), "--port", str(port), "--chat-latency", "0",
+                               "--token-latency", "0", "--embedding-latency", "0",
+                               "--embedding-latency-per-text", "0"],
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    try:
+        deadline = time.monotonic() + _STARTUP_TIMEOUT_SECONDS
+        while True:
+            assert server.poll() is None, server.stdout.read().decode(errors="replace")
+            try:
+                if _request(f"{base_url}/health/ready")[0] == 200:
+                    break
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            assert time.monotonic() < deadline, "A aplicação falsa não ficou pronta a tempo."
+            time.sleep(0.2)
+
+        status, body = _request(f"{base_url}/api/v1/chat", {"question": "Qual é a capital da França?"})
+
+        assert status == 200
+        assert body["answer"].startswith("palavra")
+        assert body["session_id"]
+        # Todos os arquivos da aplicação ficam na pasta de trabalho.
+        assert (tmp_path / "rag_app.db").exists()
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
@@ -0,0 +1,78 @@
+# test_bm25_index.py
+# Testes do índice BM25 (mcp/rag/bm25_index.py): busca por termos exatos e reconstrução enquanto
+# este worker grava e exclui pedaços. Não usa a API do Gemini. Execute com:
+# python -m pytest test_bm25_index.py
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from mcp.rag.bm25_index import BM25Index  # noqa: E402
+
+STORED = (["a", "b"], ["manual da peça AB-123", "relatório anual"], [1, 2])
+
+
+def _ids(index: BM25Index, query: str):
+    return [doc_id for doc_id, _ in index.search(query, k=10)]
+
+
+def test_search_matches_compound_identifiers_and_filters_by_file():
+    index = BM25Index()
+    index.rebuild([STORED], version=1)
+
+    assert _ids(index, "ab-123") == ["a"]
+    assert _ids(index, "123") == ["a"]
+    assert index.search("relatório", k=10, file_ids=[1]) == []
+
+
+def test_writes_during_a_rebuild_survive_the_swap():
+    index = BM25Index()
+    index.rebuild([STORED], version=1)
+
+    def batches():
+        yield STORED
+        # Depois da leitura e antes da troca, este worker grava um pedaço, exclui outro e
+        # avança a versão do corpus (como upsert_chunks/delete_chunks e bump_corpus_version).
+        index.add(["c"], ["código XYZ-999"], [3])
+        index.remove(["b"])
+        index.advance_version(2, 3)
+
+    index.rebuild(batches(), version=2)
+
+    assert _ids(index, "xyz-999") == ["c"]
+    assert _ids(index, "relatório") == []
+    assert index.version == 3
+
+
+def test_rebuild_stays_stale_when_another_worker_changed_the_corpus_meanwhile():
+    index = BM25Index()
+
+    def batches():
+        yield STORED
+        # A versão anterior não é a lida pela reconstrução: outro worker também alterou o corpus.
+        index.advance_version(3, 4)
+
+    index.rebuild(batches(), version=2)
+
+    assert index.version == 2
+
+
+def test_failed_rebuild_keeps_the_current_index():
+    index = BM25Index()
+    index.rebuild([STORED], version=1)
+
+    def batches():
+        yield STORED
+        raise RuntimeError("falha simulada")
+
+    try:
+        index.rebuild(batches(), version=2)
+    except RuntimeError:
+        pass
+    index.add(["c"], ["código XYZ-999"], [3])
+
+    assert index.version == 1
+    assert not index._journal
+    assert sorted(_ids(index, "ab-123 xyz-999")) == ["a", "c"]
@@ -0,0 +1,96 @@
+# test_context_packing.py
+# Testes do empacotamento do contexto (mcp/rag/context_packing.py): descarte de quase-duplicatas,
+# união de pedaços vizinhos, ordem por relevância e corte no orçamento de tokens. Não usa a API
+# do Gemini. Execute com: python -m pytest test_context_packing.py
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from langchain_core.documents import Document  # noqa: E402
+
+from mcp.rag.context_packing import _Passage, _merge_neighbours, pack_documents  # noqa: E402
+
+TEXT = " ".join(f"palavra{index}" for index in range(200))
+
+
+def _chunk(doc_id: str, start: int, end: int, file_id: int = 1, page: int = 0) -> Document:
+    """Um pedaço de TEXT entre start e end, com a posição na página, como o divisor de texto grava."""
+    return Document(id=doc_id, page_content=TEXT[start:end],
+                    metadata={"file_id": file_id, "page": page, "start_index": start})
+
+
+def _passage(rank: int, doc: Document) -> _Passage:
+    return _Passage(rank=rank, id=doc.id, text=doc.page_content, metadata=doc.metadata, ids=[doc.id],
+                    start=doc.metadata.get("start_index"))
+
+
+def test_merge_neighbours_joins_overlapping_chunks_in_text_order():
+    first, second = _chunk("a", 0, 600), _chunk("b", 500, 1100)
+    passages = [_passage(0, second), _passage(1, first)]
+
+    assert _merge_neighbours(passages, min_overlap=30) == 1
+    assert len(passages) == 1
+    assert passages[0].text == TEXT[0:1100]
+    assert passages[0].ids == ["a", "b"]
+    # O trecho unido fica com o ID e a posição do pedaço mais relevante.
+    assert passages[0].id == "b" and passages[0].rank == 0
+
+
+def test_merge_neighbours_keeps_other_files_and_distant_chunks_apart():
+    passages = [_passage(0, _chunk("a", 0, 300)), _passage(1, _chunk("b", 200, 500, file_id=2)),
+                _passage(2, _chunk("c", 900, 1200))]
+
+    assert _merge_neighbours(passages, min_overlap=30) == 0
+    assert [passage.id for passage in passages] == ["a", "b", "c"]
+
+
+def test_merge_neighbours_uses_text_overlap_without_positions():
+    left = Document(id="a", page_content=TEXT[0:600], metadata={"file_id": 1})
+    right = Document(id="b", page_content=TEXT[520:1100], metadata={"file_id": 1})
+    passages = [_passage(0, left), _passage(1, right)]
+
+    assert _merge_neighbours(passages, min_overlap=30) == 1
+    assert passages[0].text == TEXT[0:1100]
+
+
+def test_pack_documents_drops_duplicates_and_keeps_relevance_order():
+    best = Document(id="best", page_content=TEXT[0:400], metadata={"file_id": 1})
+    copy = Document(id="copy", page_content=TEXT[0:400] + " fim", metadata={"file_id": 2})
+    other = Document(id="other", page_content="texto sem relação com os demais pedaços", metadata={"file_id": 3})
+
+    packed = pack_documents([best, other, copy], token_budget=10000)
+
+    assert [doc.id for doc in packed] == ["best", "other"]
+
+
+def test_pack_documents_records_merged_chunk_ids():
+    packed = pack_documents([_chunk("b", 500, 1100), _chunk("a", 0, 600)], token_budget=10000)
+
+    assert len(packed) == 1
+    assert packed[0].id == "b"
+    assert packed[0].metadata["chunk_ids"] == ["a", "b"]
+    assert packed[0].page_content == TEXT[0:1100]
+
+
+def test_pack_documents_truncates_at_the_token_budget():
+    first = Document(id="a", page_content="alfa " * 200, metadata={"file_id": 1})
+    second = Document(id="b", page_content=TEXT, metadata={"file_id": 2})
+
+    packed = pack_documents([first, second], token_budget=400)
+
+    assert [doc.id for doc in packed] == ["a", "b"]
+    assert "truncated" not in packed[0].metadata
+    assert packed[1].metadata["truncated"] is True
+    assert len(packed[1].page_content) < len(TEXT)
+
+
+def test_pack_documents_skips_a_remainder_below_the_minimum():
+    first = Document(id="a", page_content="alfa " * 200, metadata={"file_id": 1})
+    second = Document(id="b", page_content=TEXT, metadata={"file_id": 2})
+
+    packed = pack_documents([first, second], token_budget=260)
+
+    assert [doc.id for doc in packed] == ["a"]
@@ -0,0 +1,115 @@
+# test_incremental_index.py
+# Testes da reindexação incremental (mcp/rag/incremental_index.py): só os pedaços novos ou
+# alterados são embutidos, os metadados mudados são atualizados, os pedaços que sumiram são
+# removidos e uma reindexação interrompida pode ser desfeita (restore_file). Usa o armazenamento
+# mmap em uma pasta temporária e os embeddings falsos de benchmarks/fakes.py.
+# Execute com: python -m pytest test_incremental_index.py
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, ROOT)
+
+from langchain_core.documents import Document  # noqa: E402
+
+from benchmarks.fakes import FakeEmbeddings  # noqa: E402
+from mcp.rag import chroma_utils, incremental_index  # noqa: E402
+from mcp.rag.incremental_index import IncrementalIndexer, restore_file  # noqa: E402
+from mcp.rag.mmap_store import MmapVectorStore  # noqa: E402
+
+
+class CountingEmbeddings(FakeEmbeddings):
+    """Embeddings falsos que contam os textos embutidos."""
+
+    def __init__(self):
+        super().__init__(dimensions=64)
+        self.embedded = []
+
+    def embed_documents(self, texts, task_type=None):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+
+@pytest.fixture
+def embeddings(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = MmapVectorStore(str(tmp_path / "vectors"), quantization="float32", compact_min_rows=10 ** 6)
+    monkeypatch.setattr(chroma_utils, "_vector_backend", store)
+    fake = CountingEmbeddings()
+    monkeypatch.setattr(incremental_index, "get_embeddings", lambda: fake)
+    return fake
+
+
+def _chunk(text: str, page: int = 0, file_id: int = 1) -> Document:
+    return Document(page_content=text, metadata={"file_id": file_id, "page": page, "source": "manual.pdf"})
+
+
+def _index(file_id: int, chunks, existing: bool):
+    indexer = IncrementalIndexer([file_id] if existing else [])
+    indexer.write_batch(chunks, [f"{file_id}-{chunk.page_content}" for chunk in chunks])
+    return indexer.finish_file(file_id)
+
+
+def test_new_file_embeds_every_chunk(embeddings):
+    stats = _index(1, [_chunk("alfa"), _chunk("beta"), _chunk("gama")], existing=False)
+
+    assert stats == {"embedded": 3, "unchanged": 0, "deleted": 0}
+    assert embeddings.embedded == ["alfa", "beta", "gama"]
+    assert sorted(chroma_utils.get_chunk_metadata(1)) == ["1-alfa", "1-beta", "1-gama"]
+
+
+def test_reupload_embeds_only_changes_and_removes_stale_chunks(embeddings):
+    _index(1, [_chunk("alfa"), _chunk("beta"), _chunk("gama")], existing=False)
+    embeddings.embedded.clear()
+
+    # "beta" mudou de página, "gama" saiu e "delta" entrou.
+    stats = _index(1, [_chunk("alfa"), _chunk("beta", page=1), _chunk("delta")], existing=True)
+
+    assert stats == {"embedded": 1, "unchanged": 2, "deleted": 1}
+    assert embeddings.embedded == ["delta"]
+    stored = chroma_utils.get_chunk_metadata(1)
+    assert sorted(stored) == ["1-alfa", "1-beta", "1-delta"]
+    assert stored["1-beta"]["page"] == 1
+
+
+def test_failed_batch_is_not_counted_twice(embeddings, monkeypatch):
+    indexer = IncrementalIndexer([])
+    chunks = [_chunk("alfa"), _chunk("beta")]
+    ids = ["1-alfa", "1-beta"]
+    original_upsert = incremental_index.upsert_chunks
+
+    def failing_upsert(*args, **kwargs):
+        raise RuntimeError("falha simulada")
+
+    monkeypatch.setattr(incremental_index, "upsert_chunks", failing_upsert)
+    with pytest.raises(RuntimeError):
+        indexer.write_batch(chunks, ids)
+    monkeypatch.setattr(incremental_index, "upsert_chunks", original_upsert)
+    indexer.write_batch(chunks, ids)
+
+    assert indexer.finish_file(1) == {"embedded": 2, "unchanged": 0, "deleted": 0}
+
+
+def test_restore_file_undoes_an_interrupted_reindex(embeddings):
+    _index(1, [_chunk("alfa"), _chunk("beta")], existing=False)
+    snapshot = chroma_utils.get_chunk_metadata(1)
+
+    # A reindexação grava um pedaço novo e muda a página de outro, e falha antes de finish_file.
+    indexer = IncrementalIndexer([1])
+    indexer.write_batch([_chunk("alfa", page=3), _chunk("epsilon")], ["1-alfa", "1-epsilon"])
+
+    assert restore_file(1, snapshot) == 0
+    assert chroma_utils.get_chunk_metadata(1) == snapshot
+
+
+def test_restore_file_reports_chunks_already_removed(embeddings):
+    _index(1, [_chunk("alfa"), _chunk("beta")], existing=False)
+    snapshot = chroma_utils.get_chunk_metadata(1)
+    chroma_utils.delete_chunks(["1-beta"])
+
+    assert restore_file(1, snapshot) == 1
+    assert sorted(chroma_utils.get_chunk_metadata(1)) == ["1-alfa"]
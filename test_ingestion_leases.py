@@ -0,0 +1,60 @@
+# test_ingestion_leases.py
+# Testes do prazo (lease) dos jobs de ingestão (mcp/rag/db_utils.py): um job em andamento impede
+# um novo envio do mesmo documento enquanto o prazo é renovado, e um job com o prazo vencido é
+# tratado como abandonado mesmo que o PID registrado pertença a um processo vivo (PID
+# reaproveitado depois de um reinício). Usa um banco SQLite em uma pasta temporária.
+# Execute com: python -m pytest test_ingestion_leases.py
+
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from mcp.rag import db_utils  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(db_utils, "DB_NAME", str(tmp_path / "rag_app.db"))
+    monkeypatch.setattr(db_utils, "_local", threading.local())
+    monkeypatch.setattr(db_utils, "_schema_ready", False)
+
+
+def _expire(job_id: str, pid: int) -> None:
+    with db_utils._write() as conn:
+        conn.execute("UPDATE ingestion_jobs SET worker_pid = ?, lease_expires_at = ? WHERE job_id = ?",
+                     (pid, time.time() - 1, job_id))
+
+
+def test_active_job_blocks_a_second_claim():
+    first = db_utils.claim_document_for_ingestion("manual", "manual.pdf", "h1", "job-1")
+
+    second = db_utils.claim_document_for_ingestion("manual", "manual.pdf", "h2", "job-2")
+
+    assert first["status"] == "queued"
+    assert second == {"job_id": "job-1", "file_id": first["file_id"], "is_update": True, "status": "busy"}
+
+
+def test_expired_lease_is_abandoned_even_with_a_live_pid():
+    db_utils.claim_document_for_ingestion("manual", "manual.pdf", "h1", "job-1")
+    # O PID registrado é o deste processo (vivo), como no reaproveitamento depois de um reinício.
+    _expire("job-1", os.getpid())
+
+    claim = db_utils.claim_document_for_ingestion("manual", "manual.pdf", "h2", "job-2")
+
+    assert claim["status"] == "queued"
+    assert db_utils.get_ingestion_job("job-1")["status"] == "failed"
+
+
+def test_renewal_keeps_the_job_active():
+    db_utils.claim_document_for_ingestion("manual", "manual.pdf", "h1", "job-1")
+    _expire("job-1", os.getpid())
+
+    assert db_utils.renew_ingestion_job_leases() == 1
+    assert db_utils.claim_document_for_ingestion("manual", "manual.pdf", "h2", "job-2")["status"] == "busy"
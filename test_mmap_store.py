@@ -0,0 +1,140 @@
+# test_mmap_store.py
+# Testes do armazenamento vetorial mmap (mcp/rag/mmap_store.py): gravação, sobrescrita, exclusão,
+# compactação e atualização da visão quando outro worker grava no mesmo índice. Os vetores vêm
+# dos embeddings falsos de benchmarks/fakes.py. Execute com: python -m pytest test_mmap_store.py
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fakes import FakeEmbeddings  # noqa: E402
+from mcp.rag.mmap_store import MmapVectorStore  # noqa: E402
+
+EMBEDDINGS = FakeEmbeddings(dimensions=64)
+TEXTS = {
+    "bomba": "manual da bomba hidráulica",
+    "motor": "manutenção do motor elétrico",
+    "valvula": "válvula de alívio de pressão",
+    "filtro": "troca do filtro de óleo",
+}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # Sem compactação automática: os testes compactam explicitamente.
+    return MmapVectorStore(str(tmp_path / "vectors"), quantization="float32", compact_min_rows=10 ** 6)
+
+
+def _upsert(store: MmapVectorStore, ids, file_id: int = 1) -> None:
+    store.upsert(ids=ids, vectors=EMBEDDINGS.embed_documents([TEXTS[doc_id] for doc_id in ids]),
+                 documents=[TEXTS[doc_id] for doc_id in ids],
+                 metadatas=[{"file_id": file_id, "source": f"{doc_id}.pdf"} for doc_id in ids])
+
+
+def _search(store: MmapVectorStore, text: str, k: int = 4, file_ids=None):
+    query = np.asarray([EMBEDDINGS.embed_query(text)], dtype=np.float32)
+    return store.search(query, k, file_ids)[0]
+
+
+def test_upsert_get_and_search(store):
+    _upsert(store, ["bomba", "motor"], file_id=1)
+    _upsert(store, ["valvula"], file_id=2)
+
+    assert store.count() == 3
+    assert _search(store, TEXTS["motor"])[0] == "motor"
+    assert _search(store, TEXTS["motor"], file_ids=[2]) == ["valvula"]
+    stored = store.get(["valvula", "inexistente", "bomba"], include_embeddings=True)
+    assert stored["ids"] == ["valvula", "bomba"]
+    assert stored["metadatas"][0]["file_id"] == 2
+    assert len(stored["embeddings"][0]) == 64
+
+
+def test_upsert_overwrites_existing_ids(store):
+    _upsert(store, ["bomba"], file_id=1)
+    store.upsert(ids=["bomba"], vectors=EMBEDDINGS.embed_documents([TEXTS["filtro"]]), documents=[TEXTS["filtro"]],
+                 metadatas=[{"file_id": 3}])
+
+    assert store.count() == 1
+    assert store.get(["bomba"])["documents"] == [TEXTS["filtro"]]
+    assert _search(store, TEXTS["filtro"], file_ids=[1]) == []
+    assert _search(store, TEXTS["filtro"], file_ids=[3]) == ["bomba"]
+
+
+def test_delete_and_delete_file_hide_chunks_from_search(store):
+    _upsert(store, ["bomba", "motor"], file_id=1)
+    _upsert(store, ["valvula", "filtro"], file_id=2)
+
+    store.delete(["motor"])
+    assert store.delete_file(2) == 2
+
+    assert store.count() == 1
+    assert _search(store, TEXTS["motor"]) == ["bomba"]
+    assert store.get_file_metadata(2) == {}
+
+
+def test_update_metadata_moves_chunk_to_another_file(store):
+    _upsert(store, ["bomba", "motor"], file_id=1)
+
+    store.update_metadata(["motor"], [{"file_id": 5, "page": 2}])
+
+    assert store.get_file_metadata(5) == {"motor": {"file_id": 5, "page": 2}}
+    assert _search(store, TEXTS["motor"], file_ids=[5]) == ["motor"]
+    assert _search(store, TEXTS["motor"], file_ids=[1]) == ["bomba"]
+
+
+def test_compact_keeps_results_and_clears_the_delta(store):
+    _upsert(store, ["bomba", "motor", "valvula"], file_id=1)
+    store.delete(["valvula"])
+
+    assert store.compact()
+
+    stats = store.stats()
+    assert stats["generation"] == 1
+    assert stats["segment_rows"] == 2
+    assert stats["delta_rows"] == 0
+    assert stats["tombstones"] == 0
+    assert _search(store, TEXTS["motor"])[0] == "motor"
+    assert "valvula" not in _search(store, TEXTS["valvula"])
+
+    # Gravações depois da compactação ficam no delta e são encontradas junto com o segmento.
+    _upsert(store, ["filtro"], file_id=2)
+    store.delete(["bomba"])
+    assert _search(store, TEXTS["filtro"])[0] == "filtro"
+    assert "bomba" not in _search(store, TEXTS["bomba"])
+
+
+def test_other_instance_sees_writes_deletes_and_compaction(store, tmp_path):
+    # Uma segunda instância sobre a mesma pasta faz o papel de outro worker do uvicorn.
+    other = MmapVectorStore(str(tmp_path / "vectors"), quantization="float32", compact_min_rows=10 ** 6)
+    _upsert(store, ["bomba", "motor"], file_id=1)
+    assert _search(other, TEXTS["bomba"])[0] == "bomba"
+
+    store.delete(["bomba"])
+    assert "bomba" not in _search(other, TEXTS["bomba"])
+
+    assert store.compact()
+    _upsert(store, ["filtro"], file_id=2)
+    assert _search(other, TEXTS["filtro"])[0] == "filtro"
+    assert other.stats()["generation"] == 1
+
+
+def test_iter_chunks_pages_through_every_chunk(store):
+    _upsert(store, ["bomba", "motor", "valvula"], file_id=1)
+
+    pages = list(store.iter_chunks(page_size=2))
+
+    assert [ids for ids, _, _ in pages] == [["bomba", "motor"], ["valvula"]]
+
+
+def test_dimension_mismatch_is_rejected(store):
+    _upsert(store, ["bomba"], file_id=1)
+
+    with pytest.raises(ValueError):
+        store.upsert(ids=["x"], vectors=[[1.0, 0.0]], documents=["x"], metadatas=[{"file_id": 1}])
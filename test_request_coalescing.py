@@ -0,0 +1,117 @@
+# test_request_coalescing.py
+# Testes da coalescência de requisições (mcp/engines/request_coalescing.py): a primeira
+# requisição executa a chamada e as idênticas em andamento recebem o mesmo resultado, inclusive
+# quando a primeira é cancelada; erros chegam a todas. Execute com:
+# python -m pytest test_request_coalescing.py
+
+import os
+import sys
+import asyncio
+
+import pytest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from mcp.engines.request_coalescing import RequestCoalescer  # noqa: E402
+
+
+def test_identical_requests_share_one_call():
+    async def scenario():
+        coalescer = RequestCoalescer()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "resposta"
+
+        results = await asyncio.gather(*(coalescer.run("pergunta", call) for _ in range(5)))
+        return coalescer, calls, results
+
+    coalescer, calls, results = asyncio.run(scenario())
+
+    assert len(calls) == 1
+    assert [answer for answer, _ in results] == ["resposta"] * 5
+    assert [shared for _, shared in results] == [False, True, True, True, True]
+    assert coalescer.stats() == {"leaders": 1, "followers": 4, "inflight": 0}
+
+
+def test_different_keys_and_later_requests_run_again():
+    async def scenario():
+        coalescer = RequestCoalescer()
+        calls = []
+
+        async def call(value):
+            calls.append(value)
+            await asyncio.sleep(0.01)
+            return value
+
+        first = await asyncio.gather(coalescer.run("a", lambda: call("a")), coalescer.run("b", lambda: call("b")))
+        # Terminada a chamada, a mesma chave volta a executar.
+        second = await coalescer.run("a", lambda: call("a2"))
+        return calls, first, second
+
+    calls, first, second = asyncio.run(scenario())
+
+    assert sorted(calls) == ["a", "a2", "b"]
+    assert first == [("a", False), ("b", False)]
+    assert second == ("a2", False)
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    async def scenario():
+        coalescer = RequestCoalescer()
+
+        async def call():
+            await asyncio.sleep(0.05)
+            return "resposta"
+
+        leader = asyncio.ensure_future(coalescer.run("pergunta", call))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(coalescer.run("pergunta", call))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return leader, await follower
+
+    leader, follower_result = asyncio.run(scenario())
+
+    assert leader.cancelled()
+    assert follower_result == ("resposta", True)
+
+
+def test_errors_reach_every_waiting_request():
+    async def scenario():
+        coalescer = RequestCoalescer()
+
+        async def call():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("falha simulada")
+
+        results = await asyncio.gather(*(coalescer.run("pergunta", call) for _ in range(3)),
+                                       return_exceptions=True)
+        return coalescer, results
+
+    coalescer, results = asyncio.run(scenario())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert coalescer.stats()["inflight"] == 0
+
+
+def test_error_without_waiters_is_not_left_unretrieved():
+    async def scenario():
+        coalescer = RequestCoalescer()
+
+        async def call():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("falha simulada")
+
+        leader = asyncio.ensure_future(coalescer.run("pergunta", call))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        await asyncio.sleep(0.05)
+        return coalescer
+
+    assert asyncio.run(scenario()).stats()["inflight"] == 0
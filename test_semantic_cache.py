@@ -0,0 +1,72 @@
+# test_semantic_cache.py
+# Testes do cache semântico (mcp/rag/semantic_cache.py): perguntas semelhantes reaproveitam a
+# resposta, e qualquer mudança na versão do corpus descarta o cache, inclusive as respostas
+# geradas antes da mudança e guardadas depois dela. Usa os embeddings falsos de
+# benchmarks/fakes.py. Execute com: python -m pytest test_semantic_cache.py
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fakes import FakeEmbeddings  # noqa: E402
+from mcp.rag import corpus_version  # noqa: E402
+from mcp.rag.semantic_cache import SemanticCache  # noqa: E402
+
+MODEL = "gemini-2.0-flash"
+QUESTION = "Como trocar o filtro de óleo da bomba?"
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(corpus_version, "CORPUS_VERSION_FILE", str(tmp_path / "corpus_version"))
+    return SemanticCache(FakeEmbeddings(dimensions=64), similarity_threshold=0.95, ttl_seconds=3600,
+                         max_entries=100, max_memory_bytes=10 * 1024 * 1024)
+
+
+def test_similar_question_hits_for_the_same_model(cache):
+    answer, embedding, version = cache.lookup(QUESTION, MODEL)
+    assert answer is None
+    cache.store(QUESTION, MODEL, "Desligue a bomba e troque o filtro.", embedding, version)
+
+    assert cache.lookup("como trocar o filtro de óleo da bomba", MODEL)[0] == "Desligue a bomba e troque o filtro."
+    assert cache.lookup(QUESTION, "gemini-2.5-flash-lite")[0] is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_store_with_a_stale_corpus_version_is_dropped(cache):
+    _, embedding, version = cache.lookup(QUESTION, MODEL)
+
+    # Outro worker altera o corpus enquanto a resposta é gerada.
+    corpus_version.bump_corpus_version()
+    cache.store(QUESTION, MODEL, "resposta antiga", embedding, version)
+
+    assert cache.stats()["stale_stores"] == 1
+    assert cache.stats()["entries"] == 0
+    assert cache.lookup(QUESTION, MODEL)[0] is None
+
+
+def test_corpus_change_invalidates_stored_answers(cache):
+    _, embedding, version = cache.lookup(QUESTION, MODEL)
+    cache.store(QUESTION, MODEL, "resposta", embedding, version)
+
+    corpus_version.bump_corpus_version()
+
+    assert cache.lookup(QUESTION, MODEL)[0] is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_invalidate_bumps_the_shared_version(cache):
+    _, embedding, version = cache.lookup(QUESTION, MODEL)
+    cache.store(QUESTION, MODEL, "resposta", embedding, version)
+
+    cache.invalidate()
+
+    assert corpus_version.read_corpus_version() != version
+    assert cache.stats()["entries"] == 0
+    assert cache.lookup(QUESTION, MODEL)[0] is None